@@ -0,0 +1,206 @@
+"""
+Content-addressed cache for image analysis results
+
+Results are keyed on the SHA-256 of the uploaded image bytes plus the prompt,
+the backend that answered (name, model and endpoint) and form inputs, so the
+same photo analysed with the same settings is only sent to the vision API
+once, and switching backends in the config never serves the old one's answers. Entries live in an in-memory LRU tier and
+in an on-disk tier shared by every session and process on the machine.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_data_dir, get_int_setting
+
+
+def hash_image_bytes(image_bytes):
+    """SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def make_cache_key(image_bytes, prompt, model, inputs=None, backend=None, base_url=None):
+    """Build a cache key from image content, prompt, backend, model, endpoint and form inputs"""
+    descriptor = json.dumps(
+        {
+            'image': hash_image_bytes(image_bytes),
+            'prompt': prompt,
+            'backend': backend,
+            'model': model,
+            'base_url': base_url,
+            'inputs': inputs or {},
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(descriptor.encode()).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier (memory LRU + disk) cache with TTL and size-based eviction"""
+
+    def __init__(self, cache_dir, max_memory_items=256, ttl_seconds=7 * 24 * 3600,
+                 max_disk_bytes=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _expired(self, stored_at):
+        return time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return a cached result or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return copy.deepcopy(value)
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._remember(key, entry['stored_at'], entry['value'])
+        return copy.deepcopy(entry['value'])
+
+    def set(self, key, value):
+        """Store a JSON-serialisable result in both tiers"""
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, copy.deepcopy(value))
+            self._stats['writes'] += 1
+            self._writes_since_eviction += 1
+            run_eviction = self._writes_since_eviction >= 20
+            if run_eviction:
+                self._writes_since_eviction = 0
+
+        self._write_disk(key, stored_at, value)
+        if run_eviction:
+            self.evict_disk()
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self._expired(entry.get('stored_at', 0)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # Touch the file so size-based eviction drops least recently used entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _write_disk(self, key, stored_at, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': stored_at, 'value': value}, f, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def evict_disk(self):
+        """Drop expired entries, then the least recently used until under the size cap"""
+        files = []
+        now = time.time()
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                if now - info.st_mtime > self.ttl_seconds:
+                    self._remove(path)
+                else:
+                    files.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Snapshot of hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_items'] = len(self._memory)
+        stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+        return stats
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                self._remove(os.path.join(root, name))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """Process-wide analysis cache shared by every session"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache(
+                    os.path.join(get_data_dir(), 'analysis_cache'),
+                    max_memory_items=get_int_setting("AUTOXPERT_CACHE_MEMORY_ITEMS", 256),
+                    ttl_seconds=get_int_setting("AUTOXPERT_CACHE_TTL_SECONDS", 7 * 24 * 3600),
+                    max_disk_bytes=get_int_setting("AUTOXPERT_CACHE_MAX_DISK_MB", 100) * 1024 * 1024
+                )
+    return _cache
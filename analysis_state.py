@@ -0,0 +1,207 @@
+"""
+Per-session analysis state for the analysis pages
+
+Each page keeps one AnalysisState in st.session_state describing the upload it
+last analysed. Reruns caused by unrelated widgets only re-render the stored
+result; a new analysis starts only when the file or relevant inputs change.
+Progressive analyses stay RUNNING with a provisional result until their
+background remote call lands; background analyses stay RUNNING until their
+job on the shared job queue finishes.
+"""
+
+import json
+import time
+import uuid
+
+import streamlit as st
+
+from analysis_cache import hash_image_bytes
+from blob_store import get_blob_store
+from history_store import history_scope
+from job_queue import get_job_queue, JobLimitReached, QUEUED
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class AnalysisState:
+    """Lifecycle of one page's analysis of one upload"""
+
+    def __init__(self, key):
+        self.key = key
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self.job_id = None
+        self.job_status = None
+
+    @property
+    def provisional(self):
+        """Whether the stored result may still be replaced by a better one"""
+        return self.status == RUNNING and self.result is not None
+
+    @property
+    def queue_position(self):
+        """Place of the pending remote request in the outbound queue, if it is waiting"""
+        if not self.provisional:
+            return None
+        return getattr(self.progress, 'queue_position', None)
+
+    @property
+    def duration(self):
+        """Seconds the analysis took, once finished"""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+def _file_id(uploaded_file):
+    return getattr(uploaded_file, 'file_id', None) or uploaded_file.name
+
+
+def upload_digest(uploaded_file):
+    """Content hash of an upload, storing it in the blob store the first time it is seen"""
+    file_id = _file_id(uploaded_file)
+
+    # Hash each upload once per session rather than on every rerun; decoding
+    # it and writing the renditions happens off the script thread
+    digests = st.session_state.setdefault('upload_digests', {})
+    if file_id not in digests:
+        data = uploaded_file.getvalue()
+        digests[file_id] = hash_image_bytes(data)
+        # An unreadable image fails there unnoticed; the analysis reports the error
+        get_blob_store().put_async(data, digests[file_id])
+    return digests[file_id]
+
+
+def upload_preview(uploaded_file, rendition='preview'):
+    """A downscaled rendition of an upload for display, or the upload itself until one is stored"""
+    image = get_blob_store().read(upload_digest(uploaded_file), rendition)
+    return image if image is not None else uploaded_file.getvalue()
+
+
+def upload_key(uploaded_file, inputs=None):
+    """Identify an upload by file_id and content hash plus the inputs that affect it"""
+    return json.dumps([_file_id(uploaded_file), upload_digest(uploaded_file), inputs or {}], sort_keys=True, default=str)
+
+
+def uploads_key(uploaded_files, inputs=None):
+    """Identify a set of uploads (None for empty slots) plus the inputs that affect them"""
+    keys = [upload_key(f) if f is not None else None for f in uploaded_files]
+    return json.dumps([keys, inputs or {}], sort_keys=True, default=str)
+
+
+def content_key(uploaded_files, inputs=None):
+    """Like uploads_key, but by content alone, so a re-upload of the same photos matches"""
+    digests = [upload_digest(f) if f is not None else None for f in uploaded_files]
+    return json.dumps([digests, inputs or {}], sort_keys=True, default=str)
+
+
+def get_analysis_state(page, key):
+    """Return the page's state, starting a fresh one when the key changed"""
+    state_key = f"{page}_analysis_state"
+    state = st.session_state.get(state_key)
+    if state is None or state.key != key:
+        state = AnalysisState(key)
+        st.session_state[state_key] = state
+    return state
+
+
+def reset_analysis(page):
+    """Forget the page's stored analysis so the next run starts over"""
+    st.session_state.pop(f"{page}_analysis_state", None)
+
+
+def session_history_scope():
+    """Attribute analyses to the vehicle reference entered in this session, if any"""
+    return history_scope(vehicle_id=st.session_state.get('vehicle_reference'))
+
+
+def get_session_id():
+    """Identifier for this browser session's jobs on the job queue"""
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+
+def refresh_analysis(state):
+    """Pick up a background result that has landed since the last run"""
+    if state.status != RUNNING:
+        return state
+    if state.job_id is not None:
+        return _refresh_job(state)
+    if state.progress is None:
+        return state
+    state.result = state.progress.result()
+    if state.progress.done():
+        state.status = DONE
+        state.finished_at = time.time()
+    return state
+
+
+def run_progressive_analysis(page, key, start, spinner_text="Analyzing..."):
+    """Start start() once per key; it returns a ProgressiveAnalysis whose result may improve"""
+    state = get_analysis_state(page, key)
+    if state.status == PENDING or (state.status == RUNNING and state.progress is None):
+        state.status = RUNNING
+        state.started_at = time.time()
+        try:
+            with st.spinner(spinner_text), session_history_scope():
+                state.progress = start()
+        except Exception as e:
+            state.error = str(e)
+            state.status = FAILED
+            state.finished_at = time.time()
+            return state
+    return refresh_analysis(state)
+
+
+def _refresh_job(state):
+    job = get_job_queue().get(state.job_id)
+    if job is None:
+        state.error = "The analysis job was lost; please retry"
+        state.status = FAILED
+        state.finished_at = time.time()
+        return state
+    state.job_status = job['status']
+    if job['status'] == DONE:
+        state.result = job['result']
+        state.status = DONE
+    elif job['status'] == FAILED:
+        state.error = job['error']
+        state.status = FAILED
+    else:
+        return state
+    state.started_at = job['started_at'] or job['submitted_at']
+    state.finished_at = job['finished_at']
+    return state
+
+
+def run_background_analysis(page, key, analyze, job_key=None):
+    """Run analyze() once per key as a job on the shared job queue
+
+    The job is looked up by job_key (default: key) within this session, so
+    passing a content_key lets a re-upload of the same photos pick up the job
+    already run for them. The state stays RUNNING until the job finishes; call
+    refresh_analysis on later runs to pick up the result.
+    """
+    state = get_analysis_state(page, key)
+    if state.status == PENDING or (state.status == RUNNING and state.job_id is None):
+        state.status = RUNNING
+        state.started_at = time.time()
+        try:
+            # The job runs in a copy of this context, history scope included
+            with session_history_scope():
+                state.job_id = get_job_queue().submit(
+                    get_session_id(), page, key if job_key is None else job_key, analyze
+                )
+            state.job_status = QUEUED
+        except JobLimitReached as e:
+            state.error = str(e)
+            state.status = FAILED
+            state.finished_at = time.time()
+            return state
+    return refresh_analysis(state)
@@ -0,0 +1,176 @@
+"""
+Damage, tire and price analyzers
+
+Each feature is answered by the backends on its route (see backends.py): a
+fast tier, normally the local CPU analyzers, and remote vision models to
+escalate to. The analyze_* entry points route between them with the
+inference router and fall back to the fast-tier answer whenever every remote
+backend is unavailable or fails. Remote analyses can report their fields
+while the reply is still streaming, and every remote reply is decoded and
+validated against the feature's schema (see response_decoder.py). Final
+results are written to the analysis history, and a photo already answered by
+one of the feature's remote backends, with the same model and within
+AUTOXPERT_HISTORY_REUSE_SECONDS, is answered from there again (see
+history_store.py).
+Nothing here imports Streamlit UI code.
+"""
+
+import time
+
+from analysis_cache import hash_image_bytes
+from backends import analyze_with_failover, get_route
+from config import get_int_setting
+from history_store import current_scope, get_history_store
+from inference_router import get_threshold, route
+from response_decoder import coerce_fields, decode
+
+DAMAGE_PROMPT = "Analyze this vehicle damage image. Identify if it's a dent or scratch and which body panel it is on. Respond in JSON format: {\"type\": \"dent\" or \"scratch\", \"confidence\": 0.0-1.0, \"panel\": \"body panel, e.g. front bumper, rear left door, hood\", \"description\": \"brief description\"}"
+
+TIRE_PROMPT = """Analyze this tire image. Assess the tire condition, tread depth, and wear patterns.
+Respond in JSON format: {
+    "condition": "good/fair/poor",
+    "tread_depth_mm": estimated number,
+    "remaining_life_percent": 0-100,
+    "estimated_distance_km": remaining safe distance,
+    "change_recommended": true/false,
+    "description": "detailed analysis"
+}"""
+
+
+def build_price_prompt(context):
+    """Build the valuation prompt for the given vehicle context"""
+    return f"""Analyze this vehicle image and estimate its market value.
+Context: {context}
+Consider the vehicle's condition, age, brand, and market factors.
+Respond in JSON format: {{
+    "estimated_price": number in USD,
+    "price_range_min": minimum estimate,
+    "price_range_max": maximum estimate,
+    "condition": "excellent/good/fair/poor",
+    "factors": ["list of factors affecting price"],
+    "description": "detailed analysis"
+}}"""
+
+
+def price_inputs(brand, model_year=None, mileage=None):
+    """The form inputs a price analysis depends on"""
+    return {"brand": brand, "model_year": model_year, "mileage": mileage}
+
+
+def _price_context(brand, model_year=None, mileage=None):
+    context = f"Brand: {brand}"
+    if model_year is not None:
+        context += f", Model Year: {model_year}"
+    if mileage is not None:
+        context += f", Mileage: {mileage} km"
+    return context
+
+
+def _plan(feature, image_bytes, prompt, inputs=None):
+    """(fast tier, escalation) callables from the feature's backend route"""
+    first, rest = get_route(feature)
+    history = get_history_store()
+    image_hash = hash_image_bytes(image_bytes) if image_bytes else None
+    # Captured now, in the caller's context, since remote calls may run on a worker thread
+    scope = current_scope()
+
+    def parse(content):
+        return decode(feature, content)
+
+    def local():
+        start = time.perf_counter()
+        result = first.analyze(feature, image_bytes, prompt, inputs, parse)
+        # Only answers confident enough to be final go into the history
+        if result.get("confidence", 0) >= get_threshold(feature):
+            history.record(
+                feature, image_hash, inputs, result, first.kind, first.name,
+                (time.perf_counter() - start) * 1000, **scope
+            )
+        return result
+
+    def remote(on_partial=None):
+        models = {backend.name: backend.model for backend in rest}
+        if image_hash is not None:
+            # Only answers the current route would still give, and no older than the cache keeps them
+            previous = history.find_latest(
+                feature, image_hash, inputs, kind='remote', backends=list(models.items()),
+                max_age=get_int_setting(
+                    "AUTOXPERT_HISTORY_REUSE_SECONDS",
+                    get_int_setting("AUTOXPERT_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+                )
+            )
+            if previous is not None:
+                history.note_reused()
+                # A known photo seen for another vehicle or customer still belongs in their history
+                if any(value and value != previous[name] for name, value in scope.items()):
+                    history.record(
+                        feature, image_hash, inputs, previous['result'], 'remote', previous['backend'], 0.0,
+                        model=previous['model'], **scope
+                    )
+                return dict(previous['result'], backend=previous['backend'], from_history=True)
+
+        if on_partial is not None:
+            # Streamed fields get the same coercion as the final reply
+            report = on_partial
+            on_partial = lambda fields: report(coerce_fields(feature, fields))
+        start = time.perf_counter()
+        result = analyze_with_failover(rest, feature, image_bytes, prompt, inputs, parse, on_partial)
+        history.record(
+            feature, image_hash, inputs, result, 'remote', result.get("backend"),
+            (time.perf_counter() - start) * 1000, model=models.get(result.get("backend")), **scope
+        )
+        return result
+
+    return local, remote
+
+
+def damage_plan(image_bytes):
+    """(local, remote, agree) callables for a damage analysis
+
+    The remote callable optionally takes an on_partial callback for streaming.
+    """
+    return _plan('damage', image_bytes, DAMAGE_PROMPT) + (
+        lambda local, remote: local.get("type") == remote.get("type"),
+    )
+
+
+def analyze_damage(image_bytes):
+    """Damage type for a photo, escalating to the vision model only when unsure"""
+    return route('damage', *damage_plan(image_bytes))
+
+
+def tire_plan(image_bytes):
+    """(local, remote, agree) callables for a tire analysis"""
+    return _plan('tire', image_bytes, TIRE_PROMPT) + (
+        lambda local, remote: local.get("condition") == remote.get("condition"),
+    )
+
+
+def analyze_tire(image_bytes):
+    """Tire condition for a photo, escalating to the vision model only when unsure"""
+    return route('tire', *tire_plan(image_bytes))
+
+
+def _prices_agree(local, remote):
+    """The remote estimate falls inside the local price range"""
+    try:
+        estimate = float(remote.get("estimated_price"))
+        return float(local["price_range_min"]) <= estimate <= float(local["price_range_max"])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def price_plan(image_bytes, brand, model_year=None, mileage=None):
+    """(local, remote, agree) callables for a price prediction
+
+    image_bytes may be None; the vision model then has nothing to look at, so
+    remote is None and the price curves' answer is final.
+    """
+    prompt = build_price_prompt(_price_context(brand, model_year, mileage))
+    local, remote = _plan('market', image_bytes, prompt, price_inputs(brand, model_year, mileage))
+    return local, (remote if image_bytes else None), _prices_agree
+
+
+def predict_price(image_bytes, brand, model_year=None, mileage=None):
+    """Market value for a vehicle, escalating to the vision model only when unsure"""
+    return route('market', *price_plan(image_bytes, brand, model_year, mileage))
@@ -0,0 +1,463 @@
+"""
+HTTP JSON API for partner systems
+
+Exposes the damage, tire and price analyses and the repair-shop
+recommendations over plain HTTP, so dealer and insurer systems can call them
+without the Streamlit UI. Requests are served by a bounded worker pool;
+when every worker is busy and the backlog is full, new connections get an
+immediate 503 instead of piling up. Images arrive either as multipart form
+uploads (field "image") or base64 in a JSON body ("image_base64"), within
+AUTOXPERT_API_MAX_BODY_BYTES. The photo is optional for /v1/market: without
+one the price comes from the brand, year and mileage curves alone.
+
+Run it inside the Streamlit process by setting AUTOXPERT_API_EMBED=1 and
+AUTOXPERT_API_PORT. Only then does it share the UI's outbound rate limiter,
+single-flight and in-memory cache, so UI and API traffic together stay within
+OPENROUTER_RATE_PER_SECOND. It can also run on its own:
+
+    python api_server.py --port 8600
+
+but a separate process has its own limiter, single-flight and memory cache
+(the disk cache, history and blob store in the data directory are still
+shared); give each process its share of the upstream's rate limit through
+OPENROUTER_RATE_PER_SECOND and OPENROUTER_BURST.
+
+The server listens on 127.0.0.1 by default. Binding any other address
+requires AUTOXPERT_API_KEY, since the analyses, history and stats would
+otherwise be open to the whole network.
+
+Endpoints:
+    GET  /health
+    GET  /v1/stats
+    GET  /v1/history?vehicle_id=...&customer_id=...&cursor=...
+    POST /v1/damage, /v1/tire, /v1/market
+    POST /v1/shops    {"damage_type": "dent" or ["dent", "scratch"]}
+    POST /v1/batch    {"items": [{"feature": "damage", "image_base64": ...}, ...]}
+"""
+
+import argparse
+import base64
+import binascii
+import email.parser
+import email.policy
+import hmac
+import io
+import ipaddress
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+from PIL import Image
+
+from analysis_cache import get_analysis_cache
+from analyzers import analyze_damage, analyze_tire, predict_price
+from backends import get_backend_stats, warm_up_backends
+from config import get_setting, get_int_setting, get_bool_setting
+from history_store import get_history_store, history_scope
+from inference_router import get_router_metrics
+from inspection import get_inspection_executor
+from rate_limiter import get_rate_limiter
+from response_decoder import get_decoder_stats
+from single_flight import get_single_flight
+from utils import get_recommended_shops, format_shop_for_display
+
+FEATURES = ('damage', 'tire', 'market')
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+
+# Unexpected failures are logged in full; clients only get this
+INTERNAL_ERROR = "internal server error"
+
+logger = logging.getLogger(__name__)
+
+
+class APIError(Exception):
+    """An error reported to the client with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def decode_image(data):
+    """Check that bytes are an image Pillow can read"""
+    try:
+        Image.open(io.BytesIO(data)).verify()
+    except Exception:
+        raise APIError(400, "image is not a readable PNG, JPEG or WebP file")
+    return data
+
+
+def decode_base64_image(value):
+    """Image bytes from base64 text, with or without a data: URL prefix"""
+    if not isinstance(value, str) or not value:
+        raise APIError(400, "image_base64 must be a non-empty string")
+    if value.startswith('data:'):
+        value = value.split(',', 1)[-1]
+    try:
+        return decode_image(base64.b64decode(value, validate=True))
+    except (binascii.Error, ValueError):
+        raise APIError(400, "image_base64 is not valid base64")
+
+
+def parse_multipart(content_type, body):
+    """(fields, files) from a multipart/form-data body"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode('latin-1') + b"\r\n\r\n" + body
+    )
+    if not message.is_multipart():
+        raise APIError(400, "malformed multipart body")
+
+    fields = {}
+    files = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if not name:
+            continue
+        payload = part.get_payload(decode=True) or b""
+        if part.get_filename() is not None:
+            files[name] = payload
+        else:
+            fields[name] = payload.decode('utf-8', 'replace')
+    return fields, files
+
+
+def request_image(feature, params, image=None):
+    """The uploaded or base64 image; only a price prediction may come without one"""
+    if image is not None:
+        return image
+    if feature == 'market' and not params.get('image_base64'):
+        return None
+    return decode_base64_image(params.get('image_base64'))
+
+
+def _optional_int(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise APIError(400, f"{name} must be an integer")
+
+
+def analyze(feature, image_bytes, params):
+    """Run one feature's analysis with the request's form inputs
+
+    Optional vehicle_id and customer_id params attribute the result in the
+    analysis history.
+    """
+    with history_scope(params.get('vehicle_id'), params.get('customer_id')):
+        if feature == 'damage':
+            return analyze_damage(image_bytes)
+        if feature == 'tire':
+            return analyze_tire(image_bytes)
+        if feature == 'market':
+            if not params.get('brand'):
+                raise APIError(400, "brand is required for a price prediction")
+            return predict_price(
+                image_bytes,
+                params['brand'],
+                _optional_int(params, 'model_year'),
+                _optional_int(params, 'mileage')
+            )
+    raise APIError(404, f"unknown feature {feature!r}")
+
+
+def recommend_shops(damage_type):
+    """Top-rated shops for a damage type or list of types, formatted like the UI shows them"""
+    damage_types = [damage_type] if isinstance(damage_type, str) else damage_type
+    if not damage_types or not all(item in ('dent', 'scratch') for item in damage_types):
+        raise APIError(400, "damage_type must be 'dent', 'scratch' or a list of them")
+    return [format_shop_for_display(shop, damage_types) for shop in get_recommended_shops(damage_types)]
+
+
+def list_history(query):
+    """A page of stored results and the cursor for the next one"""
+    params = {name: values[0] for name, values in parse_qs(query).items()}
+    before = None
+    if params.get('cursor'):
+        try:
+            created_at, row_id = params['cursor'].split(':')
+            before = (float(created_at), int(row_id))
+        except ValueError:
+            raise APIError(400, "invalid cursor")
+    limit = min(max(_optional_int(params, 'limit') or 20, 1), 100)
+    records, next_cursor = get_history_store().list_history(
+        params.get('vehicle_id'), params.get('customer_id'), before, limit
+    )
+    return {
+        'results': records,
+        'next_cursor': f"{next_cursor[0]!r}:{next_cursor[1]}" if next_cursor else None,
+    }
+
+
+def get_api_stats():
+    """Cache, upstream and decoder metrics shared with the UI"""
+    return {
+        'cache': get_analysis_cache().stats(),
+        'single_flight': get_single_flight().stats(),
+        'rate_limiter': get_rate_limiter().stats(),
+        'router': get_router_metrics(),
+        'backends': get_backend_stats(),
+        'decoder': get_decoder_stats(),
+        'history': get_history_store().stats(),
+    }
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the analyzers"""
+
+    server_version = "AutoXpertAPI/1.0"
+    # Drop clients that stall mid-request instead of holding a worker
+    timeout = 30
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _check_auth(self):
+        api_key = self.server.api_key
+        if not api_key:
+            return
+        supplied = self.headers.get("X-API-Key", "")
+        authorization = self.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            supplied = authorization[len("Bearer "):]
+        if not hmac.compare_digest(supplied.encode(), api_key.encode()):
+            raise APIError(401, "missing or invalid API key")
+
+    def _read_body(self):
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise APIError(411, "Content-Length is required")
+        try:
+            length = int(length)
+        except ValueError:
+            raise APIError(400, "invalid Content-Length")
+        if length > self.server.max_body_bytes:
+            raise APIError(413, f"request body exceeds {self.server.max_body_bytes} bytes")
+        return self.rfile.read(length)
+
+    def _read_request(self):
+        """(params, image bytes or None) from a JSON or multipart body"""
+        body = self._read_body()
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            params, files = parse_multipart(content_type, body)
+            image = files.get('image')
+            return params, decode_image(image) if image else None
+        if content_type.startswith("application/json"):
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError:
+                raise APIError(400, "body is not valid JSON")
+            if not isinstance(params, dict):
+                raise APIError(400, "body must be a JSON object")
+            return params, None
+        raise APIError(415, "send application/json or multipart/form-data")
+
+    def _handle(self, method):
+        try:
+            self._check_auth()
+            path, _, query = self.path.partition('?')
+            status, payload = self._route(method, path.rstrip('/'), query)
+        except APIError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception:
+            logger.exception("%s %s failed", method, self.path)
+            status, payload = 500, {'error': INTERNAL_ERROR}
+        self._send_json(status, payload)
+
+    def _route(self, method, path, query=""):
+        if method == 'GET':
+            if path == '/health':
+                return 200, {'status': 'ok'}
+            if path == '/v1/stats':
+                return 200, get_api_stats()
+            if path == '/v1/history':
+                return 200, list_history(query)
+            raise APIError(404, f"no such endpoint {path}")
+
+        if path == '/v1/shops':
+            params, _ = self._read_request()
+            return 200, {'shops': recommend_shops(params.get('damage_type'))}
+        if path == '/v1/batch':
+            params, _ = self._read_request()
+            return 200, {'results': self._batch(params.get('items'))}
+        if path.startswith('/v1/') and path[len('/v1/'):] in FEATURES:
+            feature = path[len('/v1/'):]
+            params, image = self._read_request()
+            return 200, analyze(feature, request_image(feature, params, image), params)
+        raise APIError(404, f"no such endpoint {path}")
+
+    def _batch(self, items):
+        """Analyze up to AUTOXPERT_API_MAX_BATCH items concurrently, reporting errors per item"""
+        if not isinstance(items, list) or not items:
+            raise APIError(400, "items must be a non-empty list")
+        if len(items) > self.server.max_batch_items:
+            raise APIError(413, f"a batch may hold at most {self.server.max_batch_items} items")
+
+        def run(item):
+            if not isinstance(item, dict):
+                raise APIError(400, "each item must be a JSON object")
+            return analyze(item.get('feature'), request_image(item.get('feature'), item), item)
+
+        executor = get_inspection_executor()
+        futures = [executor.submit(run, item) for item in items]
+        wait(futures)
+        results = []
+        for future in futures:
+            try:
+                results.append({'status': 'ok', 'result': future.result()})
+            except APIError as e:
+                results.append({'status': 'error', 'error': str(e)})
+            except Exception:
+                logger.exception("Batch item failed")
+                results.append({'status': 'error', 'error': INTERNAL_ERROR})
+        return results
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server handing each connection to a bounded worker pool"""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=8, backlog=32, max_body_bytes=20 * 1024 * 1024,
+                 max_batch_items=20, api_key=None, verbose=False):
+        super().__init__(address, APIRequestHandler)
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_items = max_batch_items
+        self.api_key = api_key
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            # Shed load at the door rather than queueing without bound
+            try:
+                request.sendall(
+                    b"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                    b"Retry-After: 1\r\nContent-Length: 27\r\n\r\n{\"error\": \"server is busy\"}"
+                )
+            finally:
+                self.shutdown_request(request)
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+def is_loopback(host):
+    """Whether host only accepts connections from this machine"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """A server configured from the AUTOXPERT_API_* settings
+
+    Raises ValueError for a non-loopback host when no API key is set.
+    """
+    api_key = get_setting("AUTOXPERT_API_KEY")
+    if not api_key and not is_loopback(host):
+        raise ValueError(f"Refusing to serve the API on {host or 'all interfaces'} without AUTOXPERT_API_KEY")
+    return PooledHTTPServer(
+        (host, port),
+        workers=get_int_setting("AUTOXPERT_API_WORKERS", 8),
+        backlog=get_int_setting("AUTOXPERT_API_BACKLOG", 32),
+        max_body_bytes=get_int_setting("AUTOXPERT_API_MAX_BODY_BYTES", 20 * 1024 * 1024),
+        max_batch_items=get_int_setting("AUTOXPERT_API_MAX_BATCH", 20),
+        api_key=api_key,
+        verbose=verbose
+    )
+
+
+_embedded = None
+_embedded_error = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_server():
+    """Serve the API from a background thread of this process when AUTOXPERT_API_EMBED is set
+
+    Every Streamlit rerun calls this; the server is only started once. A
+    refused configuration is reported once and leaves the UI running.
+    """
+    global _embedded, _embedded_error
+    if _embedded is None and _embedded_error is None and get_bool_setting("AUTOXPERT_API_EMBED"):
+        with _embedded_lock:
+            if _embedded is None and _embedded_error is None:
+                try:
+                    server = create_server(
+                        get_setting("AUTOXPERT_API_HOST", DEFAULT_HOST),
+                        get_int_setting("AUTOXPERT_API_PORT", DEFAULT_PORT)
+                    )
+                except ValueError as e:
+                    _embedded_error = str(e)
+                    print(f"AutoXpert API not started: {e}", file=sys.stderr)
+                    return None
+                threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+                _embedded = server
+    return _embedded
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serve the AutoXpert analyzers over HTTP")
+    parser.add_argument("--host", default=get_setting("AUTOXPERT_API_HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=get_int_setting("AUTOXPERT_API_PORT", DEFAULT_PORT))
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    try:
+        server = create_server(args.host, args.port, args.verbose)
+    except ValueError as e:
+        parser.error(str(e))
+    warm_up_backends()
+    print(f"AutoXpert API listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
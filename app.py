@@ -4,7 +4,8 @@ import json
 from PIL import Image
 import io
 import base64
-from pages import home, damage_detection, tire_analysis, market_price, feedback
+from pages import home, damage_detection, tire_analysis, market_price, full_inspection, history, feedback
+from api_server import start_embedded_server
 
 # Page configuration
 st.set_page_config(
@@ -108,6 +109,9 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Serve the partner HTTP API from this process when enabled
+start_embedded_server()
+
 # Initialize session state
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 'home'
@@ -126,5 +130,9 @@ elif st.session_state.current_page == 'tire':
     tire_analysis.show()
 elif st.session_state.current_page == 'market':
     market_price.show()
+elif st.session_state.current_page == 'inspection':
+    full_inspection.show()
+elif st.session_state.current_page == 'history':
+    history.show()
 elif st.session_state.current_page == 'feedback':
     feedback.show()
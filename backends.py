@@ -0,0 +1,305 @@
+"""
+Inference backends
+
+A backend answers an analysis request for a feature: the CPU analyzers in this
+process, OpenRouter, or any OpenAI-compatible vision server (such as an
+on-prem model on the LAN). Backends, their latency/cost profiles and the
+per-feature routes are read from data/backends.json (AUTOXPERT_BACKENDS_CONFIG),
+and a route can be overridden per feature with AUTOXPERT_<FEATURE>_BACKENDS,
+e.g. "cpu,onprem" to keep damage traffic on-prem without code changes.
+Chat backends with "json_mode" set ask the model for a JSON object reply.
+
+The first available backend on a route is the fast tier; the rest are tried
+in order, failing over to the next, when the fast tier isn't confident.
+"""
+
+import abc
+import json
+import os
+import threading
+
+from analysis_cache import get_analysis_cache, hash_image_bytes, make_cache_key
+from blob_store import get_blob_store
+from config import get_setting, get_int_setting, get_float_setting
+from image_processing import prepare_image
+from json_stream import JSONFieldExtractor
+from local_analyzers import classify_damage, estimate_tire
+from openrouter_client import OpenRouterClient, get_client
+from perceptual_hash import make_namespace, find_similar_result, remember_result
+from pricing import get_pricing_model
+from rate_limiter import get_rate_limiter
+from resilience import get_deadline, get_resilience
+from single_flight import get_single_flight
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'backends.json')
+
+
+class RemoteUnavailable(Exception):
+    """Raised when no remote backend can be asked at all"""
+
+
+class Backend(abc.ABC):
+    """Something that can answer an analysis request"""
+
+    kind = 'remote'
+
+    def __init__(self, name, latency_ms=None, cost_per_call=0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.cost_per_call = cost_per_call
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'cost': 0.0}
+
+    @property
+    def available(self):
+        return True
+
+    @property
+    def model(self):
+        """Name of the model behind this backend, if it has one"""
+        return None
+
+    @abc.abstractmethod
+    def analyze(self, feature, image_bytes, prompt=None, inputs=None, parse=None, on_partial=None):
+        """The feature's result for an image (and inputs); raises when it can't answer"""
+
+    def warm_up(self):
+        """Prepare for an upcoming request; a no-op unless there is a connection to open"""
+
+    def record(self, succeeded):
+        with self._lock:
+            self._stats['calls'] += 1
+            if succeeded:
+                self._stats['cost'] += self.cost_per_call
+            else:
+                self._stats['failures'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'kind': self.kind,
+            'available': self.available,
+            'latency_ms': self.latency_ms,
+            'cost_per_call': self.cost_per_call,
+        })
+        return stats
+
+
+class CPUBackend(Backend):
+    """The OpenCV and pricing-curve analyzers running in this process"""
+
+    kind = 'local'
+
+    def analyze(self, feature, image_bytes, prompt=None, inputs=None, parse=None, on_partial=None):
+        if feature == 'damage':
+            return classify_damage(image_bytes)
+        if feature == 'tire':
+            return estimate_tire(image_bytes)
+        if feature == 'market':
+            result = get_pricing_model().predict(**(inputs or {}))
+            if image_bytes:
+                # The curves never look at the photo, so they can't vouch for the condition it shows
+                result["confidence"] = round(result["confidence"] - 0.3, 2)
+            return result
+        raise ValueError(f"No local analyzer for {feature}")
+
+
+def _stream_reply(chunks, on_partial):
+    """Join a streamed reply, passing completed fields to on_partial as they appear"""
+    extractor = JSONFieldExtractor()
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if extractor.feed(chunk):
+            on_partial(dict(extractor.fields))
+    return "".join(parts)
+
+
+class ChatBackend(Backend):
+    """A vision model behind an OpenAI-compatible chat completions API"""
+
+    def __init__(self, name, client, latency_ms=None, cost_per_call=0.0, json_mode=False):
+        super().__init__(name, latency_ms, cost_per_call)
+        self.client = client
+        # Servers that support it constrain the reply to a JSON object
+        self.options = {"response_format": {"type": "json_object"}} if json_mode else {}
+
+    @property
+    def available(self):
+        return self.client.configured
+
+    @property
+    def model(self):
+        return self.client.model
+
+    def warm_up(self):
+        if self.available:
+            self.client.warm_up()
+
+    def analyze(self, feature, image_bytes, prompt=None, inputs=None, parse=json.loads, on_partial=None):
+        """Ask the model, reusing cached results for identical or near-identical photos
+
+        When on_partial is given the reply is streamed and on_partial receives
+        the fields completed so far each time another one finishes.
+        """
+        client = self.client
+
+        # Serve repeat views of the same photo from the shared cache
+        cache = get_analysis_cache()
+        cache_key = make_cache_key(image_bytes, prompt, client.model, inputs, self.name, client.base_url)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Re-compressed, cropped or screenshotted copies of an analysed photo
+        namespace = make_namespace(feature, client.model, inputs, self.name, client.base_url)
+        similar, image_hash = find_similar_result(namespace, image_bytes)
+        if similar is not None:
+            return similar
+
+        if not client.configured:
+            raise RemoteUnavailable(f"Backend {self.name} is not configured")
+
+        def fetch():
+            # The upload goes as it is when it can; otherwise from its stored analysis rendition
+            prepared = prepare_image(
+                image_bytes, rendition=get_blob_store().read(hash_image_bytes(image_bytes), 'analysis')
+            )
+
+            def attempt(timeout):
+                if on_partial is None:
+                    return client.analyze_image(
+                        prompt, prepared.base64, prepared.mime_type, timeout=timeout, **self.options
+                    )
+                return _stream_reply(
+                    client.analyze_image_stream(
+                        prompt, prepared.base64, prepared.mime_type, timeout=timeout, **self.options
+                    ),
+                    on_partial
+                )
+
+            # Streamed attempts report partial fields, so they are never hedged
+            content = get_resilience(self.name).call(feature, attempt, hedge=False if on_partial else None)
+            analysis = parse(content)
+
+            cache.set(cache_key, analysis)
+            remember_result(namespace, image_hash, analysis)
+            return analysis
+
+        # Sessions asking for the same analysis at once share one request;
+        # only the caller that actually sends it sees streamed fields, and the
+        # others wait no longer than the feature's deadline
+        return get_single_flight().do(cache_key, fetch, timeout=get_deadline(feature))
+
+
+def _build_backend(name, spec):
+    kind = spec.get('type')
+    profile = {
+        'latency_ms': spec.get('latency_ms'),
+        'cost_per_call': float(spec.get('cost_per_call', 0.0)),
+    }
+    if kind == 'cpu':
+        return CPUBackend(name, **profile)
+    if kind == 'openrouter':
+        return ChatBackend(name, get_client(), json_mode=bool(spec.get('json_mode')), **profile)
+    if kind == 'openai_compatible':
+        prefix = spec.get('settings_prefix', f"AUTOXPERT_{name.upper()}")
+        client = OpenRouterClient(
+            api_key=get_setting(f"{prefix}_API_KEY", ""),
+            base_url=get_setting(f"{prefix}_URL", spec.get('base_url', "")),
+            model=get_setting(f"{prefix}_MODEL", spec.get('model', "")),
+            timeout=get_float_setting(f"{prefix}_TIMEOUT", 30),
+            pool_size=get_int_setting(f"{prefix}_POOL_SIZE", 10),
+            api_key_required=False,
+            limiter=get_rate_limiter(name, prefix)
+        )
+        return ChatBackend(name, client, json_mode=bool(spec.get('json_mode')), **profile)
+    raise ValueError(f"Unknown backend type {kind!r} for {name}")
+
+
+class BackendRegistry:
+    """Configured backends and the per-feature routes through them"""
+
+    def __init__(self, config):
+        self.backends = {name: _build_backend(name, spec) for name, spec in config['backends'].items()}
+        self.routes = config.get('routes', {})
+        for route in self.routes.values():
+            for name in route:
+                if name not in self.backends:
+                    raise ValueError(f"Route refers to unknown backend {name!r}")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def route(self, feature):
+        """Available backends for a feature, fast tier first"""
+        override = get_setting(f"AUTOXPERT_{feature.upper()}_BACKENDS")
+        if override:
+            names = [name.strip() for name in override.split(',') if name.strip()]
+        elif feature in self.routes:
+            names = self.routes[feature]
+        else:
+            # Unrouted features go local first, then cheapest and fastest
+            names = sorted(
+                self.backends,
+                key=lambda name: (
+                    self.backends[name].kind != 'local',
+                    self.backends[name].cost_per_call,
+                    self.backends[name].latency_ms or 0
+                )
+            )
+        return [self.backends[name] for name in names if name in self.backends and self.backends[name].available]
+
+    def stats(self):
+        return {name: backend.stats() for name, backend in self.backends.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_backend_registry():
+    """Process-wide backend registry, loaded once from the config file"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = BackendRegistry.from_file(get_setting("AUTOXPERT_BACKENDS_CONFIG", DEFAULT_CONFIG_PATH))
+    return _registry
+
+
+def get_route(feature):
+    """(fast tier, escalation backends) for a feature"""
+    route = get_backend_registry().route(feature)
+    if not route:
+        raise RemoteUnavailable(f"No backend available for {feature}")
+    return route[0], route[1:]
+
+
+def analyze_with_failover(backends, feature, image_bytes, prompt=None, inputs=None, parse=json.loads, on_partial=None):
+    """Ask each backend in turn until one answers"""
+    errors = []
+    for backend in backends:
+        try:
+            result = backend.analyze(feature, image_bytes, prompt, inputs, parse, on_partial)
+        except Exception as e:
+            backend.record(False)
+            errors.append(f"{backend.name}: {e}")
+            continue
+        backend.record(True)
+        return dict(result, backend=backend.name)
+    raise RemoteUnavailable("; ".join(errors) or "No remote backend configured")
+
+
+def warm_up_backends():
+    """Open connections to every configured remote backend ahead of the first analysis"""
+    for backend in get_backend_registry().backends.values():
+        backend.warm_up()
+
+
+def get_backend_stats():
+    """Calls, failures, spend and profile per backend"""
+    return get_backend_registry().stats()
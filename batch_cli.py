@@ -0,0 +1,226 @@
+"""
+Headless batch analysis
+
+Runs the damage, tire or price analysis over a directory of photos or a
+manifest without the Streamlit UI, for backlogs such as archived insurance
+photos. The CPU analyzers run in a process pool; photos the local analyzer
+isn't confident about are escalated to the remote backends through a bounded
+asyncio pool (the remote calls still go through the shared rate limiter,
+retries and circuit breaker). One JSON line per photo is appended to the
+output file as soon as it finishes, and a rerun skips photos already in the
+output, so an interrupted run resumes where it stopped.
+
+    python batch_cli.py photos/ --feature damage --output damage.jsonl
+    python batch_cli.py manifest.csv --output prices.jsonl
+
+A manifest is a CSV file or JSON-lines file with a "path" per photo and
+optionally "id", "feature", "brand", "model_year" and "mileage".
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from analyzers import damage_plan, tire_plan, price_plan, price_inputs
+from config import get_int_setting
+from inference_router import run_local, run_remote
+from local_analyzers import IMAGE_EXTENSIONS
+
+FEATURES = ('damage', 'tire', 'market')
+
+
+def _plan(feature, image_bytes, inputs):
+    if feature == 'damage':
+        return damage_plan(image_bytes)
+    if feature == 'tire':
+        return tire_plan(image_bytes)
+    if feature == 'market':
+        return price_plan(image_bytes, **inputs)
+    raise ValueError(f"Unknown feature {feature!r}")
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def analyze_local(feature, path, inputs):
+    """Fast-tier analysis of one photo; runs in a worker process"""
+    local, _, _ = _plan(feature, _read(path), inputs)
+    return run_local(feature, local)
+
+
+def analyze_remote(feature, path, inputs, local):
+    """Escalate one photo to the remote backends, falling back to the local result"""
+    _, remote, agree = _plan(feature, _read(path), inputs)
+    return run_remote(feature, local, remote, agree)
+
+
+def _manifest_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def iter_items(source, feature, inputs):
+    """(id, feature, path, inputs) for every photo in a directory or manifest"""
+    if os.path.isdir(source):
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), feature, path, inputs
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    for row in _manifest_rows(source):
+        path = os.path.join(base_dir, row['path'])
+        row_inputs = dict(inputs)
+        if row.get('brand'):
+            row_inputs = price_inputs(
+                row['brand'],
+                int(row['model_year']) if row.get('model_year') else None,
+                int(row['mileage']) if row.get('mileage') else None
+            )
+        yield row.get('id') or row['path'], row.get('feature') or feature, path, row_inputs
+
+
+def load_completed(output, retry_errors=False):
+    """Ids already recorded in the output, dropping a last line cut off by a crash"""
+    completed = set()
+    if not os.path.exists(output):
+        return completed
+
+    good_bytes = 0
+    with open(output, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            good_bytes += len(line)
+            if record.get('status') == 'ok' or not retry_errors:
+                completed.add(record['id'])
+            else:
+                completed.discard(record['id'])
+    if good_bytes < os.path.getsize(output):
+        with open(output, 'r+b') as f:
+            f.truncate(good_bytes)
+    return completed
+
+
+class BatchRunner:
+    """Process-pool local analysis and a bounded async pool of remote escalations"""
+
+    def __init__(self, output, processes, concurrency, local_only=False, progress_every=100):
+        self.output = output
+        self.processes = processes
+        self.concurrency = concurrency
+        self.local_only = local_only
+        self.progress_every = progress_every
+        self.counts = {'ok': 0, 'error': 0, 'escalated': 0}
+
+    async def _analyze(self, loop, item):
+        item_id, feature, path, inputs = item
+        start = time.perf_counter()
+        record = {'id': item_id, 'feature': feature, 'path': path}
+        try:
+            result, confident = await loop.run_in_executor(self._processes, analyze_local, feature, path, inputs)
+            if not confident and not self.local_only:
+                self.counts['escalated'] += 1
+                async with self._remote_slots:
+                    result = await loop.run_in_executor(
+                        self._threads, analyze_remote, feature, path, inputs, result
+                    )
+            record.update(status='ok', result=result)
+        except Exception as e:
+            record.update(status='error', error=f"{type(e).__name__}: {e}")
+        record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return record
+
+    def _write(self, f, record):
+        f.write(json.dumps(record, default=str) + "\n")
+        f.flush()
+        self.counts[record['status']] += 1
+        done = self.counts['ok'] + self.counts['error']
+        if done % self.progress_every == 0:
+            rate = done / (time.perf_counter() - self._started)
+            print(
+                f"{done} done ({self.counts['error']} errors, {self.counts['escalated']} escalated), "
+                f"{rate:.1f} photos/s",
+                file=sys.stderr
+            )
+
+    async def run(self, items):
+        loop = asyncio.get_running_loop()
+        self._remote_slots = asyncio.Semaphore(self.concurrency)
+        self._started = time.perf_counter()
+        # Only a bounded window of photos is in flight, however long the backlog
+        max_pending = self.processes * 4 + self.concurrency * 2
+
+        with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn')) as processes, \
+                ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch-remote") as threads, \
+                open(self.output, 'a', encoding='utf-8') as f:
+            self._processes = processes
+            self._threads = threads
+            pending = set()
+            for item in items:
+                if len(pending) >= max_pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        self._write(f, task.result())
+                pending.add(asyncio.ensure_future(self._analyze(loop, item)))
+            for task in asyncio.as_completed(pending):
+                self._write(f, await task)
+        return self.counts
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Analyze a directory or manifest of vehicle photos")
+    parser.add_argument("source", help="directory of photos, or a .csv/.jsonl manifest")
+    parser.add_argument("--output", required=True, help="JSON-lines file to append results to")
+    parser.add_argument("--feature", choices=FEATURES, default='damage',
+                        help="analysis to run when the manifest doesn't say (default: damage)")
+    parser.add_argument("--brand", help="vehicle brand for price analyses")
+    parser.add_argument("--model-year", type=int)
+    parser.add_argument("--mileage", type=int)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the local analyzers")
+    parser.add_argument("--concurrency", type=int, default=get_int_setting("AUTOXPERT_BATCH_CONCURRENCY", 8),
+                        help="remote calls in flight at once")
+    parser.add_argument("--local-only", action="store_true", help="never escalate to a remote backend")
+    parser.add_argument("--retry-errors", action="store_true", help="re-run photos that failed last time")
+    args = parser.parse_args(argv)
+    if os.path.isdir(args.source) and args.feature == 'market' and not args.brand:
+        parser.error("--brand is required to price a directory of photos")
+
+    inputs = price_inputs(args.brand, args.model_year, args.mileage) if args.brand else {}
+    completed = load_completed(args.output, args.retry_errors)
+    items = (item for item in iter_items(args.source, args.feature, inputs) if item[0] not in completed)
+    if completed:
+        print(f"Resuming: skipping {len(completed)} photos already in {args.output}", file=sys.stderr)
+
+    runner = BatchRunner(args.output, max(1, args.processes), max(1, args.concurrency), args.local_only)
+    counts = asyncio.run(runner.run(items))
+    print(
+        f"Finished: {counts['ok']} analysed, {counts['error']} failed, {counts['escalated']} escalated",
+        file=sys.stderr
+    )
+    return 1 if counts['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
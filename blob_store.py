@@ -0,0 +1,207 @@
+"""
+Content-addressed image blob store
+
+Each unique upload is stored once on disk under its SHA-256 (the same digest
+the analysis cache and history use), however many sessions upload it. At
+ingest the image is decoded once and a few downscaled JPEG renditions are
+written next to it:
+
+    thumb      small grid thumbnails
+    preview    what the pages display
+    analysis   the size sent to the vision API (AUTOXPERT_IMAGE_MAX_SIDE)
+
+so reruns and remote calls never decode or resize the full-resolution upload
+again. The pages ingest uploads with put_async, so the decoding and writing
+happen on a small worker pool rather than the Streamlit script thread. Like the analysis cache, the store has a TTL and a size cap: reading a
+rendition marks the image as used, and eviction drops an image together with
+all of its renditions, oldest first.
+"""
+
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from analysis_cache import hash_image_bytes
+from config import get_data_dir, get_int_setting
+
+RENDITION_QUALITY = 85
+
+EVICT_EVERY_PUTS = 20
+
+
+def get_rendition_sizes():
+    """Longest side in pixels of each rendition"""
+    return {
+        'thumb': get_int_setting("AUTOXPERT_THUMB_SIDE", 256),
+        'preview': get_int_setting("AUTOXPERT_PREVIEW_SIDE", 1024),
+        'analysis': get_int_setting("AUTOXPERT_IMAGE_MAX_SIDE", 1280),
+    }
+
+
+def _to_rgb(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+class BlobStore:
+    """Original images and their renditions on disk, keyed by SHA-256"""
+
+    def __init__(self, root, rendition_sizes=None, ttl_seconds=7 * 24 * 3600, max_disk_bytes=500 * 1024 * 1024,
+                 ingest_workers=2):
+        self.root = root
+        self.rendition_sizes = rendition_sizes or get_rendition_sizes()
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._puts_since_eviction = 0
+        self._stats = {'ingested': 0, 'deduplicated': 0, 'bytes_stored': 0, 'reads': 0, 'misses': 0, 'evicted': 0}
+        self._ingest = ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="blob-ingest")
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest, rendition=None):
+        if rendition is None:
+            return os.path.join(self.root, 'original', digest[:2], digest)
+        return os.path.join(self.root, rendition, digest[:2], f"{digest}.jpg")
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats['bytes_stored'] += len(data)
+
+    def put(self, image_bytes, digest=None):
+        """Store an image and its renditions once; returns its digest"""
+        digest = digest or hash_image_bytes(image_bytes)
+        with self._lock:
+            self._puts_since_eviction += 1
+            run_eviction = self._puts_since_eviction >= EVICT_EVERY_PUTS
+            if run_eviction:
+                self._puts_since_eviction = 0
+        if run_eviction:
+            self.evict_disk()
+
+        # The thumbnail is written last, so its presence means the image is complete
+        if self._touch(self.path(digest, 'thumb')):
+            with self._lock:
+                self._stats['deduplicated'] += 1
+            return digest
+
+        self._write(self.path(digest), image_bytes)
+        image = _to_rgb(ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))))
+        # Largest first, each rendition shrinking the previous one rather than the original
+        for name, side in sorted(self.rendition_sizes.items(), key=lambda item: item[1], reverse=True):
+            if max(image.size) > side:
+                image.thumbnail((side, side), Image.LANCZOS)
+            buffered = io.BytesIO()
+            image.save(buffered, format='JPEG', quality=RENDITION_QUALITY, optimize=True)
+            self._write(self.path(digest, name), buffered.getvalue())
+
+        with self._lock:
+            self._stats['ingested'] += 1
+        return digest
+
+    def put_async(self, image_bytes, digest=None):
+        """Store an image on the ingest pool; returns a future for put()'s result
+
+        Until it finishes, read() misses the image's renditions.
+        """
+        return self._ingest.submit(self.put, image_bytes, digest)
+
+    def read(self, digest, rendition=None):
+        """Bytes of an image or rendition, or None if it isn't stored"""
+        path = self.path(digest, rendition)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        # Mark the whole image as used; eviction goes by the thumbnail's mtime
+        self._touch(self.path(digest, 'thumb'))
+        with self._lock:
+            self._stats['reads'] += 1
+        return data
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def evict_disk(self):
+        """Drop expired images, then the least recently used until under the size cap"""
+        now = time.time()
+        images = {}
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entry = images.setdefault(name.split('.')[0], {'used_at': 0.0, 'size': 0, 'has_thumb': False})
+                entry['size'] += info.st_size
+                # Reads touch the thumbnail; an image still being written has none yet
+                # and counts as used when its newest file was written
+                if os.path.basename(os.path.dirname(os.path.dirname(path))) == 'thumb':
+                    entry['used_at'], entry['has_thumb'] = info.st_mtime, True
+                elif not entry['has_thumb']:
+                    entry['used_at'] = max(entry['used_at'], info.st_mtime)
+
+        total = sum(entry['size'] for entry in images.values())
+        for digest, entry in sorted(images.items(), key=lambda item: item[1]['used_at']):
+            expired = now - entry['used_at'] > self.ttl_seconds
+            if not expired and total <= self.max_disk_bytes:
+                break
+            self._remove_image(digest)
+            total -= entry['size']
+
+    def _remove_image(self, digest):
+        # Thumbnail first, so put() never mistakes a half-removed image for a stored one
+        names = ['thumb'] + [name for name in self.rendition_sizes if name != 'thumb'] + [None]
+        for name in names:
+            try:
+                os.remove(self.path(digest, name))
+            except OSError:
+                pass
+        with self._lock:
+            self._stats['evicted'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Process-wide blob store under the data directory"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore(
+                    os.path.join(get_data_dir(), 'blobs'),
+                    ttl_seconds=get_int_setting("AUTOXPERT_BLOB_TTL_SECONDS", 7 * 24 * 3600),
+                    max_disk_bytes=get_int_setting("AUTOXPERT_BLOB_MAX_DISK_MB", 500) * 1024 * 1024,
+                    ingest_workers=get_int_setting("AUTOXPERT_BLOB_INGEST_WORKERS", 2)
+                )
+    return _store
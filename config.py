@@ -0,0 +1,54 @@
+"""
+Application settings resolved from environment variables or Streamlit secrets
+"""
+
+import os
+import sys
+
+
+def get_setting(name, default=None):
+    """Read a setting from the environment, falling back to Streamlit secrets"""
+    value = os.getenv(name)
+    if value:
+        return value
+
+    # Only consult st.secrets when running inside the Streamlit app
+    if 'streamlit' in sys.modules:
+        try:
+            import streamlit as st
+            return st.secrets.get(name, default)
+        except Exception:
+            return default
+
+    return default
+
+
+def get_int_setting(name, default):
+    """Read an integer setting, using the default when missing or invalid"""
+    try:
+        return int(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_float_setting(name, default):
+    """Read a float setting, using the default when missing or invalid"""
+    try:
+        return float(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_bool_setting(name, default=False):
+    """Read a yes/no setting such as 1/0, true/false or on/off"""
+    value = get_setting(name, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_data_dir():
+    """Directory for caches and local databases (created on first use)"""
+    path = get_setting("AUTOXPERT_DATA_DIR", ".autoxpert")
+    os.makedirs(path, exist_ok=True)
+    return path
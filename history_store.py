@@ -0,0 +1,199 @@
+"""
+Persistent analysis history
+
+Every final damage, tire and price result is stored in SQLite (history.db in
+the data directory, WAL mode so readers never wait for the writer) with the
+image hash, the form inputs, the backend and model that answered, its latency
+and the vehicle or customer reference it was made for. A returning customer's
+photo is answered from the stored remote result instead of paying for another
+remote analysis, as long as the same backend and model would answer it now and
+the result is younger than the analysis cache TTL. The "previous inspections"
+page pages through a vehicle's or customer's history with keyset pagination.
+
+Lookups go through indexes on (image hash, feature, time), (vehicle, time)
+and (customer, time), so finding the rows stays at a few index probes however
+large the table grows; only the rows returned are then read from the table.
+
+The vehicle and customer a result belongs to are taken from the surrounding
+history_scope(); worker pools that run analyses for a caller copy the
+caller's context so the scope follows the work.
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import get_data_dir, get_setting
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    feature TEXT NOT NULL,
+    image_hash TEXT,
+    inputs TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    backend TEXT,
+    model TEXT,
+    latency_ms REAL,
+    vehicle_id TEXT,
+    customer_id TEXT,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_by_image ON analyses (image_hash, feature, created_at);
+CREATE INDEX IF NOT EXISTS analyses_by_vehicle ON analyses (vehicle_id, created_at, id) WHERE vehicle_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS analyses_by_customer ON analyses (customer_id, created_at, id) WHERE customer_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS analyses_by_time ON analyses (created_at, id);
+"""
+
+_COLUMNS = ('id', 'created_at', 'feature', 'image_hash', 'inputs', 'kind', 'backend', 'model',
+            'latency_ms', 'vehicle_id', 'customer_id', 'result')
+
+_scope = contextvars.ContextVar('history_scope', default={})
+
+
+@contextmanager
+def history_scope(vehicle_id=None, customer_id=None):
+    """Attribute analyses run inside the block to a vehicle and/or customer"""
+    token = _scope.set({'vehicle_id': vehicle_id or None, 'customer_id': customer_id or None})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope():
+    """The vehicle_id and customer_id analyses are currently attributed to"""
+    return dict(_scope.get())
+
+
+def _inputs_key(inputs):
+    return json.dumps(inputs or {}, sort_keys=True, default=str)
+
+
+class HistoryStore:
+    """Append-only SQLite store of analysis results"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'writes': 0, 'write_errors': 0, 'reused': 0}
+        db = self._connect()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(_SCHEMA)
+
+    def _connect(self):
+        # One connection per thread; WAL lets them read while another writes
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _rows(self, sql, params):
+        rows = []
+        for row in self._connect().execute(sql, params).fetchall():
+            record = dict(zip(_COLUMNS, row))
+            record['inputs'] = json.loads(record['inputs'])
+            record['result'] = json.loads(record['result'])
+            rows.append(record)
+        return rows
+
+    def record(self, feature, image_hash, inputs, result, kind, backend=None, latency_ms=None,
+               vehicle_id=None, customer_id=None, model=None):
+        """Store a final result; failures are counted rather than raised"""
+        try:
+            self._connect().execute(
+                f"INSERT INTO analyses ({', '.join(_COLUMNS[1:])}) VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})",
+                (time.time(), feature, image_hash, _inputs_key(inputs), kind, backend, model, latency_ms,
+                 vehicle_id, customer_id, json.dumps(result, default=str))
+            )
+            outcome = 'writes'
+        except (sqlite3.Error, TypeError, ValueError):
+            outcome = 'write_errors'
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def find_latest(self, feature, image_hash, inputs=None, kind=None, backends=None, max_age=None):
+        """Most recent result for this photo and inputs, optionally only from a local or remote backend
+
+        backends limits the match to results from these (backend, model) pairs,
+        and max_age to results stored within that many seconds.
+        """
+        sql = (
+            f"SELECT {', '.join(_COLUMNS)} FROM analyses "
+            "WHERE image_hash = ? AND feature = ? AND inputs = ?"
+        )
+        params = [image_hash, feature, _inputs_key(inputs)]
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if backends is not None:
+            if not backends:
+                return None
+            sql += " AND (" + " OR ".join("(backend = ? AND model IS ?)" for _ in backends) + ")"
+            for backend, model in backends:
+                params.extend((backend, model))
+        if max_age is not None:
+            sql += " AND created_at >= ?"
+            params.append(time.time() - max_age)
+        rows = self._rows(sql + " ORDER BY created_at DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    def note_reused(self):
+        with self._lock:
+            self._stats['reused'] += 1
+
+    def list_history(self, vehicle_id=None, customer_id=None, before=None, limit=20):
+        """A page of results, newest first, and the cursor for the next page (None on the last)
+
+        before is the cursor returned with the previous page.
+        """
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM analyses"
+        where = []
+        params = []
+        if vehicle_id:
+            where.append("vehicle_id = ?")
+            params.append(vehicle_id)
+        if customer_id:
+            where.append("customer_id = ?")
+            params.append(customer_id)
+        if before is not None:
+            # Keyset pagination: seek past the last row shown instead of OFFSET
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._rows(sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_cursor
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Process-wide history store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore(get_setting("AUTOXPERT_HISTORY_DB", os.path.join(get_data_dir(), 'history.db')))
+    return _store
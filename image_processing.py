@@ -0,0 +1,161 @@
+"""
+Outbound image preprocessing for the vision API
+
+Uploads are rotated according to their EXIF orientation, downscaled to a
+configurable longest side and re-encoded as JPEG or WebP so every request body
+stays within a per-request byte budget. Uploads that are already compact,
+upright JPEG/WebP files are base64-encoded straight from the upload buffer;
+any other upload starts from its stored analysis rendition, when there is one,
+rather than being decoded again.
+"""
+
+import base64
+import io
+import threading
+from collections import namedtuple
+
+from PIL import Image, ImageOps
+
+from config import get_setting, get_int_setting
+
+PreparedImage = namedtuple('PreparedImage', ['base64', 'mime_type', 'width', 'height', 'size'])
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+# Lowest quality tried before the image is shrunk further to meet the budget
+MIN_QUALITY = 40
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+_metrics = {'images': 0, 'original_bytes': 0, 'sent_bytes': 0, 'resized': 0, 'passed_through': 0}
+_metrics_lock = threading.Lock()
+
+
+def _flatten(image, image_format):
+    """Convert to a mode the target format can store"""
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            return background
+        return image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def _encode(image, image_format, quality):
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, quality=quality, optimize=image_format == 'JPEG')
+    return buffered.getvalue()
+
+
+def _base64_size(raw_size):
+    return 4 * ((raw_size + 2) // 3)
+
+
+def _can_pass_through(image, size, max_side, max_bytes):
+    """Whether the upload can be sent exactly as received"""
+    if image.format not in ('JPEG', 'WEBP'):
+        return False
+    if max(image.size) > max_side or _base64_size(size) > max_bytes:
+        return False
+    try:
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return False
+    return orientation == 1
+
+
+def _as_is(image, image_bytes, original_size, resized, passed_through):
+    """The image sent exactly as given, with no decoding or re-encoding"""
+    _record(original_size, len(image_bytes), resized, passed_through)
+    return PreparedImage(
+        base64=base64.b64encode(image_bytes).decode(),
+        mime_type=MIME_TYPES[image.format],
+        width=image.width,
+        height=image.height,
+        size=len(image_bytes)
+    )
+
+
+def prepare_image(image_bytes, max_side=None, image_format=None, quality=None, max_bytes=None, rendition=None):
+    """Orient, downscale and re-encode an upload for the vision API
+
+    rendition is an optional stored, already downscaled copy of the upload
+    (see blob_store.py); it is only used when the upload itself can't be sent
+    as it is.
+    """
+    max_side = max_side or get_int_setting("AUTOXPERT_IMAGE_MAX_SIDE", 1280)
+    image_format = (image_format or get_setting("AUTOXPERT_IMAGE_FORMAT", "JPEG")).upper()
+    quality = quality or get_int_setting("AUTOXPERT_IMAGE_QUALITY", 85)
+    max_bytes = max_bytes or get_int_setting("AUTOXPERT_IMAGE_MAX_BYTES", 1024 * 1024)
+    if image_format not in ('JPEG', 'WEBP'):
+        image_format = 'JPEG'
+
+    # Image.open only parses the header, so this check never decodes pixels
+    original_size = len(image_bytes)
+    image = Image.open(io.BytesIO(image_bytes))
+    if _can_pass_through(image, original_size, max_side, max_bytes):
+        return _as_is(image, image_bytes, original_size, False, True)
+
+    if rendition is not None:
+        original_side = max(image.size)
+        image_bytes = rendition
+        image = Image.open(io.BytesIO(rendition))
+        if _can_pass_through(image, len(rendition), max_side, max_bytes):
+            return _as_is(image, rendition, original_size, max(image.size) < original_side, False)
+
+    image = ImageOps.exif_transpose(image)
+    image = _flatten(image, image_format)
+
+    resized = max(image.size) > max_side
+    if resized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    # Step quality down first, then shrink, until the base64 body fits the budget
+    encoded = _encode(image, image_format, quality)
+    while _base64_size(len(encoded)) > max_bytes:
+        if quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 10)
+        elif max(image.size) > 256:
+            image = image.resize(
+                (max(1, int(image.width * 0.75)), max(1, int(image.height * 0.75))),
+                Image.LANCZOS
+            )
+            resized = True
+        else:
+            break
+        encoded = _encode(image, image_format, quality)
+
+    _record(original_size, len(encoded), resized)
+    return PreparedImage(
+        base64=base64.b64encode(encoded).decode(),
+        mime_type=MIME_TYPES[image_format],
+        width=image.width,
+        height=image.height,
+        size=len(encoded)
+    )
+
+
+def _record(original_size, sent_size, resized, passed_through=False):
+    with _metrics_lock:
+        _metrics['images'] += 1
+        _metrics['original_bytes'] += original_size
+        _metrics['sent_bytes'] += sent_size
+        _metrics['resized'] += int(resized)
+        _metrics['passed_through'] += int(passed_through)
+
+
+def get_metrics():
+    """Totals of bytes received from uploads versus bytes sent upstream"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics['bytes_saved'] = max(0, metrics['original_bytes'] - metrics['sent_bytes'])
+    return metrics
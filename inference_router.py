@@ -0,0 +1,139 @@
+"""
+Tiered inference routing
+
+The fast local analyzer answers first; the remote vision model is only called
+when the local confidence is below the feature's threshold. Escalation rate,
+latency split and local/remote agreement are recorded so thresholds can be
+tuned from real traffic.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import get_float_setting
+
+# Local answers at or above these confidences are returned without a remote call.
+# For market, the price curves give 0.85 for a known brand with model year and
+# mileage inside the curves, but never look at the photo: a request with a photo
+# always escalates so the vision model can judge the condition it shows. Without
+# a photo there is nothing to escalate with and the curves' answer is final.
+DEFAULT_THRESHOLDS = {
+    'damage': 0.85,
+    'tire': 0.85,
+    'market': 0.8,
+}
+
+LATENCY_WINDOW = 500
+
+
+def get_threshold(feature):
+    """Per-feature local confidence threshold (AUTOXPERT_<FEATURE>_LOCAL_THRESHOLD)"""
+    return get_float_setting(
+        f"AUTOXPERT_{feature.upper()}_LOCAL_THRESHOLD",
+        DEFAULT_THRESHOLDS.get(feature, 0.85)
+    )
+
+
+class RouterMetrics:
+    """Counters and recent latencies for one feature"""
+
+    def __init__(self):
+        self.requests = 0
+        self.served_locally = 0
+        self.escalations = 0
+        self.remote_failures = 0
+        self.comparisons = 0
+        self.agreements = 0
+        self.local_latency_ms = deque(maxlen=LATENCY_WINDOW)
+        self.remote_latency_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        def percentile(values, q):
+            return float(np.percentile(values, q)) if values else None
+
+        return {
+            'requests': self.requests,
+            'served_locally': self.served_locally,
+            'escalations': self.escalations,
+            'escalation_rate': self.escalations / self.requests if self.requests else 0.0,
+            'remote_failures': self.remote_failures,
+            'agreement_rate': self.agreements / self.comparisons if self.comparisons else None,
+            'local_p50_ms': percentile(self.local_latency_ms, 50),
+            'remote_p50_ms': percentile(self.remote_latency_ms, 50),
+            'remote_p95_ms': percentile(self.remote_latency_ms, 95),
+        }
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _feature_metrics(feature):
+    with _metrics_lock:
+        return _metrics.setdefault(feature, RouterMetrics())
+
+
+def get_router_metrics(feature=None):
+    """Snapshot of routing metrics for one feature or all of them"""
+    with _metrics_lock:
+        if feature is not None:
+            metrics = _metrics.get(feature)
+            return metrics.snapshot() if metrics else RouterMetrics().snapshot()
+        return {name: metrics.snapshot() for name, metrics in _metrics.items()}
+
+
+def run_local(feature, local_analyze, threshold=None):
+    """Run the local analyzer; returns (result, confident enough to skip the remote)"""
+    threshold = get_threshold(feature) if threshold is None else threshold
+    metrics = _feature_metrics(feature)
+
+    start = time.perf_counter()
+    local = local_analyze()
+    local_ms = (time.perf_counter() - start) * 1000
+
+    confident = local.get("confidence", 0) >= threshold
+    with _metrics_lock:
+        metrics.requests += 1
+        metrics.local_latency_ms.append(local_ms)
+        if confident:
+            metrics.served_locally += 1
+        else:
+            metrics.escalations += 1
+    return dict(local, source="local"), confident
+
+
+def run_remote(feature, local, remote_analyze, agree=None):
+    """Escalate to the remote analyzer, falling back to the local result on failure"""
+    metrics = _feature_metrics(feature)
+
+    start = time.perf_counter()
+    try:
+        remote = remote_analyze()
+    except Exception as e:
+        with _metrics_lock:
+            metrics.remote_failures += 1
+        return dict(local, source="fallback", remote_error=str(e))
+    remote_ms = (time.perf_counter() - start) * 1000
+
+    with _metrics_lock:
+        metrics.remote_latency_ms.append(remote_ms)
+        if agree is not None:
+            metrics.comparisons += 1
+            metrics.agreements += int(bool(agree(local, remote)))
+
+    return dict(remote, source="remote")
+
+
+def route(feature, local_analyze, remote_analyze, agree=None, threshold=None):
+    """Return the local result when confident enough, otherwise the remote one
+
+    remote_analyze may be None when the request can't be escalated; the local
+    result is then final.
+    """
+    local, confident = run_local(feature, local_analyze, 0.0 if remote_analyze is None else threshold)
+    if confident:
+        return local
+    return run_remote(feature, local, remote_analyze, agree)
@@ -0,0 +1,186 @@
+"""
+Full-vehicle inspection
+
+Runs the damage, tire and price analyses for one vehicle concurrently on a
+bounded thread pool and combines them into a single report. The analyses are
+I/O bound (remote calls) or release the GIL (OpenCV, numpy), so the wall time
+is close to the slowest single analysis rather than the sum of all three.
+
+A walk-around set of damage photos is analysed the same way: near-identical
+frames are dropped, the rest run concurrently, and the per-photo results that
+show damage are merged into one damage list per body panel.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from analyzers import analyze_damage, analyze_tire, predict_price
+from config import get_int_setting
+from inference_router import get_threshold
+from perceptual_hash import group_near_duplicates
+
+UNSPECIFIED_PANEL = "unspecified panel"
+
+FEATURES = ('damage', 'tire', 'market')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inspection_executor():
+    """Process-wide pool shared by all running inspections"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_int_setting("AUTOXPERT_INSPECTION_WORKERS", 6),
+                    thread_name_prefix="inspection"
+                )
+    return _executor
+
+
+def _timed(analyze):
+    start = time.perf_counter()
+    result = analyze()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def plan_inspection(photos, brand, model_year=None, mileage=None):
+    """Map each feature to the analysis it needs, skipping those without a photo
+
+    photos holds image bytes under 'damage', 'tire' and 'vehicle'; the price
+    analysis uses the vehicle photo, or the damage photo when there is none.
+    """
+    tasks = {}
+    if photos.get('damage'):
+        tasks['damage'] = lambda: analyze_damage(photos['damage'])
+    if photos.get('tire'):
+        tasks['tire'] = lambda: analyze_tire(photos['tire'])
+    vehicle = photos.get('vehicle') or photos.get('damage')
+    if vehicle:
+        tasks['market'] = lambda: predict_price(vehicle, brand, model_year, mileage)
+    return tasks
+
+
+def run_inspection(photos, brand, model_year=None, mileage=None):
+    """Analyze damage, tires and price in parallel and return one combined report"""
+    start = time.perf_counter()
+    tasks = plan_inspection(photos, brand, model_year, mileage)
+
+    executor = get_inspection_executor()
+    # Each task runs in a copy of the caller's context so its history scope applies
+    futures = {
+        executor.submit(contextvars.copy_context().run, _timed, analyze): feature
+        for feature, analyze in tasks.items()
+    }
+
+    report = {feature: None for feature in FEATURES}
+    report['errors'] = {}
+    report['timings_ms'] = {}
+    for future in as_completed(futures):
+        feature = futures[future]
+        try:
+            report[feature], report['timings_ms'][feature] = future.result()
+        except Exception as e:
+            # One failed analysis shouldn't sink the rest of the report
+            report['errors'][feature] = str(e)
+
+    report['wall_ms'] = (time.perf_counter() - start) * 1000
+    return report
+
+
+def shows_damage(result, threshold=None):
+    """Whether a per-photo result counts as damage found on the vehicle
+
+    The on-device classifier marks photos without clear evidence, and its
+    answers below the local damage threshold are guesses the vision model
+    would have been asked to confirm; neither is a repair to quote for.
+    """
+    if result.get("damage_found") is False:
+        return False
+    if result.get("source") in ("local", "fallback"):
+        threshold = get_threshold('damage') if threshold is None else threshold
+        return float(result.get("confidence", 0.0)) >= threshold
+    return True
+
+
+def merge_damage_results(results, threshold=None):
+    """Combine per-photo damage results into one entry per (panel, damage type)
+
+    Results that show no damage (see shows_damage) are left out. Photos of the
+    same panel are independent looks at the same damage, so their confidences
+    combine by noisy-OR: 1 - prod(1 - confidence). Photos that don't name a
+    panel are merged per damage type, since the walk-around is of one vehicle,
+    but keep the best single confidence rather than reinforcing each other.
+    """
+    merged = {}
+    for index, result in results:
+        if not shows_damage(result, threshold):
+            continue
+        panel = (result.get("panel") or "").strip().lower()
+        damage_type = result.get("type", "unknown")
+        entry = merged.setdefault((panel or UNSPECIFIED_PANEL, damage_type), {
+            "panel": panel or UNSPECIFIED_PANEL,
+            "type": damage_type,
+            "confidences": [],
+            "photos": [],
+            "descriptions": []
+        })
+        entry["confidences"].append(min(max(float(result.get("confidence", 0.0)), 0.0), 1.0))
+        entry["photos"].append(index)
+        if result.get("description"):
+            entry["descriptions"].append(result["description"])
+
+    damages = []
+    for entry in merged.values():
+        confidences = entry.pop("confidences")
+        if entry["panel"] == UNSPECIFIED_PANEL:
+            confidence = max(confidences)
+        else:
+            confidence = 1.0 - float(np.prod([1.0 - value for value in confidences]))
+        entry["confidence"] = round(confidence, 3)
+        damages.append(entry)
+    damages.sort(key=lambda damage: damage["confidence"], reverse=True)
+    return damages
+
+
+def analyze_damage_set(images, max_concurrency=None):
+    """Analyze a set of photos of one vehicle and merge them into a vehicle-level report"""
+    start = time.perf_counter()
+    max_concurrency = max_concurrency or get_int_setting("AUTOXPERT_PHOTO_CONCURRENCY", 4)
+
+    representatives = group_near_duplicates(images)
+    unique = [index for index, representative in representatives.items() if index == representative]
+
+    # Keep at most max_concurrency photos of this vehicle in flight at once
+    executor = get_inspection_executor()
+    pending = {}
+    results = {}
+    errors = {}
+    queue = list(unique)
+    while queue or pending:
+        while queue and len(pending) < max_concurrency:
+            index = queue.pop(0)
+            pending[executor.submit(contextvars.copy_context().run, analyze_damage, images[index])] = index
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                errors[index] = str(e)
+
+    # [index, value] pairs rather than int-keyed dicts, so the report survives
+    # the JSON round trip through the job queue unchanged
+    return {
+        "damages": merge_damage_results(sorted(results.items())),
+        "photos": [[index, result] for index, result in sorted(results.items())],
+        "duplicates": [[index, rep] for index, rep in sorted(representatives.items()) if index != rep],
+        "errors": [[index, error] for index, error in sorted(errors.items())],
+        "wall_ms": (time.perf_counter() - start) * 1000
+    }
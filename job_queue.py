@@ -0,0 +1,201 @@
+"""
+Background job queue for long analyses
+
+Analyses that take many seconds run on a pool of worker threads instead of
+the Streamlit script thread that asked for them; the page submits a job and
+polls its status. Jobs are recorded in SQLite (jobs.db in the data
+directory) under the submitting session and a key the page derives from the
+photos' content and inputs, so a rerun, or a re-upload of the same photos in
+the same session, picks up the job's result instead of starting over. Each session may
+only have a few jobs queued or running at once. Queue depth, wait time and
+run time are tracked for monitoring.
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import get_data_dir, get_int_setting
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+LATENCY_WINDOW = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (kind, key, submitted_at);
+CREATE INDEX IF NOT EXISTS jobs_by_session ON jobs (session_id, status);
+"""
+
+_COLUMNS = ('id', 'session_id', 'kind', 'key', 'status', 'result', 'error',
+            'submitted_at', 'started_at', 'finished_at')
+
+
+class JobLimitReached(Exception):
+    """Raised when a session already has as many jobs in progress as it may"""
+
+
+class JobQueue:
+    """Thread-pool job runner with job records persisted to SQLite"""
+
+    def __init__(self, path, workers=4, per_session_limit=2, retention_seconds=24 * 3600):
+        self.path = path
+        self.workers = workers
+        self.per_session_limit = per_session_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-job")
+        self._lock = threading.Lock()
+        self._wait_ms = deque(maxlen=LATENCY_WINDOW)
+        self._run_ms = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {'submitted': 0, 'reused': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+        # The callables behind unfinished jobs died with the previous process
+        now = time.time()
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart", now, QUEUED, RUNNING)
+        )
+        self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (now - retention_seconds,))
+
+    def _row(self, sql, params):
+        with self._lock:
+            row = self._db.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def get(self, job_id):
+        """The job record, or None if it is unknown or has been pruned"""
+        return self._row(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+
+    def find(self, session_id, kind, key):
+        """The session's most recent job for a kind of analysis of a given upload"""
+        return self._row(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE kind = ? AND key = ? AND session_id = ? "
+            "ORDER BY submitted_at DESC LIMIT 1",
+            (kind, key, session_id)
+        )
+
+    def submit(self, session_id, kind, key, fn):
+        """Queue fn() and return the job id, reusing the session's job already queued or done for the same key"""
+        existing = self.find(session_id, kind, key)
+        if existing is not None and existing['status'] != FAILED:
+            with self._lock:
+                self._stats['reused'] += 1
+            return existing['id']
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            (active,) = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE session_id = ? AND status IN (?, ?)",
+                (session_id, QUEUED, RUNNING)
+            ).fetchone()
+            if active >= self.per_session_limit:
+                self._stats['rejected'] += 1
+                raise JobLimitReached(
+                    f"{active} analyses are already in progress; wait for one to finish"
+                )
+            self._db.execute(
+                "INSERT INTO jobs (id, session_id, kind, key, status, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, session_id, kind, key, QUEUED, time.time())
+            )
+            self._stats['submitted'] += 1
+
+        # Run in the submitter's context so its history scope follows the job
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id, fn):
+        started_at = time.time()
+        with self._lock:
+            (submitted_at,) = self._db.execute("SELECT submitted_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, started_at, job_id))
+            self._wait_ms.append((started_at - submitted_at) * 1000)
+
+        try:
+            result = json.dumps(fn(), default=str)
+            status, error = DONE, None
+        except Exception as e:
+            result = None
+            status, error = FAILED, str(e)
+
+        finished_at = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, finished_at, job_id)
+            )
+            self._run_ms.append((finished_at - started_at) * 1000)
+            self._stats['completed' if status == DONE else 'failed'] += 1
+
+    def stats(self):
+        """Queue depth, running jobs and recent wait/run time percentiles"""
+        def percentile(values, q):
+            return float(np.percentile(values, q)) if values else None
+
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status",
+                (QUEUED, RUNNING)
+            ).fetchall())
+            wait_ms = list(self._wait_ms)
+            run_ms = list(self._run_ms)
+            stats = dict(self._stats)
+        stats.update({
+            'queue_depth': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'workers': self.workers,
+            'per_session_limit': self.per_session_limit,
+            'wait_p50_ms': percentile(wait_ms, 50),
+            'wait_p95_ms': percentile(wait_ms, 95),
+            'run_p50_ms': percentile(run_ms, 50),
+            'run_p95_ms': percentile(run_ms, 95),
+        })
+        return stats
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide job queue shared by every session"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    os.path.join(get_data_dir(), 'jobs.db'),
+                    workers=get_int_setting("AUTOXPERT_JOB_WORKERS", 4),
+                    per_session_limit=get_int_setting("AUTOXPERT_JOBS_PER_SESSION", 2),
+                    retention_seconds=get_int_setting("AUTOXPERT_JOB_RETENTION_SECONDS", 24 * 3600)
+                )
+    return _queue
@@ -0,0 +1,97 @@
+"""
+Incremental JSON field extraction
+
+Models stream their JSON replies a few characters at a time. The extractor is
+fed each chunk as it arrives and reports top-level fields of the reply object
+as soon as their values are complete, so short headline fields such as "type"
+or "estimated_price" are available before a long "description" has finished.
+Text before the opening brace (prose, code fences) is skipped.
+"""
+
+import json
+
+
+class JSONFieldExtractor:
+    """Report completed top-level fields of a JSON object fed in chunks"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._value_start = None
+        self._key = None
+
+    def feed(self, chunk):
+        """Consume a chunk of the reply and return the fields it completed"""
+        self.buffer += chunk
+        completed = {}
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            if self.complete:
+                break
+            char = buffer[i]
+
+            # Skip anything before the reply object opens
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._member_start = i + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    # A string value is complete at its closing quote
+                    if self._depth == 1 and self._value_start is not None:
+                        self._emit(i + 1, completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(i, completed)
+                    self.complete = True
+                elif self._depth == 1 and self._value_start is not None:
+                    self._emit(i + 1, completed)
+            elif self._depth == 1 and char == ':' and self._key is None:
+                try:
+                    self._key = json.loads(buffer[self._member_start:i])
+                except ValueError:
+                    self._key = None
+                self._value_start = i + 1
+            elif self._depth == 1 and char == ',':
+                self._emit(i, completed)
+                self._member_start = i + 1
+                self._key = None
+
+        self._pos = len(buffer)
+        return completed
+
+    def _emit(self, end, completed):
+        """Decode the current member's value if it hasn't been reported yet"""
+        if self._key is None or self._value_start is None:
+            return
+        text = self.buffer[self._value_start:end].strip()
+        if text:
+            try:
+                value = json.loads(text)
+            except ValueError:
+                value = None
+            else:
+                self.fields[self._key] = value
+                completed[self._key] = value
+        # Keep the key so a trailing comma doesn't start a bogus member
+        self._value_start = None
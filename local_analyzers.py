@@ -0,0 +1,378 @@
+"""
+CPU-only analyzers used when the vision API is unavailable
+
+Everything here is deterministic: the same photo always produces the same
+result, so local answers can be cached like remote ones.
+
+Run `python local_analyzers.py <fixtures_dir> [damage|tire]` to report accuracy
+and latency over a labelled fixture set laid out as `<fixtures_dir>/<label>/<image>`;
+the fixtures used by the tests are in tests/fixtures/damage and tests/fixtures/tire.
+"""
+
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Longest side the analyzers work at; larger uploads are reduced while decoding
+ANALYSIS_SIDE = 512
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def load_bgr(image, max_side=ANALYSIS_SIDE):
+    """Decode encoded bytes, a PIL image or an array into a small BGR array"""
+    if isinstance(image, np.ndarray):
+        bgr = image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif isinstance(image, (bytes, bytearray)):
+        # Let libjpeg downscale while decoding when the header says it's large
+        try:
+            width, height = Image.open(io.BytesIO(image)).size
+        except Exception:
+            width = height = 0
+        flag = cv2.IMREAD_COLOR
+        for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                     (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                     (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if max(width, height) // factor >= max_side:
+                flag = reduced_flag
+                break
+        bgr = cv2.imdecode(np.frombuffer(image, np.uint8), flag)
+        if bgr is None:
+            raise ValueError("Could not decode image")
+    else:
+        bgr = cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    scale = max_side / max(bgr.shape[:2])
+    if scale < 1:
+        bgr = cv2.resize(bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return bgr
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def damage_features(bgr):
+    """Edge, gradient, highlight and line-segment statistics of a damage photo"""
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    height, width = gray.shape
+    diagonal = float(np.hypot(height, width))
+
+    # Gradient energy and how strongly the gradients share one orientation
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude = cv2.magnitude(gx, gy)
+    gradient_energy = float(magnitude.mean() / 255.0)
+
+    strong = magnitude > np.percentile(magnitude, 90)
+    angles = (np.arctan2(gy[strong], gx[strong]) % np.pi)
+    weights = magnitude[strong]
+    hist, _ = np.histogram(angles, bins=18, range=(0, np.pi), weights=weights)
+    total = hist.sum()
+    if total > 0:
+        hist = hist / total
+        # Fold neighbouring bins so a slightly curved scratch still counts as one direction
+        orientation_dominance = float(np.max(hist + np.roll(hist, 1) + np.roll(hist, -1)))
+    else:
+        orientation_dominance = 0.0
+
+    # Thin straight segments are the signature of scratches
+    edges = cv2.Canny(gray, 50, 150)
+    edge_density = float(np.count_nonzero(edges) / edges.size)
+    segments = cv2.HoughLinesP(
+        edges, 1, np.pi / 180, threshold=30,
+        minLineLength=max(10, int(diagonal * 0.05)), maxLineGap=5
+    )
+    if segments is not None:
+        segments = segments.reshape(-1, 4).astype(np.float32)
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        line_coverage = float(min(1.0, lengths.sum() / (diagonal * 4)))
+        long_segment_ratio = float(np.mean(lengths > diagonal * 0.15))
+        segment_count = int(len(segments))
+    else:
+        line_coverage = 0.0
+        long_segment_ratio = 0.0
+        segment_count = 0
+
+    # Dents bend reflections: specular blobs become irregular and fragmented
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    highlights = ((hsv[:, :, 2] > 220) & (hsv[:, :, 1] < 50)).astype(np.uint8)
+    highlight_ratio = float(highlights.mean())
+    contours, _ = cv2.findContours(highlights, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    solidities = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < 20:
+            continue
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        if hull_area > 0:
+            solidities.append(area / hull_area)
+    highlight_distortion = float(1.0 - np.mean(solidities)) if solidities else 0.0
+
+    # Broad shading changes (low-frequency curvature) point to a deformed panel
+    smooth = cv2.GaussianBlur(gray, (0, 0), sigmaX=max(3.0, width / 64))
+    curvature = float(np.abs(cv2.Laplacian(smooth.astype(np.float32), cv2.CV_32F)).mean())
+
+    return {
+        'gradient_energy': gradient_energy,
+        'orientation_dominance': orientation_dominance,
+        'edge_density': edge_density,
+        'line_coverage': line_coverage,
+        'long_segment_ratio': long_segment_ratio,
+        'segment_count': segment_count,
+        'highlight_ratio': highlight_ratio,
+        'highlight_distortion': highlight_distortion,
+        'curvature': curvature,
+    }
+
+
+def classify_damage(image):
+    """Classify a damage photo as dent or scratch without any network calls"""
+    features = damage_features(load_bgr(image))
+
+    # Positive evidence for a scratch, negative for a dent
+    score = (
+        3.0 * features['line_coverage']
+        + 2.0 * features['long_segment_ratio']
+        + 2.5 * (features['orientation_dominance'] - 0.25)
+        + 8.0 * (features['edge_density'] - 0.04)
+        - 2.5 * features['highlight_distortion']
+        - 1.5 * min(1.0, features['curvature'] / 2.0)
+    )
+    scratch_probability = float(_sigmoid(2.0 * score))
+    damage_type = "scratch" if scratch_probability >= 0.5 else "dent"
+
+    # The score only weighs scratch against dent, so a lack of scratch evidence
+    # would otherwise read as a confident dent. Scale the margin by how much
+    # positive evidence there is for the chosen type: a glossy panel (specular
+    # highlights, not edge clutter) and, for scratches, long segments sharing
+    # one direction; for dents, distorted reflections.
+    panel_evidence = (
+        np.clip(features['highlight_ratio'] / 0.01, 0.0, 1.0)
+        * np.clip(1.0 - (features['edge_density'] - 0.02) / 0.05, 0.0, 1.0)
+    )
+    if damage_type == "scratch":
+        type_evidence = (
+            np.clip(features['line_coverage'] / 0.2, 0.0, 1.0)
+            * np.clip(features['long_segment_ratio'] / 0.4, 0.0, 1.0)
+            * np.clip((features['orientation_dominance'] - 0.3) / 0.3, 0.0, 1.0)
+        )
+    else:
+        type_evidence = np.clip(features['highlight_distortion'] / 0.4, 0.0, 1.0)
+    evidence = float(panel_evidence * type_evidence)
+
+    confidence = 0.5 + (max(scratch_probability, 1.0 - scratch_probability) - 0.5) * evidence
+    confidence = round(min(0.95, confidence), 2)
+
+    if evidence < 0.5:
+        description = (
+            f"No clear damage evidence in this photo (best guess: {damage_type}). "
+            "Retake the photo closer to the panel or have it inspected professionally."
+        )
+    elif damage_type == "scratch":
+        description = (
+            f"Detected scratch: {features['segment_count']} straight edge segments with "
+            f"{features['orientation_dominance'] * 100:.0f}% of strong gradients in one direction. "
+            "Professional inspection recommended."
+        )
+    else:
+        description = (
+            "Detected dent: distorted reflections and broad shading changes on the panel "
+            f"(highlight distortion {features['highlight_distortion']:.2f}). "
+            "Professional inspection recommended."
+        )
+
+    return {
+        "type": damage_type,
+        "confidence": confidence,
+        "damage_found": evidence >= 0.5,
+        "description": description
+    }
+
+
+# New passenger tires start around 8 mm; 1.6 mm is the usual legal minimum
+NEW_TREAD_MM = 8.0
+MIN_TREAD_MM = 1.6
+TYPICAL_TIRE_LIFE_KM = 50000
+
+
+def _longest_run(mask):
+    """Start and end (exclusive) of the longest run of True values"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    starts, ends = changes[::2], changes[1::2]
+    if len(starts) == 0:
+        return 0, len(mask)
+    longest = np.argmax(ends - starts)
+    return int(starts[longest]), int(ends[longest])
+
+
+def tread_features(bgr):
+    """Tread band location, groove contrast and groove periodicity"""
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    gx = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3))
+    gy = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))
+
+    # Grooves cross the tread, so the tread runs along the axis with the stronger
+    # perpendicular edges; work in an orientation where it runs left to right
+    if gy.sum() > gx.sum():
+        gray, gx = gray.T, gy.T
+
+    # The tread band is the widest run of rows with high groove-edge energy
+    row_energy = cv2.GaussianBlur(gx.mean(axis=1).reshape(-1, 1), (1, 9), 0).ravel()
+    threshold = np.median(row_energy) + 0.5 * (row_energy.max() - np.median(row_energy))
+    band_start, band_end = _longest_run(row_energy >= threshold)
+    band = gray[band_start:band_end]
+    band_fraction = (band_end - band_start) / gray.shape[0]
+
+    # Intensity profile along the tread, detrended so lighting gradients don't count
+    profile = band.mean(axis=0)
+    window = max(3, len(profile) // 8) | 1
+    trend = np.convolve(np.pad(profile, window // 2, mode='edge'), np.ones(window) / window, mode='valid')
+    signal = profile - trend
+
+    # Worn grooves are shallow: the dark/light swing across the band shrinks
+    low, high = np.percentile(band, [5, 95])
+    groove_contrast = float((high - low) / 255.0)
+
+    # Autocorrelation via FFT; a strong secondary peak means regular grooves
+    centered = signal - signal.mean()
+    n = len(centered)
+    spectrum = np.fft.rfft(centered, n=2 * n)
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    if autocorrelation[0] > 0:
+        autocorrelation = autocorrelation / autocorrelation[0]
+        # Any smooth profile correlates with itself at short lags; only a peak
+        # after the first dip below zero is a repeating groove
+        below_zero = np.flatnonzero(autocorrelation[:n // 2] < 0)
+        min_lag = int(below_zero[0]) if len(below_zero) else n // 2
+        lags = autocorrelation[min_lag:n // 2]
+        periodicity = float(max(0.0, lags.max())) if len(lags) else 0.0
+        groove_period = int(np.argmax(lags) + min_lag) if len(lags) else 0
+    else:
+        periodicity = 0.0
+        groove_period = 0
+
+    return {
+        'band_fraction': float(band_fraction),
+        'groove_contrast': groove_contrast,
+        'periodicity': periodicity,
+        'groove_period_px': groove_period,
+        'groove_energy': float(band.std() / 255.0),
+    }
+
+
+def estimate_tire(image):
+    """Estimate tread depth and remaining life from a tire photo without network calls"""
+    features = tread_features(load_bgr(image))
+
+    # Groove contrast tracks depth; an irregular pattern discounts it as probable noise
+    contrast_score = np.clip(features['groove_contrast'] / 0.5, 0.0, 1.0)
+    wear_score = float(contrast_score * (0.6 + 0.4 * features['periodicity']))
+
+    tread = MIN_TREAD_MM * 0.6 + (NEW_TREAD_MM - MIN_TREAD_MM * 0.6) * wear_score
+    life = float(np.clip((tread - MIN_TREAD_MM) / (NEW_TREAD_MM - MIN_TREAD_MM) * 100, 0, 100))
+    distance = life / 100 * TYPICAL_TIRE_LIFE_KM
+
+    if tread >= 5:
+        condition = "good"
+    elif tread >= 3:
+        condition = "fair"
+    else:
+        condition = "poor"
+
+    # Trust the estimate more when a clear, regular groove pattern was found
+    confidence = float(np.clip(0.35 + 0.5 * features['periodicity'] + 0.2 * features['band_fraction'], 0.3, 0.9))
+
+    # Without repeating grooves there is no tread to measure: a blank or non-tire
+    # photo would otherwise read as a confidently bald tire
+    evidence = float(np.clip((features['periodicity'] - 0.4) / 0.4, 0.0, 1.0))
+    confidence = 0.3 + (confidence - 0.3) * evidence
+
+    if evidence < 0.5:
+        description = (
+            f"No tire tread found in this photo (best guess: {condition}). "
+            "Retake the photo straight onto the tread or have the tire checked professionally."
+        )
+    else:
+        description = (
+            f"Tire condition is {condition}. Tread depth approximately {tread:.1f}mm "
+            f"(groove contrast {features['groove_contrast']:.2f}, "
+            f"pattern regularity {features['periodicity']:.2f})."
+        )
+
+    return {
+        "condition": condition,
+        "tread_depth_mm": round(tread, 1),
+        "remaining_life_percent": round(life, 1),
+        "estimated_distance_km": round(distance, 0),
+        "change_recommended": evidence >= 0.5 and (condition == "poor" or life < 30),
+        "confidence": round(confidence, 2),
+        "description": description
+    }
+
+
+def iter_labelled_fixtures(fixtures_dir):
+    """Yield (label, path) for every image under <fixtures_dir>/<label>/"""
+    for label in sorted(os.listdir(fixtures_dir)):
+        label_dir = os.path.join(fixtures_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield label, os.path.join(label_dir, name)
+
+
+def evaluate(classify, samples, label_key="type"):
+    """Accuracy and latency of a classifier over (label, path) samples"""
+    latencies = []
+    correct = 0
+    total = 0
+    for label, path in samples:
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        result = classify(data)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += int(result.get(label_key) == label)
+        total += 1
+
+    if not total:
+        return {'samples': 0}
+    return {
+        'samples': total,
+        'accuracy': correct / total,
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'latency_max_ms': float(np.max(latencies)),
+    }
+
+
+ANALYZERS = {
+    'damage': (classify_damage, "type"),
+    'tire': (estimate_tire, "condition"),
+}
+
+
+def main(argv):
+    if len(argv) not in (2, 3) or (len(argv) == 3 and argv[2] not in ANALYZERS):
+        print("Usage: python local_analyzers.py <fixtures_dir> [damage|tire]")
+        return 1
+
+    analyzer = argv[2] if len(argv) == 3 else 'damage'
+    analyze, label_key = ANALYZERS[analyzer]
+    report = evaluate(analyze, iter_labelled_fixtures(argv[1]), label_key)
+    print(f"{analyzer.capitalize()} analyzer")
+    for name, value in report.items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
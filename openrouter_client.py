@@ -0,0 +1,228 @@
+"""
+Shared OpenRouter client
+
+A single process-wide client resolves the API settings once and keeps a pooled
+keep-alive HTTP session, so each analysis reuses an open TLS connection instead
+of paying a fresh handshake. Completions can also be streamed as server-sent
+events so callers see the reply while it is still being generated. Every
+request waits for a slot from the upstream's shared outbound rate limiter.
+A request's timeout is one overall budget: time queued for a slot is taken
+off what the request gets, and a stream still arriving when it runs out is
+abandoned, since requests only applies its timeout to each socket read.
+"""
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import get_setting, get_int_setting, get_float_setting
+from rate_limiter import get_rate_limiter, parse_retry_after
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "openai/gpt-4-vision-preview"
+
+# Idle keep-alive connections are usually dropped after a minute or two
+WARM_UP_INTERVAL_SECONDS = 60
+
+
+class OpenRouterError(Exception):
+    """Raised when OpenRouter answers with a non-success status"""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"OpenRouter returned {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _remaining(deadline):
+    """Seconds left before deadline, raising requests.Timeout once it has passed"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout("Request did not finish within its timeout")
+    return remaining
+
+
+def _until(deadline, lines):
+    """Pass lines through, raising requests.Timeout if one arrives after deadline"""
+    for line in lines:
+        _remaining(deadline)
+        yield line
+
+
+def iter_sse_data(lines):
+    """Yield the data payload of each server-sent event from raw byte lines"""
+    data = []
+    for line in lines:
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        line = line.rstrip('\r')
+        if not line:
+            # A blank line ends the event
+            if data:
+                yield "\n".join(data)
+                data = []
+        elif line.startswith(':'):
+            # Comment lines are keep-alives
+            continue
+        elif line.startswith('data:'):
+            value = line[5:]
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield "\n".join(data)
+
+
+class OpenRouterClient:
+    """Pooled client for OpenRouter or any other OpenAI-compatible chat completions endpoint
+
+    Servers on the local network often need no API key; pass
+    api_key_required=False for those. Each upstream should get its own limiter.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL,
+                 timeout=30, pool_size=10, api_key_required=True, limiter=None):
+        self.api_key = api_key
+        self.api_key_required = api_key_required
+        self.limiter = limiter or get_rate_limiter()
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._last_warm_up = 0.0
+        self._warm_up_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    @property
+    def configured(self):
+        """Whether the endpoint is set and, where one is needed, an API key"""
+        return bool(self.base_url) and (bool(self.api_key) or not self.api_key_required)
+
+    def chat(self, messages, timeout=None, **options):
+        """Send a chat completion request and return the message content"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        payload = {"model": self.model, "messages": messages}
+        payload.update(options)
+
+        with self.limiter.slot(timeout) as slot:
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                timeout=_remaining(deadline)
+            )
+            self._check_response(response, slot)
+            result = response.json()
+        return result["choices"][0]["message"]["content"]
+
+    def chat_stream(self, messages, timeout=None, **options):
+        """Stream a chat completion, yielding content deltas as they arrive
+
+        The whole reply, time queued for a slot included, must arrive within timeout.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        payload.update(options)
+
+        # The slot is held until the whole reply has streamed in
+        with self.limiter.slot(timeout) as slot:
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                timeout=_remaining(deadline),
+                stream=True
+            )
+            with response:
+                self._check_response(response, slot)
+
+                # chunk_size=None hands over each network read as soon as it lands
+                lines = _until(deadline, response.iter_lines(chunk_size=None))
+                for data in iter_sse_data(lines):
+                    # Read past [DONE] to the end so the connection goes back to the pool
+                    if data == "[DONE]":
+                        continue
+                    event = json.loads(data)
+                    if "error" in event:
+                        error = event["error"]
+                        raise OpenRouterError(error.get("code", 500), error.get("message", ""))
+                    for choice in event.get("choices", []):
+                        delta = choice.get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+
+    def _check_response(self, response, slot):
+        """Raise for a failed request, telling the limiter when we were throttled"""
+        if response.status_code == 429:
+            slot.throttle(parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code != 200:
+            raise OpenRouterError(response.status_code, response.text[:200])
+
+    def analyze_image(self, prompt, image_base64, mime_type="image/png", timeout=None, **options):
+        """Ask the vision model about a base64-encoded image"""
+        return self.chat(self._image_messages(prompt, image_base64, mime_type), timeout=timeout, **options)
+
+    def analyze_image_stream(self, prompt, image_base64, mime_type="image/png", timeout=None, **options):
+        """Like analyze_image, but yield the reply in pieces as it streams in"""
+        return self.chat_stream(self._image_messages(prompt, image_base64, mime_type), timeout=timeout, **options)
+
+    def _image_messages(self, prompt, image_base64, mime_type):
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{image_base64}"
+                        }
+                    }
+                ]
+            }
+        ]
+
+    def warm_up(self):
+        """Open a pooled connection in the background before the first analysis"""
+        with self._warm_up_lock:
+            now = time.monotonic()
+            if now - self._last_warm_up < WARM_UP_INTERVAL_SECONDS:
+                return
+            self._last_warm_up = now
+
+        def _connect():
+            try:
+                self.session.head(self.base_url, timeout=5)
+            except requests.RequestException:
+                pass
+
+        threading.Thread(target=_connect, daemon=True).start()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide OpenRouter client, configured on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenRouterClient(
+                    api_key=get_setting("OPENROUTER_API_KEY", ""),
+                    base_url=get_setting("OPENROUTER_BASE_URL", DEFAULT_BASE_URL),
+                    model=get_setting("OPENROUTER_MODEL", DEFAULT_MODEL),
+                    timeout=get_float_setting("OPENROUTER_TIMEOUT", 30),
+                    pool_size=get_int_setting("OPENROUTER_POOL_SIZE", 10)
+                )
+    return _client
@@ -1,96 +1,194 @@
 import streamlit as st
-import requests
-from PIL import Image
-import io
-import base64
-import os
+import html
 import sys
 sys.path.append('.')
 from utils import get_recommended_shops, format_shop_for_display
+from backends import warm_up_backends
+from analysis_state import run_background_analysis, run_progressive_analysis, reset_analysis, upload_preview, upload_key, uploads_key, content_key, RUNNING, FAILED
+from analyzers import damage_plan
+from inspection import analyze_damage_set
+from job_queue import QUEUED
+from status_captions import show_result_status, show_job_queue_stats
+from progressive import start_progressive, poll_analysis
 
-def encode_image(image):
-    """Convert PIL Image to base64 string"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+def show_damage_result(state):
+    """Render the damage result, marking it while it is still provisional"""
+    result = state.result
+    if state.provisional:
+        st.info("⏳ Provisional result from the on-device analyzer. Refining with AI...")
+        if state.queue_position:
+            st.caption(f"Waiting for the AI service: position {state.queue_position} in queue")
 
-def analyze_damage_with_openrouter(image):
-    """Use OpenRouter API to analyze vehicle damage"""
-    try:
-        img_base64 = encode_image(image)
-        api_key = os.getenv("OPENROUTER_API_KEY") or st.secrets.get("OPENROUTER_API_KEY", "")
-        
-        if not api_key:
-            return analyze_damage_simple(image)
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "openai/gpt-4-vision-preview",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Analyze this vehicle damage image. Identify if it's a dent or scratch. Respond in JSON format: {\"type\": \"dent\" or \"scratch\", \"confidence\": 0.0-1.0, \"description\": \"brief description\"}"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{img_base64}"
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            import json
-            try:
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0].strip()
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0].strip()
-                analysis = json.loads(content)
-                return analysis
-            except:
-                return {
-                    "type": "scratch" if "scratch" in content.lower() else "dent",
-                    "confidence": 0.7,
-                    "description": content
-                }
+    damage_type = result.get("type", "unknown")
+    confidence = result.get("confidence", 0.0)
+
+    # Professional Result Display
+    damage_class = "damage-dent" if damage_type == "dent" else "damage-scratch"
+    st.markdown(f"""
+    <div class="result-card">
+        <div class="damage-type {damage_class}">
+            {damage_type.upper()}
+        </div>
+        <p style="text-align: center; color: #666; margin-top: 1rem;">
+            Confidence: <strong>{confidence * 100:.1f}%</strong>
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    show_result_status('damage', result)
+
+    # Get Recommended Shops
+    show_recommended_shops(damage_type, f"{damage_type} repair")
+
+def show_recommended_shops(damage_type, repair_label):
+    """List top-rated shops for one damage type or a list of damages to repair together"""
+    shops = get_recommended_shops(damage_type)
+    recommended_shops = [format_shop_for_display(shop, damage_type) for shop in shops]
+
+    if recommended_shops:
+        st.markdown('<p class="section-title">Recommended Repair Shops</p>', unsafe_allow_html=True)
+        st.markdown('<p class="section-subtitle">Top-rated repair shops in Sri Lanka based on social media reviews</p>', unsafe_allow_html=True)
+
+        for idx, shop in enumerate(recommended_shops, 1):
+            rating_stars = "⭐" * int(shop['rating'])
+
+            st.markdown(f"""
+            <div class="shop-card">
+                <div class="shop-header">
+                    <h3 class="shop-name">#{idx} {shop['name']}</h3>
+                    <div class="shop-rating">{rating_stars} {shop['rating']}/5.0</div>
+                </div>
+
+                <div class="shop-info">
+                    <div class="info-item">
+                        <strong>📍</strong> {shop['address']}
+                    </div>
+                    <div class="info-item">
+                        <strong>📞</strong> {shop['phone']}
+                    </div>
+                    <div class="info-item">
+                        <strong>⭐</strong> {shop['social_rating']}
+                    </div>
+                </div>
+
+                <div class="price-badge">
+                    Rs. {shop['price']:,.0f} for {repair_label}
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Map Section
+            st.markdown(f"#### Location & Directions")
+
+            st.markdown(f"""
+            <div class="map-container">
+                <iframe 
+                    width="100%" 
+                    height="350" 
+                    style="border:0" 
+                    loading="lazy" 
+                    allowfullscreen
+                    src="https://www.google.com/maps?q={shop['latitude']},{shop['longitude']}&hl=en&z=14&output=embed">
+                </iframe>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Directions Button
+            directions_url = f"https://www.google.com/maps/dir/?api=1&destination={shop['latitude']},{shop['longitude']}"
+            st.markdown(f"""
+            <a href="{directions_url}" target="_blank" class="directions-btn">
+                🗺️ Get Directions
+            </a>
+            """, unsafe_allow_html=True)
+
+            st.markdown("---")
+    else:
+        st.info("No repair shops available. Shop owners can register to list their services.")
+
+def show_damage_set_result(report):
+    """Render the vehicle-level damage list merged from several photos"""
+    damages = report["damages"]
+    photo_count = len(report["photos"]) + len(report["duplicates"]) + len(report["errors"])
+    st.caption(
+        f"{photo_count} photos, {len(report['duplicates'])} near-duplicates skipped, "
+        f"analysed in {report['wall_ms'] / 1000:.1f} s"
+    )
+    for index, error in report["errors"]:
+        st.warning(f"Photo {index + 1} could not be analysed: {error}")
+
+    if not damages:
+        st.info("No clear damage found in the uploaded photos.")
+        return
+
+    st.markdown('<p class="section-title">Damage Found</p>', unsafe_allow_html=True)
+    for damage in damages:
+        damage_class = "damage-dent" if damage["type"] == "dent" else "damage-scratch"
+        photos = ", ".join(str(index + 1) for index in damage["photos"])
+        st.markdown(f"""
+        <div class="result-card">
+            <div class="damage-type {damage_class}">
+                {html.escape(damage["type"].upper())} · {html.escape(damage["panel"].title())}
+            </div>
+            <p style="text-align: center; color: #666; margin-top: 1rem;">
+                Confidence: <strong>{damage["confidence"] * 100:.1f}%</strong> · Seen in photo {photos}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    # One shop visit for everything found on the vehicle
+    damage_types = [damage["type"] for damage in damages]
+    show_recommended_shops(damage_types, f"{len(damage_types)} repairs")
+
+def show_multi_photo_inspection():
+    """Upload a walk-around set of photos and merge their damage into one report"""
+    uploaded_files = st.file_uploader(
+        "Choose damage images",
+        type=['png', 'jpg', 'jpeg'],
+        accept_multiple_files=True,
+        key="damage_multi_upload",
+        help="Upload 4-12 photos taken around the vehicle",
+        label_visibility="collapsed"
+    )
+    if not uploaded_files:
+        return
+
+    cols = st.columns(4)
+    for idx, uploaded_file in enumerate(uploaded_files):
+        with cols[idx % 4]:
+            st.image(upload_preview(uploaded_file, 'thumb'), caption=f"Photo {idx + 1}", use_container_width=True)
+
+    st.markdown("---")
+
+    photos = [f.getvalue() for f in uploaded_files]
+    state = run_background_analysis(
+        'damage_multi',
+        uploads_key(uploaded_files),
+        lambda: analyze_damage_set(photos),
+        job_key=content_key(uploaded_files)
+    )
+
+    def show_damage_set_job(state):
+        if state.status == RUNNING:
+            if state.job_status == QUEUED:
+                st.info(f"⏳ {len(photos)} photos queued for analysis...")
+            else:
+                st.info(f"🔍 Analyzing {len(photos)} photos...")
+            show_job_queue_stats()
+        elif state.status == FAILED:
+            st.error(f"Analysis failed: {state.error}")
+            if st.button("Retry analysis", key="damage_multi_retry"):
+                reset_analysis('damage_multi')
+                st.rerun()
         else:
-            return analyze_damage_simple(image)
-    except Exception as e:
-        st.error(f"Error analyzing damage: {str(e)}")
-        return analyze_damage_simple(image)
+            show_damage_set_result(state.result)
 
-def analyze_damage_simple(image):
-    """Simple rule-based damage detection (fallback)"""
-    import random
-    damage_types = ["dent", "scratch"]
-    selected = random.choice(damage_types)
-    return {
-        "type": selected,
-        "confidence": 0.75,
-        "description": f"Detected {selected} on vehicle surface. Professional inspection recommended."
-    }
+    # The photo set is analysed on the job queue; poll for it without rerunning the page
+    poll_analysis(state, show_damage_set_job)
 
 def show():
+    # Open the backend connections while the user picks a photo
+    warm_up_backends()
+    
     st.markdown("""
     <style>
         .header-section {
@@ -304,6 +402,11 @@ def show():
     </div>
     """, unsafe_allow_html=True)
     
+    # Walk-around inspections upload every angle at once
+    if st.toggle("Multi-photo inspection (4-12 photos around the vehicle)", key="damage_multi_mode"):
+        show_multi_photo_inspection()
+        return
+    
     # Image Upload Section
     col1, col2 = st.columns([1.2, 1])
     
@@ -317,8 +420,7 @@ def show():
         )
         
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Image", use_container_width=True)
+            st.image(upload_preview(uploaded_file), caption="Uploaded Image", use_container_width=True)
     
     with col2:
         st.markdown("### Quick Actions")
@@ -329,85 +431,18 @@ def show():
     if uploaded_file is not None:
         st.markdown("---")
         
-        with st.spinner("Analyzing damage with AI..."):
-            result = analyze_damage_with_openrouter(image)
-        
-        damage_type = result.get("type", "unknown")
-        confidence = result.get("confidence", 0.0)
-        
-        # Professional Result Display
-        damage_class = "damage-dent" if damage_type == "dent" else "damage-scratch"
-        st.markdown(f"""
-        <div class="result-card">
-            <div class="damage-type {damage_class}">
-                {damage_type.upper()}
-            </div>
-            <p style="text-align: center; color: #666; margin-top: 1rem;">
-                Confidence: <strong>{confidence * 100:.1f}%</strong>
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Get Recommended Shops
-        shops = get_recommended_shops(damage_type)
-        recommended_shops = [format_shop_for_display(shop, damage_type) for shop in shops]
-        
-        if recommended_shops:
-            st.markdown('<p class="section-title">Recommended Repair Shops</p>', unsafe_allow_html=True)
-            st.markdown('<p class="section-subtitle">Top-rated repair shops in Sri Lanka based on social media reviews</p>', unsafe_allow_html=True)
-            
-            for idx, shop in enumerate(recommended_shops, 1):
-                rating_stars = "⭐" * int(shop['rating'])
-                
-                st.markdown(f"""
-                <div class="shop-card">
-                    <div class="shop-header">
-                        <h3 class="shop-name">#{idx} {shop['name']}</h3>
-                        <div class="shop-rating">{rating_stars} {shop['rating']}/5.0</div>
-                    </div>
-                    
-                    <div class="shop-info">
-                        <div class="info-item">
-                            <strong>📍</strong> {shop['address']}
-                        </div>
-                        <div class="info-item">
-                            <strong>📞</strong> {shop['phone']}
-                        </div>
-                        <div class="info-item">
-                            <strong>⭐</strong> {shop['social_rating']}
-                        </div>
-                    </div>
-                    
-                    <div class="price-badge">
-                        Rs. {shop['price']:,.0f} for {damage_type} repair
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Map Section
-                st.markdown(f"#### Location & Directions")
-                
-                st.markdown(f"""
-                <div class="map-container">
-                    <iframe 
-                        width="100%" 
-                        height="350" 
-                        style="border:0" 
-                        loading="lazy" 
-                        allowfullscreen
-                        src="https://www.google.com/maps?q={shop['latitude']},{shop['longitude']}&hl=en&z=14&output=embed">
-                    </iframe>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Directions Button
-                directions_url = f"https://www.google.com/maps/dir/?api=1&destination={shop['latitude']},{shop['longitude']}"
-                st.markdown(f"""
-                <a href="{directions_url}" target="_blank" class="directions-btn">
-                    🗺️ Get Directions
-                </a>
-                """, unsafe_allow_html=True)
-                
-                st.markdown("---")
-        else:
-            st.info("No repair shops available. Shop owners can register to list their services.")
+        state = run_progressive_analysis(
+            'damage',
+            upload_key(uploaded_file),
+            lambda: start_progressive('damage', *damage_plan(uploaded_file.getvalue())),
+            "Analyzing damage..."
+        )
+        if state.status == FAILED:
+            st.error(f"Analysis failed: {state.error}")
+            if st.button("Retry analysis", key="damage_retry"):
+                reset_analysis('damage')
+                st.rerun()
+            return
+        
+        # Poll for the remote result only while a provisional answer is showing
+        poll_analysis(state, show_damage_result)
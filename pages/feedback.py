@@ -1,7 +1,7 @@
 import streamlit as st
 import sys
 sys.path.append('.')
-from utils import register_repair_shop, login_repair_shop, get_shop_by_email
+from utils import register_repair_shop, login_repair_shop, get_shop_by_email, update_shop_prices
 
 def show():
     st.markdown("""
@@ -260,6 +260,10 @@ def show_dashboard():
     st.markdown("---")
     st.markdown("### Update Your Prices")
     
+    # Version of the prices shown in the form, so a change made elsewhere meanwhile isn't overwritten
+    version_key = f"shop_seen_version_{shop['email']}"
+    seen_version = st.session_state.get(version_key, shop['version'])
+    
     with st.form("update_prices"):
         col1, col2 = st.columns(2)
         
@@ -282,11 +286,18 @@ def show_dashboard():
         update = st.form_submit_button("Update Prices", use_container_width=True, type="primary")
         
         if update:
-            shop['dent_price'] = new_dent_price
-            shop['scratch_price'] = new_scratch_price
-            st.success("✅ Prices updated successfully!")
-            st.balloons()
-            st.rerun()
+            success, message = update_shop_prices(
+                shop['email'], new_dent_price, new_scratch_price, expected_version=seen_version
+            )
+            if success:
+                st.session_state.pop(version_key, None)
+                st.success(f"✅ {message}")
+                st.balloons()
+                st.rerun()
+            else:
+                st.error(f"❌ {message}")
+    
+    st.session_state[version_key] = shop['version']
     
     # Current prices display
     st.markdown("### Current Pricing")
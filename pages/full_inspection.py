@@ -0,0 +1,250 @@
+import streamlit as st
+import datetime
+from backends import warm_up_backends
+from analysis_state import get_analysis_state, run_background_analysis, reset_analysis, upload_preview, uploads_key, content_key, PENDING, RUNNING, FAILED
+from analyzers import price_inputs
+from inspection import run_inspection
+from job_queue import QUEUED
+from status_captions import show_job_queue_stats
+from progressive import poll_analysis
+
+def show_inspection_report(report):
+    """Render the combined damage, tire and price report"""
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        damage = report.get("damage")
+        st.markdown("### 🚗 Damage")
+        if damage:
+            st.markdown(f"""
+            <div class="inspection-card">
+                <div class="inspection-value">{damage.get("type", "unknown").upper()}</div>
+                <p>Confidence: <strong>{damage.get("confidence", 0.0) * 100:.1f}%</strong></p>
+            </div>
+            """, unsafe_allow_html=True)
+        elif "damage" in report["errors"]:
+            st.error(f"Damage analysis failed: {report['errors']['damage']}")
+        else:
+            st.info("No damage photo uploaded")
+
+    with col2:
+        tire = report.get("tire")
+        st.markdown("### 🛞 Tires")
+        if tire:
+            st.markdown(f"""
+            <div class="inspection-card">
+                <div class="inspection-value">{tire.get("condition", "unknown").upper()}</div>
+                <p>Tread depth: <strong>{tire.get("tread_depth_mm", 0)} mm</strong></p>
+                <p>Remaining life: <strong>{tire.get("remaining_life_percent", 0):.1f}%</strong></p>
+            </div>
+            """, unsafe_allow_html=True)
+            if tire.get("change_recommended"):
+                st.error("⚠️ Tire replacement recommended")
+        elif "tire" in report["errors"]:
+            st.error(f"Tire analysis failed: {report['errors']['tire']}")
+        else:
+            st.info("No tire photo uploaded")
+
+    with col3:
+        price = report.get("market")
+        st.markdown("### 💰 Market Value")
+        if price:
+            st.markdown(f"""
+            <div class="inspection-card">
+                <div class="inspection-value">${price.get("estimated_price", 0):,.0f}</div>
+                <p>Range: ${price.get("price_range_min", 0):,.0f} - ${price.get("price_range_max", 0):,.0f}</p>
+                <p>Condition: <strong>{price.get("condition", "unknown").capitalize()}</strong></p>
+            </div>
+            """, unsafe_allow_html=True)
+        elif "market" in report["errors"]:
+            st.error(f"Price prediction failed: {report['errors']['market']}")
+        else:
+            st.info("No vehicle photo uploaded")
+
+    timings = report["timings_ms"]
+    if timings:
+        st.caption(
+            f"Inspection finished in {report['wall_ms'] / 1000:.1f} s "
+            f"(the analyses took {sum(timings.values()) / 1000:.1f} s combined)"
+        )
+
+def show_inspection_job(state):
+    """Progress, failure or report for the inspection job"""
+    if state.status == RUNNING:
+        if state.job_status == QUEUED:
+            st.info("⏳ Inspection queued; it will start as soon as a worker is free...")
+        else:
+            st.info("🔍 Inspecting damage, tires and market value in parallel...")
+        show_job_queue_stats()
+        return
+
+    if state.status == FAILED:
+        st.error(f"Inspection failed: {state.error}")
+        if st.button("Retry inspection", key="inspection_retry"):
+            reset_analysis('inspection')
+            st.rerun()
+        return
+
+    show_inspection_report(state.result)
+
+def show():
+    # Open the backend connections while the user picks photos
+    warm_up_backends()
+
+    st.markdown("""
+    <style>
+        .header-section {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 3rem 2rem;
+            color: white;
+            margin: -1rem -1rem 2rem -1rem;
+            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+        }
+
+        .header-section h1 {
+            margin: 0;
+            font-size: 2.2rem;
+            font-weight: 700;
+            letter-spacing: -0.5px;
+        }
+
+        .header-section p {
+            margin: 0.5rem 0 0 0;
+            opacity: 0.95;
+            font-size: 1rem;
+            font-weight: 400;
+        }
+
+        .inspection-card {
+            background: #ffffff;
+            padding: 1.5rem;
+            border-radius: 16px;
+            box-shadow: 0 4px 16px rgba(0,0,0,0.08);
+            border: 1px solid #e8e8e8;
+            text-align: center;
+        }
+
+        .inspection-value {
+            font-size: 1.8rem;
+            font-weight: 700;
+            color: #667eea;
+            margin-bottom: 0.5rem;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Professional Header
+    st.markdown("""
+    <div class="header-section">
+        <h1>Full Vehicle Inspection</h1>
+        <p>Damage, tire condition and market value in one pass</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Professional Navigation
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        if st.button("Home", use_container_width=True, key="nav_inspection_home"):
+            st.session_state.current_page = 'home'
+            st.rerun()
+    with col2:
+        if st.button("Damage Detection", use_container_width=True, key="nav_inspection_damage"):
+            st.session_state.current_page = 'damage'
+            st.rerun()
+    with col3:
+        if st.button("Tire Analysis", use_container_width=True, key="nav_inspection_tire"):
+            st.session_state.current_page = 'tire'
+            st.rerun()
+    with col4:
+        if st.button("Market Price", use_container_width=True, key="nav_inspection_market"):
+            st.session_state.current_page = 'market'
+            st.rerun()
+    with col5:
+        if st.button("History", use_container_width=True, key="nav_inspection_history"):
+            st.session_state.current_page = 'history'
+            st.rerun()
+
+    # Vehicle Information Form
+    st.markdown("### Vehicle Information")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        brand = st.selectbox(
+            "Select Brand",
+            ["Toyota", "Mitsubishi", "Suzuki"],
+            key="inspection_brand",
+            help="Select your vehicle brand"
+        )
+
+    with col2:
+        model_year = st.number_input(
+            "Model Year",
+            min_value=1990,
+            max_value=datetime.date.today().year,
+            value=2020,
+            step=1,
+            key="inspection_year",
+            help="Enter the model year of your vehicle"
+        )
+
+    with col3:
+        mileage = st.number_input(
+            "Mileage (km)",
+            min_value=0,
+            max_value=500000,
+            value=50000,
+            step=1000,
+            key="inspection_mileage",
+            help="Enter current mileage in kilometers"
+        )
+
+    vehicle_reference = st.text_input(
+        "Vehicle reference (optional)",
+        value=st.session_state.get('vehicle_reference', ""),
+        key="inspection_vehicle_reference",
+        help="Plate or chassis number, so this inspection shows up in the vehicle's history"
+    ).strip()
+    st.session_state.vehicle_reference = vehicle_reference or None
+
+    # Photo Upload Section
+    st.markdown("### Upload Photos")
+    col1, col2, col3 = st.columns(3)
+    uploads = {}
+    for col, slot, label in (
+        (col1, 'vehicle', "Whole vehicle"),
+        (col2, 'damage', "Damage close-up"),
+        (col3, 'tire', "Tire tread")
+    ):
+        with col:
+            uploads[slot] = st.file_uploader(
+                label,
+                type=['png', 'jpg', 'jpeg'],
+                key=f"inspection_{slot}_upload",
+                help="Supported formats: PNG, JPG, JPEG"
+            )
+            if uploads[slot] is not None:
+                st.image(upload_preview(uploads[slot]), use_container_width=True)
+
+    if all(f is None for f in uploads.values()):
+        return
+
+    st.markdown("---")
+
+    inputs = price_inputs(brand, model_year, mileage)
+    key = uploads_key(list(uploads.values()), inputs)
+
+    # Photos usually arrive one at a time, so wait to be asked before inspecting
+    if get_analysis_state('inspection', key).status == PENDING:
+        if not st.button("🔍 Run Full Inspection", use_container_width=True, type="primary"):
+            return
+
+    photos = {slot: f.getvalue() for slot, f in uploads.items() if f is not None}
+    state = run_background_analysis(
+        'inspection',
+        key,
+        lambda: run_inspection(photos, brand, model_year, mileage),
+        job_key=content_key(list(uploads.values()), inputs)
+    )
+
+    # The inspection runs on the job queue; poll for it without rerunning the page
+    poll_analysis(state, show_inspection_job)
@@ -0,0 +1,136 @@
+import streamlit as st
+import datetime
+import html
+from history_store import get_history_store
+
+PAGE_SIZE = 20
+
+FEATURE_LABELS = {
+    'damage': "🚗 Damage",
+    'tire': "🛞 Tire",
+    'market': "💰 Market Value",
+}
+
+def summarize(record):
+    """One-line headline for a stored result"""
+    result = record["result"]
+    if record["feature"] == 'damage':
+        panel = f" on {result['panel']}" if result.get("panel") else ""
+        return f"{str(result.get('type', 'unknown')).upper()}{panel} ({float(result.get('confidence', 0)) * 100:.0f}%)"
+    if record["feature"] == 'tire':
+        return f"{str(result.get('condition', 'unknown')).upper()}, {result.get('tread_depth_mm', 0)} mm tread"
+    if record["feature"] == 'market':
+        return f"${float(result.get('estimated_price', 0)):,.0f} ({str(result.get('condition', 'unknown')).capitalize()})"
+    return ""
+
+def show_history_record(record):
+    """Render one stored analysis"""
+    when = datetime.datetime.fromtimestamp(record["created_at"]).strftime("%Y-%m-%d %H:%M")
+    details = [record["backend"] or record["kind"]]
+    if record["latency_ms"] is not None:
+        details.append(f"{record['latency_ms'] / 1000:.1f} s")
+    if record["vehicle_id"]:
+        details.append(f"vehicle {record['vehicle_id']}")
+    # Results come from the vision model and references from users, so escape them
+    st.markdown(f"""
+    <div class="history-card">
+        <strong>{html.escape(FEATURE_LABELS.get(record["feature"], record["feature"]))}</strong> · {html.escape(summarize(record))}
+        <div class="history-meta">{when} · {html.escape(" · ".join(details))}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def show():
+    st.markdown("""
+    <style>
+        .header-section {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 3rem 2rem;
+            color: white;
+            margin: -1rem -1rem 2rem -1rem;
+            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+        }
+
+        .header-section h1 {
+            margin: 0;
+            font-size: 2.2rem;
+            font-weight: 700;
+            letter-spacing: -0.5px;
+        }
+
+        .header-section p {
+            margin: 0.5rem 0 0 0;
+            opacity: 0.95;
+            font-size: 1rem;
+            font-weight: 400;
+        }
+
+        .history-card {
+            background: #ffffff;
+            padding: 1rem 1.5rem;
+            border-radius: 12px;
+            margin: 0.5rem 0;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.06);
+            border: 1px solid #e8e8e8;
+        }
+
+        .history-meta {
+            color: #666;
+            font-size: 0.85rem;
+            margin-top: 0.25rem;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Professional Header
+    st.markdown("""
+    <div class="header-section">
+        <h1>Previous Inspections</h1>
+        <p>Damage, tire and price results for a vehicle, newest first</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Professional Navigation
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Home", use_container_width=True, key="nav_history_home"):
+            st.session_state.current_page = 'home'
+            st.rerun()
+    with col2:
+        if st.button("Full Inspection", use_container_width=True, key="nav_history_inspection"):
+            st.session_state.current_page = 'inspection'
+            st.rerun()
+
+    vehicle_reference = st.text_input(
+        "Vehicle reference",
+        value=st.session_state.get('vehicle_reference', ""),
+        key="history_vehicle_reference",
+        help="Plate or chassis number entered with the inspection"
+    ).strip()
+
+    # Results are only listed per vehicle, so visitors can't browse everyone's inspections
+    if not vehicle_reference:
+        st.info("Enter a vehicle reference to see its previous inspections")
+        return
+
+    # Pages are fetched by keyset cursor, so older pages cost the same as the first
+    pages_key = f"history_cursors_{vehicle_reference}"
+    cursors = st.session_state.setdefault(pages_key, [None])
+
+    store = get_history_store()
+    records = []
+    next_cursor = None
+    for cursor in cursors:
+        page, next_cursor = store.list_history(vehicle_id=vehicle_reference, before=cursor, limit=PAGE_SIZE)
+        records.extend(page)
+
+    if not records:
+        st.info(f"No analyses recorded yet for {vehicle_reference}")
+        return
+
+    for record in records:
+        show_history_record(record)
+
+    if next_cursor is not None:
+        if st.button("Load older results", use_container_width=True, key="history_load_more"):
+            cursors.append(next_cursor)
+            st.rerun()
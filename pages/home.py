@@ -186,7 +186,7 @@ def show():
             st.session_state.show_menu = True
             st.rerun()
     
-    # Show Menu when Let's Go is clicked - All 4 buttons visible
+    # Show Menu when Let's Go is clicked - All buttons visible
     if st.session_state.show_menu:
         st.markdown("""
         <div class="menu-container">
@@ -216,3 +216,11 @@ def show():
             if st.button("💬 Feedback", use_container_width=True, key="menu_feedback", type="primary"):
                 st.session_state.current_page = 'feedback'
                 st.rerun()
+        
+        if st.button("🔍 Full Inspection", use_container_width=True, key="menu_inspection", type="primary"):
+            st.session_state.current_page = 'inspection'
+            st.rerun()
+        
+        if st.button("🗂️ Previous Inspections", use_container_width=True, key="menu_history"):
+            st.session_state.current_page = 'history'
+            st.rerun()
@@ -1,114 +1,95 @@
 import streamlit as st
-import requests
-from PIL import Image
-import io
-import base64
-import os
-import json
+from backends import warm_up_backends
+from analysis_state import run_progressive_analysis, reset_analysis, upload_preview, upload_key, FAILED
+from analyzers import tire_plan
+from progressive import start_progressive, poll_analysis
+from status_captions import show_result_status
 
-def encode_image(image):
-    """Convert PIL Image to base64 string"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+def show_tire_result(state):
+    """Render the tire result, marking it while it is still provisional"""
+    result = state.result
+    if state.provisional:
+        st.info("⏳ Provisional result from the on-device analyzer. Refining with AI...")
+        if state.queue_position:
+            st.caption(f"Waiting for the AI service: position {state.queue_position} in queue")
 
-def analyze_tire_with_openrouter(image):
-    """Use OpenRouter API to analyze tire condition"""
-    try:
-        img_base64 = encode_image(image)
-        api_key = os.getenv("OPENROUTER_API_KEY") or st.secrets.get("OPENROUTER_API_KEY", "")
-        
-        if not api_key:
-            return analyze_tire_simple(image)
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "openai/gpt-4-vision-preview",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": """Analyze this tire image. Assess the tire condition, tread depth, and wear patterns. 
-                            Respond in JSON format: {
-                                "condition": "good/fair/poor",
-                                "tread_depth_mm": estimated number,
-                                "remaining_life_percent": 0-100,
-                                "estimated_distance_km": remaining safe distance,
-                                "change_recommended": true/false,
-                                "description": "detailed analysis"
-                            }"""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{img_base64}"
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            try:
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0].strip()
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0].strip()
-                analysis = json.loads(content)
-                return analysis
-            except:
-                return analyze_tire_simple(image)
-        else:
-            return analyze_tire_simple(image)
-    except Exception as e:
-        st.error(f"Error analyzing tire: {str(e)}")
-        return analyze_tire_simple(image)
+    condition = result.get("condition", "unknown")
+    tread_depth = result.get("tread_depth_mm", 0)
+    life_percent = result.get("remaining_life_percent", 0)
+    distance = result.get("estimated_distance_km", 0)
+    change_recommended = result.get("change_recommended", False)
+    description = result.get("description", "No description available")
 
-def analyze_tire_simple(image):
-    """Simple rule-based tire analysis (fallback)"""
-    import random
-    conditions = ["good", "fair", "poor"]
-    selected = random.choice(conditions)
-    
-    if selected == "good":
-        tread = random.uniform(6, 8)
-        life = random.uniform(70, 90)
-        distance = random.uniform(15000, 25000)
-    elif selected == "fair":
-        tread = random.uniform(3, 6)
-        life = random.uniform(40, 70)
-        distance = random.uniform(5000, 15000)
+    # Professional Condition Display
+    condition_class = f"condition-{condition}"
+    st.markdown(f"""
+    <div class="tire-result-card">
+        <div class="{condition_class}">
+            <h2 style="margin: 0; font-size: 1.8rem;">Condition: {condition.upper()}</h2>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Metrics
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric("Tread Depth", f"{tread_depth} mm", 
+                 help="Legal minimum is typically 1.6mm (2/32 inch)")
+
+    with col2:
+        st.metric("Remaining Life", f"{life_percent:.1f}%")
+
+    with col3:
+        st.metric("Safe Distance", f"{distance:,.0f} km",
+                 help="Estimated remaining safe driving distance")
+
+    # Progress bar for remaining life
+    st.markdown(f"""
+    <div class="progress-bar">
+        <div class="progress-fill" style="width: {life_percent}%;">
+            {life_percent:.1f}%
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Description
+    st.markdown(f"""
+    <div class="tire-result-card">
+        <h3>📋 Analysis Details</h3>
+        <p>{description}</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    show_result_status('tire', result)
+
+    # Recommendations
+    if change_recommended:
+        st.error("""
+        ⚠️ **Tire Replacement Recommended**
+        - Your tire condition is poor or below safe threshold
+        - Replace immediately for safety
+        - Estimated cost: $80 - $200 per tire
+        """)
+    elif condition == "fair":
+        st.warning("""
+        ⚠️ **Monitor Tire Condition**
+        - Tire is in fair condition
+        - Plan for replacement within next 5,000-10,000 km
+        - Regular inspections recommended
+        """)
     else:
-        tread = random.uniform(1, 3)
-        life = random.uniform(10, 40)
-        distance = random.uniform(0, 5000)
-    
-    return {
-        "condition": selected,
-        "tread_depth_mm": round(tread, 1),
-        "remaining_life_percent": round(life, 1),
-        "estimated_distance_km": round(distance, 0),
-        "change_recommended": selected == "poor" or life < 30,
-        "description": f"Tire condition is {selected}. Tread depth approximately {tread:.1f}mm."
-    }
+        st.success("""
+        ✅ **Tire in Good Condition**
+        - Continue regular maintenance
+        - Check tire pressure monthly
+        - Rotate tires every 10,000 km
+        """)
 
 def show():
+    # Open the backend connections while the user picks a photo
+    warm_up_backends()
+    
     st.markdown("""
     <style>
         .header-section {
@@ -247,8 +228,7 @@ def show():
         )
         
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Tire Image", use_container_width=True)
+            st.image(upload_preview(uploaded_file), caption="Uploaded Tire Image", use_container_width=True)
     
     with col2:
         st.markdown("### Quick Actions")
@@ -260,77 +240,18 @@ def show():
         st.markdown("---")
         st.markdown('<p style="font-size: 1.5rem; font-weight: 700; color: #1a1a1a; margin: 2rem 0 1rem 0;">Analysis Results</p>', unsafe_allow_html=True)
         
-        with st.spinner("Analyzing tire condition with AI..."):
-            result = analyze_tire_with_openrouter(image)
-        
-        condition = result.get("condition", "unknown")
-        tread_depth = result.get("tread_depth_mm", 0)
-        life_percent = result.get("remaining_life_percent", 0)
-        distance = result.get("estimated_distance_km", 0)
-        change_recommended = result.get("change_recommended", False)
-        description = result.get("description", "No description available")
-        
-        # Professional Condition Display
-        condition_class = f"condition-{condition}"
-        st.markdown(f"""
-        <div class="tire-result-card">
-            <div class="{condition_class}">
-                <h2 style="margin: 0; font-size: 1.8rem;">Condition: {condition.upper()}</h2>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Metrics
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric("Tread Depth", f"{tread_depth} mm", 
-                     help="Legal minimum is typically 1.6mm (2/32 inch)")
-        
-        with col2:
-            st.metric("Remaining Life", f"{life_percent:.1f}%")
-        
-        with col3:
-            st.metric("Safe Distance", f"{distance:,.0f} km",
-                     help="Estimated remaining safe driving distance")
-        
-        # Progress bar for remaining life
-        st.markdown(f"""
-        <div class="progress-bar">
-            <div class="progress-fill" style="width: {life_percent}%;">
-                {life_percent:.1f}%
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Description
-        st.markdown(f"""
-        <div class="tire-result-card">
-            <h3>📋 Analysis Details</h3>
-            <p>{description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        state = run_progressive_analysis(
+            'tire',
+            upload_key(uploaded_file),
+            lambda: start_progressive('tire', *tire_plan(uploaded_file.getvalue())),
+            "Analyzing tire condition..."
+        )
+        if state.status == FAILED:
+            st.error(f"Analysis failed: {state.error}")
+            if st.button("Retry analysis", key="tire_retry"):
+                reset_analysis('tire')
+                st.rerun()
+            return
         
-        # Recommendations
-        if change_recommended:
-            st.error("""
-            ⚠️ **Tire Replacement Recommended**
-            - Your tire condition is poor or below safe threshold
-            - Replace immediately for safety
-            - Estimated cost: $80 - $200 per tire
-            """)
-        elif condition == "fair":
-            st.warning("""
-            ⚠️ **Monitor Tire Condition**
-            - Tire is in fair condition
-            - Plan for replacement within next 5,000-10,000 km
-            - Regular inspections recommended
-            """)
-        else:
-            st.success("""
-            ✅ **Tire in Good Condition**
-            - Continue regular maintenance
-            - Check tire pressure monthly
-            - Rotate tires every 10,000 km
-            """)
-
+        # Poll for the remote result only while a provisional answer is showing
+        poll_analysis(state, show_tire_result)
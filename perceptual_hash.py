@@ -0,0 +1,196 @@
+"""
+Perceptual hashing for near-duplicate upload detection
+
+A 64-bit difference hash (dHash) survives re-compression, screenshots and small
+crops that defeat the exact-bytes cache. Hashes of analysed photos are kept in
+BK-trees so a new upload within a small Hamming distance of an earlier one can
+reuse that earlier result.
+"""
+
+import io
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import get_int_setting
+
+
+def dhash(image_bytes, hash_size=8):
+    """64-bit difference hash of an image"""
+    image = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding; the hash only needs a thumbnail
+    image.draft('L', (hash_size * 32, hash_size * 32))
+    image = ImageOps.exif_transpose(image).convert('L')
+    image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, item_hash, value):
+        node = [item_hash, value, {}]
+        self.size += 1
+        if self._root is None:
+            self._root = node
+            return
+
+        current = self._root
+        while True:
+            distance = hamming_distance(item_hash, current[0])
+            if distance == 0:
+                current[1] = value
+                self.size -= 1
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, item_hash, max_distance):
+        """All (distance, value) pairs within max_distance, closest first"""
+        matches = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_hash, value, children = stack.pop()
+            distance = hamming_distance(item_hash, node_hash)
+            if distance <= max_distance:
+                matches.append((distance, value))
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class NearDuplicateIndex:
+    """Per-namespace BK-trees of analysed photos, bounded in size"""
+
+    def __init__(self, threshold=5, max_entries=5000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = {}
+        self._trees = {}
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'matches': 0}
+
+    def find(self, namespace, item_hash, threshold=None):
+        """Closest (distance, result) within the threshold, or None"""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            self._stats['lookups'] += 1
+            tree = self._trees.get(namespace)
+            matches = tree.search(item_hash, threshold) if tree else []
+            if not matches:
+                return None
+            self._stats['matches'] += 1
+            return matches[0]
+
+    def add(self, namespace, item_hash, result):
+        with self._lock:
+            entries = self._entries.setdefault(namespace, OrderedDict())
+            entries[item_hash] = result
+            entries.move_to_end(item_hash)
+            tree = self._trees.setdefault(namespace, BKTree())
+
+            if len(entries) > self.max_entries:
+                # BK-trees can't delete, so rebuild from the newest entries
+                while len(entries) > self.max_entries // 2:
+                    entries.popitem(last=False)
+                tree = BKTree()
+                for entry_hash, entry_result in entries.items():
+                    tree.add(entry_hash, entry_result)
+                self._trees[namespace] = tree
+            else:
+                tree.add(item_hash, result)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = sum(len(entries) for entries in self._entries.values())
+        return stats
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """Process-wide near-duplicate index shared by every session"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex(
+                    threshold=get_int_setting("AUTOXPERT_PHASH_THRESHOLD", 5),
+                    max_entries=get_int_setting("AUTOXPERT_PHASH_MAX_ENTRIES", 5000)
+                )
+    return _index
+
+
+def make_namespace(feature, model, inputs=None, backend=None, base_url=None):
+    """Namespace so photos only match analyses of the same kind, backend and inputs"""
+    return json.dumps([feature, backend, model, base_url, inputs or {}], sort_keys=True, default=str)
+
+
+def find_similar_result(namespace, image_bytes):
+    """Return (result with match_distance or None, image hash)"""
+    try:
+        image_hash = dhash(image_bytes)
+    except Exception:
+        return None, None
+
+    match = get_near_duplicate_index().find(namespace, image_hash)
+    if match is None:
+        return None, image_hash
+
+    distance, result = match
+    result = dict(result)
+    result['match_distance'] = distance
+    return result, image_hash
+
+
+def remember_result(namespace, image_hash, result):
+    """Index an analysed photo so near-duplicates can reuse its result"""
+    if image_hash is not None:
+        get_near_duplicate_index().add(namespace, image_hash, dict(result))
+
+
+def group_near_duplicates(images, threshold=None):
+    """Map each image's index to the index of the first near-identical image before it
+
+    Images that can't be decoded are never treated as duplicates.
+    """
+    threshold = get_near_duplicate_index().threshold if threshold is None else threshold
+    tree = BKTree()
+    representatives = {}
+    for index, image_bytes in enumerate(images):
+        try:
+            image_hash = dhash(image_bytes)
+        except Exception:
+            representatives[index] = index
+            continue
+        matches = tree.search(image_hash, threshold)
+        if matches:
+            representatives[index] = min(value for _, value in matches)
+        else:
+            representatives[index] = index
+            tree.add(image_hash, index)
+    return representatives
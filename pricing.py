@@ -0,0 +1,154 @@
+"""
+Local vehicle pricing engine
+
+Per-brand depreciation (by age) and mileage curves are loaded from
+data/price_curves.json. Mileage is judged against what is typical for the
+vehicle's age, and every calculation is vectorized with numpy so whole
+inventories can be priced in one call.
+"""
+
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+
+from config import get_setting
+
+DEFAULT_CURVES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'price_curves.json')
+
+# Share of the new price still retained, used to grade condition without a photo
+CONDITION_THRESHOLDS = (
+    (0.80, "excellent"),
+    (0.55, "good"),
+    (0.35, "fair"),
+)
+
+
+class PricingModel:
+    """Per-brand depreciation and mileage curves with quantile price ranges"""
+
+    def __init__(self, curves):
+        self.currency = curves.get('currency', 'USD')
+        self.annual_km = float(curves.get('annual_km', 15000))
+        self.assumed_age = float(curves.get('assumed_age', 5))
+        self.brands = {}
+        for name, brand in curves['brands'].items():
+            age_curve = np.asarray(brand['age_curve'], dtype=float)
+            mileage_curve = np.asarray(brand['mileage_curve'], dtype=float)
+            quantiles = brand.get('quantiles', {})
+            self.brands[name] = {
+                'new_price': float(brand['new_price']),
+                'age_x': age_curve[:, 0],
+                'age_y': age_curve[:, 1],
+                'mileage_x': mileage_curve[:, 0],
+                'mileage_y': mileage_curve[:, 1],
+                'p10': float(quantiles.get('p10', 0.85)),
+                'p50': float(quantiles.get('p50', 1.0)),
+                'p90': float(quantiles.get('p90', 1.15)),
+            }
+        if 'default' not in self.brands:
+            raise ValueError("Price curves must define a 'default' brand")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def predict_batch(self, brands, years, mileages, reference_year=None):
+        """Price many vehicles at once; missing years or mileages may be None/NaN"""
+        brands = np.asarray(brands).astype(str)
+        years = np.asarray(years, dtype=float)
+        mileages = np.asarray(mileages, dtype=float)
+        reference_year = reference_year or datetime.date.today().year
+
+        ages = np.where(np.isnan(years), self.assumed_age, np.clip(reference_year - years, 0, None))
+        expected_km = ages * self.annual_km
+        mileages = np.where(np.isnan(mileages), expected_km, mileages)
+        excess_km = mileages - expected_km
+
+        p10 = np.empty(len(brands))
+        p50 = np.empty(len(brands))
+        p90 = np.empty(len(brands))
+        retained = np.empty(len(brands))
+        known_brand = np.zeros(len(brands), dtype=bool)
+        extrapolated = np.zeros(len(brands), dtype=bool)
+
+        # Loop over the handful of distinct brands, not over vehicles
+        names, inverse = np.unique(brands, return_inverse=True)
+        for index, name in enumerate(names):
+            mask = inverse == index
+            curve = self.brands.get(name)
+            if curve is None:
+                curve = self.brands['default']
+            else:
+                known_brand[mask] = name != 'default'
+            age_factor = np.interp(ages[mask], curve['age_x'], curve['age_y'])
+            mileage_factor = np.interp(excess_km[mask], curve['mileage_x'], curve['mileage_y'])
+            value = curve['new_price'] * age_factor * mileage_factor
+            p10[mask] = value * curve['p10']
+            p50[mask] = value * curve['p50']
+            p90[mask] = value * curve['p90']
+            retained[mask] = age_factor * mileage_factor
+            # Mileage far outside the curve's points is priced at the curve's end value
+            extrapolated[mask] = (excess_km[mask] < curve['mileage_x'][0]) | (excess_km[mask] > curve['mileage_x'][-1])
+
+        return {
+            'estimated_price': np.round(p50),
+            'price_range_min': np.round(p10),
+            'price_range_max': np.round(p90),
+            'value_retained': retained,
+            'known_brand': known_brand,
+            'extrapolated': extrapolated,
+        }
+
+    def predict(self, brand, model_year=None, mileage=None, reference_year=None):
+        """Price one vehicle, returning the same fields as the vision analysis"""
+        batch = self.predict_batch([brand], [model_year], [mileage], reference_year)
+        retained = float(batch['value_retained'][0])
+        condition = "poor"
+        for threshold, label in CONDITION_THRESHOLDS:
+            if retained >= threshold:
+                condition = label
+                break
+
+        # A known brand with year and mileage inside its curves is enough to price
+        # locally; less is known when the brand or inputs are missing or unusual
+        confidence = 0.85 if batch['known_brand'][0] else 0.55
+        confidence -= 0.2 * (model_year is None) + 0.15 * (mileage is None)
+        confidence -= 0.1 * bool(batch['extrapolated'][0])
+
+        return {
+            "estimated_price": float(batch['estimated_price'][0]),
+            "price_range_min": float(batch['price_range_min'][0]),
+            "price_range_max": float(batch['price_range_max'][0]),
+            "condition": condition,
+            "confidence": round(confidence, 2),
+            "factors": [
+                f"Brand: {brand}",
+                f"Model Year: {model_year if model_year is not None else 'Unknown'}",
+                f"Mileage: {f'{mileage} km' if mileage is not None else 'Unknown'}",
+                f"Value retained: {retained * 100:.0f}% of new price"
+            ],
+            "description": f"Estimated market value for {brand} vehicle based on brand depreciation and mileage curves."
+        }
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_pricing_model():
+    """Process-wide pricing model, loaded once from the curves file"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = PricingModel.from_file(get_setting("AUTOXPERT_PRICE_CURVES", DEFAULT_CURVES_PATH))
+    return _model
+
+
+def predict_batch(brands, years, mileages, reference_year=None):
+    """Price whole inventories with the shared pricing model"""
+    return get_pricing_model().predict_batch(brands, years, mileages, reference_year)
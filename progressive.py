@@ -0,0 +1,99 @@
+"""
+Progressive analysis: show the local answer now, swap in the remote one later
+
+The local analyzer runs inline and its result is shown straight away as a
+provisional answer. When it isn't confident enough, the remote call runs on a
+shared background pool and the page polls for it from a fragment. Fields of
+the remote reply are merged over the provisional answer as they stream in.
+poll_analysis is that fragment, shared by every page with a running analysis,
+progressive or on the job queue.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from analysis_state import refresh_analysis, RUNNING
+from config import get_int_setting, get_float_setting
+from inference_router import run_local, run_remote
+from rate_limiter import queue_listener
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_background_executor():
+    """Process-wide pool for remote analyses running behind provisional results"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_int_setting("AUTOXPERT_BACKGROUND_WORKERS", 8),
+                    thread_name_prefix="remote-analysis"
+                )
+    return _executor
+
+
+class ProgressiveAnalysis:
+    """A provisional local result plus an optional pending remote result"""
+
+    def __init__(self, provisional, future=None):
+        self.provisional = provisional
+        self.future = future
+        self.partial = {}
+        self.queue_position = None
+
+    def update_partial(self, fields):
+        """Record remote fields completed so far (called from the worker thread)"""
+        self.partial = fields
+
+    def update_queue_position(self, position):
+        """Record where the remote request waits in the outbound queue, None once sent"""
+        self.queue_position = position
+
+    def done(self):
+        return self.future is None or self.future.done()
+
+    def result(self):
+        """The best result available right now"""
+        if self.future is None or not self.future.done():
+            if self.partial:
+                return dict(self.provisional, **self.partial, source="streaming")
+            return self.provisional
+        return self.future.result()
+
+
+def start_progressive(feature, local_analyze, remote_analyze, agree=None):
+    """Run the local analyzer now and, if it's unsure, the remote one in the background"""
+    local, confident = run_local(feature, local_analyze, 0.0 if remote_analyze is None else None)
+    if confident:
+        return ProgressiveAnalysis(local)
+
+    # run_remote never raises; failures come back as the local result marked fallback
+    progress = ProgressiveAnalysis(local)
+
+    def remote():
+        with queue_listener(progress.update_queue_position):
+            return remote_analyze(on_partial=progress.update_partial)
+
+    progress.future = get_background_executor().submit(run_remote, feature, local, remote, agree)
+    return progress
+
+
+def poll_analysis(state, render):
+    """Render a page's analysis with render(state), polling from a fragment while it runs
+
+    Only the fragment reruns while polling; once the analysis finishes the
+    whole page reruns so the polling stops.
+    """
+    @st.fragment(run_every=get_float_setting("AUTOXPERT_POLL_SECONDS", 1.0) if state.status == RUNNING else None)
+    def analysis_results():
+        was_running = state.status == RUNNING
+        refresh_analysis(state)
+        if was_running and state.status != RUNNING:
+            st.rerun()
+        render(state)
+
+    analysis_results()
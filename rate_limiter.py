@@ -0,0 +1,222 @@
+"""
+Outbound rate limiting for the vision API
+
+Every request to an upstream, from every session, passes through that
+upstream's process-wide limiter. A token bucket caps the request rate, and an AIMD concurrency limit
+(additive increase on success, halve on 429) adapts the number of requests in
+flight to what the upstream currently accepts. A 429 with Retry-After also
+pauses new requests until the upstream is ready. Waiting requests queue in
+FIFO order and can report their queue position to the UI.
+"""
+
+import email.utils
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import get_int_setting, get_float_setting
+
+_listener = threading.local()
+
+
+class QueueTimeout(Exception):
+    """Raised when a request waited too long for an outbound slot"""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@contextmanager
+def queue_listener(callback):
+    """Report this thread's queue position to callback while it waits for a slot
+
+    callback receives the 1-based position while queued and None once the
+    request is sent. It is called with the limiter's lock held, so keep it cheap.
+    """
+    previous = getattr(_listener, 'callback', None)
+    _listener.callback = callback
+    try:
+        yield
+    finally:
+        _listener.callback = previous
+
+
+def _report_position(position):
+    callback = getattr(_listener, 'callback', None)
+    if callback is not None:
+        callback(position)
+
+
+class TokenBucket:
+    """Classic token bucket; callers hold the owning limiter's lock"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 when one is ready)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Slot:
+    """Outcome of one request, reported back to the limiter on release"""
+
+    def __init__(self):
+        self.throttled = False
+        self.retry_after = None
+
+    def throttle(self, retry_after=None):
+        """Mark the request as rejected with 429"""
+        self.throttled = True
+        self.retry_after = retry_after
+
+
+class OutboundLimiter:
+    """Token bucket plus AIMD concurrency limit with a FIFO wait queue"""
+
+    def __init__(self, rate=5.0, burst=10, initial_limit=4, min_limit=1, max_limit=16,
+                 default_backoff=1.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.default_backoff = default_backoff
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stats = {'acquired': 0, 'queued': 0, 'throttled': 0, 'timeouts': 0}
+
+    def acquire(self, timeout=None):
+        """Wait in line for a token and a concurrency slot"""
+        ticket = object()
+        waited = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    position = self._queue.index(ticket)
+                    wait = None
+                    if position == 0 and self.in_flight < int(self.limit):
+                        if now < self.blocked_until:
+                            wait = self.blocked_until - now
+                        else:
+                            wait = self.bucket.wait_time(now)
+                            if wait == 0:
+                                self.bucket.take(now)
+                                self.in_flight += 1
+                                self._queue.popleft()
+                                self._stats['acquired'] += 1
+                                self._cond.notify_all()
+                                _report_position(None)
+                                return
+
+                    if not waited:
+                        waited = True
+                        self._stats['queued'] += 1
+                    _report_position(position + 1)
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise QueueTimeout(f"Waited {timeout:.0f}s for an outbound request slot")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, throttled=False, retry_after=None, succeeded=True):
+        """Return a slot, adapting the concurrency limit to how the request went"""
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                # Multiplicative decrease, and hold new requests until Retry-After
+                self._stats['throttled'] += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+                pause = self.default_backoff if retry_after is None else retry_after
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            elif succeeded:
+                # Additive increase: roughly one more slot per limit's worth of successes
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Hold an outbound slot for the duration of a request"""
+        self.acquire(timeout)
+        slot = _Slot()
+        succeeded = False
+        try:
+            yield slot
+            succeeded = True
+        finally:
+            self.release(slot.throttled, slot.retry_after, succeeded)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'waiting': len(self._queue),
+                'paused_for': max(0.0, self.blocked_until - time.monotonic()),
+            })
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name="openrouter", settings_prefix="OPENROUTER"):
+    """Process-wide limiter for one upstream, shared by every analyzer and session
+
+    Its settings are read as <settings_prefix>_RATE_PER_SECOND, _BURST and
+    _INITIAL/_MIN/_MAX_CONCURRENCY.
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = OutboundLimiter(
+                    rate=get_float_setting(f"{settings_prefix}_RATE_PER_SECOND", 5.0),
+                    burst=get_int_setting(f"{settings_prefix}_BURST", 10),
+                    initial_limit=get_int_setting(f"{settings_prefix}_INITIAL_CONCURRENCY", 4),
+                    min_limit=get_int_setting(f"{settings_prefix}_MIN_CONCURRENCY", 1),
+                    max_limit=get_int_setting(f"{settings_prefix}_MAX_CONCURRENCY", 16)
+                )
+                _limiters[name] = limiter
+    return limiter
@@ -0,0 +1,259 @@
+"""
+Resilience around remote analyses
+
+Remote calls get a per-feature deadline, jittered exponential-backoff retries
+for transient failures and, optionally, a hedged second request once the first
+has run longer than the feature's recent p95 latency. Each upstream has a
+circuit breaker, shared by every feature, that stops calling it after repeated
+failures so
+analyses fall back to the local analyzer at once instead of each user waiting
+for a timeout; after a cool-down a single probe request decides whether to
+close it again.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import requests
+
+from config import get_int_setting, get_float_setting, get_bool_setting
+from openrouter_client import OpenRouterError
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+DEFAULT_DEADLINES = {
+    'damage': 20.0,
+    'tire': 20.0,
+    'market': 25.0,
+}
+
+# Hedging needs enough samples for a meaningful p95
+MIN_HEDGE_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream that is known to be unhealthy"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a feature's deadline passes before a result arrives"""
+
+
+def is_retryable(error):
+    """Transient failures worth another attempt"""
+    if isinstance(error, OpenRouterError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def get_deadline(feature):
+    """Per-feature time budget for a remote analysis (AUTOXPERT_<FEATURE>_DEADLINE_SECONDS)"""
+    return get_float_setting(
+        f"AUTOXPERT_{feature.upper()}_DEADLINE_SECONDS",
+        DEFAULT_DEADLINES.get(feature, 20.0)
+    )
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may go out now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                # Let exactly one probe through
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Give up a probe slot without a verdict (e.g. a non-upstream error)"""
+        with self._lock:
+            self._probing = False
+
+
+class Resilience:
+    """Deadlines, retries, hedging and the circuit breaker for remote calls"""
+
+    def __init__(self, breaker, retries=2, base_delay=0.5, max_delay=4.0,
+                 hedge=False, hedge_min_delay=1.0, hedge_workers=8):
+        self.breaker = breaker
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="hedge")
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+            'short_circuited': 0, 'deadline_exceeded': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _record_latency(self, feature, seconds):
+        with self._lock:
+            self._latencies.setdefault(feature, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def hedge_delay(self, feature):
+        """Seconds to wait before hedging: the feature's recent p95, or None if unknown"""
+        with self._lock:
+            latencies = list(self._latencies.get(feature, ()))
+        if len(latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return max(self.hedge_min_delay, float(np.percentile(latencies, 95)))
+
+    def call(self, feature, attempt, hedge=None):
+        """Run attempt(timeout) under the feature's deadline, retry policy and breaker
+
+        attempt receives the seconds left before the deadline and should use
+        them as its request timeout. Hedging is only safe for attempts without
+        side effects such as streamed callbacks, so callers can turn it off.
+        """
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpen("AI service is temporarily unavailable")
+
+        deadline = time.monotonic() + get_deadline(feature)
+        hedge = self.hedge if hedge is None else hedge
+        try:
+            result = self._call_with_retries(feature, attempt, deadline, hedge)
+        except Exception as e:
+            if is_retryable(e) or isinstance(e, DeadlineExceeded):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _call_with_retries(self, feature, attempt, deadline, hedge):
+        for attempt_number in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count('deadline_exceeded')
+                raise DeadlineExceeded(f"No answer within the {feature} deadline")
+            try:
+                start = time.monotonic()
+                if hedge:
+                    result = self._hedged(feature, attempt, deadline)
+                else:
+                    result = attempt(remaining)
+                self._record_latency(feature, time.monotonic() - start)
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt_number == self.retries:
+                    raise
+                # Full jitter keeps retrying clients from synchronising
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt_number))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+
+    def _hedged(self, feature, attempt, deadline):
+        """Send a second copy of the request if the first outlives the p95 latency"""
+        delay = self.hedge_delay(feature)
+        if delay is None:
+            return attempt(deadline - time.monotonic())
+
+        first = self._hedge_executor.submit(attempt, deadline - time.monotonic())
+
+        done, _ = wait([first], timeout=min(delay, max(0.0, deadline - time.monotonic())))
+        if done:
+            return first.result()
+
+        self._count('hedges')
+        second = self._hedge_executor.submit(attempt, deadline - time.monotonic())
+        pending = {first, second}
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower copy is left to finish; its result is discarded
+                    if future is second:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        self._count('deadline_exceeded')
+        raise DeadlineExceeded(f"No answer within the {feature} deadline")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['breaker'] = self.breaker.state
+        return stats
+
+
+_resilience = {}
+_resilience_lock = threading.Lock()
+
+
+def get_resilience(name="openrouter"):
+    """Process-wide resilience layer for one upstream, with its own circuit breaker"""
+    resilience = _resilience.get(name)
+    if resilience is None:
+        with _resilience_lock:
+            resilience = _resilience.get(name)
+            if resilience is None:
+                resilience = Resilience(
+                    CircuitBreaker(
+                        failure_threshold=get_int_setting("AUTOXPERT_BREAKER_FAILURES", 5),
+                        reset_timeout=get_float_setting("AUTOXPERT_BREAKER_RESET_SECONDS", 30.0)
+                    ),
+                    retries=get_int_setting("AUTOXPERT_RETRIES", 2),
+                    base_delay=get_float_setting("AUTOXPERT_RETRY_BASE_DELAY", 0.5),
+                    max_delay=get_float_setting("AUTOXPERT_RETRY_MAX_DELAY", 4.0),
+                    hedge=get_bool_setting("AUTOXPERT_HEDGE", False),
+                    hedge_min_delay=get_float_setting("AUTOXPERT_HEDGE_MIN_DELAY", 1.0)
+                )
+                _resilience[name] = resilience
+    return resilience
@@ -0,0 +1,314 @@
+"""
+Structured decoding of model replies
+
+Every remote reply goes through one decoder. The reply object is located in a
+single pass (code fences and surrounding prose are skipped) and parsed once;
+only if that fails does a cheap repair pass fix the usual model mistakes
+(trailing commas, single quotes, Python literals, unquoted keys, a reply cut
+off mid-object) and parse again. The object is then validated against the
+feature's schema, with numeric strings such as "$12,500", "3.5 mm", "85%" or
+"1.2 million" coerced to numbers; a number followed by an unknown unit is
+rejected rather than guessed at. A reply that still can't be decoded raises
+DecodeError so the caller fails over instead of showing bad data. Per-feature
+decoded, repaired and failed counts are kept for monitoring.
+"""
+
+import json
+import re
+import threading
+
+SCHEMAS = {
+    'damage': {
+        'type': {'type': 'enum', 'values': ('dent', 'scratch'), 'required': True},
+        'confidence': {'type': 'probability', 'default': 0.7},
+        'panel': {'type': 'string'},
+        'description': {'type': 'string', 'default': ''},
+    },
+    'tire': {
+        'condition': {'type': 'enum', 'values': ('good', 'fair', 'poor'), 'required': True},
+        'tread_depth_mm': {'type': 'number', 'min': 0, 'max': 20, 'default': 0.0},
+        'remaining_life_percent': {'type': 'number', 'min': 0, 'max': 100, 'default': 0.0},
+        'estimated_distance_km': {'type': 'number', 'min': 0, 'default': 0.0},
+        'change_recommended': {'type': 'boolean', 'default': False},
+        'confidence': {'type': 'probability'},
+        'description': {'type': 'string', 'default': ''},
+    },
+    'market': {
+        'estimated_price': {'type': 'number', 'min': 0, 'required': True},
+        'price_range_min': {'type': 'number', 'min': 0},
+        'price_range_max': {'type': 'number', 'min': 0},
+        'condition': {'type': 'enum', 'values': ('excellent', 'good', 'fair', 'poor'), 'default': 'good'},
+        'factors': {'type': 'list', 'default': []},
+        'confidence': {'type': 'probability'},
+        'description': {'type': 'string', 'default': ''},
+    },
+}
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+_NUMBER = re.compile(r'(-?\d+(?:\.\d+)?)\s*([A-Za-z]+|%)?')
+# Scale words models put after prices; anything else after a number must be a known unit
+_MULTIPLIERS = {
+    'k': 1e3, 'thousand': 1e3, 'lakh': 1e5, 'lakhs': 1e5,
+    'm': 1e6, 'mn': 1e6, 'mil': 1e6, 'million': 1e6, 'crore': 1e7,
+    'b': 1e9, 'bn': 1e9, 'billion': 1e9,
+}
+_UNITS = {
+    '%', 'percent', 'mm', 'millimeters', 'millimetres', 'km', 'kms', 'kilometers', 'kilometres',
+    'usd', 'lkr', 'rs', 'dollars', 'rupees', 'years', 'yrs',
+}
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_UNQUOTED_KEY = re.compile(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)(\s*:)')
+_PYTHON_LITERAL = re.compile(r'\b(True|False|None)\b')
+_DANGLING_KEY = re.compile(r'([{,])\s*"[^"]*"\s*:?\s*$')
+_JSON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_TRUE_WORDS = ('true', 'yes', 'y', '1', 'recommended')
+_FALSE_WORDS = ('false', 'no', 'n', '0', 'not recommended')
+
+
+class DecodeError(ValueError):
+    """Raised when a model reply can't be turned into a valid result"""
+
+
+def extract_object(content):
+    """The reply object's text, from its opening brace to the matching close or the end of the reply"""
+    fenced = _FENCE.search(content)
+    if fenced and '{' in fenced.group(1):
+        content = fenced.group(1)
+    start = content.find('{')
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(content)):
+        char = content[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return content[start:i + 1]
+    return content[start:]
+
+
+def _close_truncated(text):
+    """Close the string, arrays and objects left open by a reply that was cut off"""
+    stack = []
+    in_string = False
+    escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    if not stack and not in_string:
+        return text
+    if in_string:
+        text += '"'
+    # Drop a member that was cut off before its value began
+    if stack and stack[-1] == '}':
+        text = _DANGLING_KEY.sub(r'\1', text)
+    return text.rstrip().rstrip(',') + ''.join(reversed(stack))
+
+
+def repair(text):
+    """Cheap fixes for the malformed JSON vision models commonly produce"""
+    if '"' not in text:
+        text = text.replace("'", '"')
+    text = _PYTHON_LITERAL.sub(lambda m: _JSON_LITERALS[m.group(1)], text)
+    text = _UNQUOTED_KEY.sub(r'\1"\2"\3', text)
+    text = _close_truncated(text)
+    return _TRAILING_COMMA.sub(r'\1', text)
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError(f"Expected a number, got {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value).replace(',', ''))
+    if match is None:
+        raise ValueError(f"Expected a number, got {value!r}")
+    number = float(match.group(1))
+    suffix = (match.group(2) or '').lower()
+    if suffix in _MULTIPLIERS:
+        return number * _MULTIPLIERS[suffix]
+    if suffix and suffix not in _UNITS:
+        # Guessing the scale of "12 grand" or "5 lac" would silently mis-price
+        raise ValueError(f"Unknown unit in {value!r}")
+    return number
+
+
+def _coerce(name, spec, value):
+    kind = spec['type']
+    if kind == 'number':
+        number = _to_number(value)
+        if 'min' in spec:
+            number = max(spec['min'], number)
+        if 'max' in spec:
+            number = min(spec['max'], number)
+        return number
+    if kind == 'probability':
+        number = _to_number(value)
+        # "85%" or 85 means a percentage
+        if number > 1 or (isinstance(value, str) and '%' in value):
+            number /= 100
+        return min(1.0, max(0.0, number))
+    if kind == 'enum':
+        text = str(value).strip().lower()
+        for allowed in spec['values']:
+            if text == allowed or text.startswith(allowed):
+                return allowed
+        raise ValueError(f"{name} must be one of {', '.join(spec['values'])}, got {value!r}")
+    if kind == 'boolean':
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE_WORDS:
+            return True
+        if text in _FALSE_WORDS:
+            return False
+        raise ValueError(f"{name} must be true or false, got {value!r}")
+    if kind == 'list':
+        if isinstance(value, list):
+            return [str(item) for item in value]
+        return [part.strip() for part in str(value).split(',') if part.strip()]
+    return '' if value is None else str(value)
+
+
+def coerce_fields(feature, fields):
+    """Best-effort coercion of a partial result; fields that don't fit the schema are dropped"""
+    schema = SCHEMAS.get(feature, {})
+    coerced = {}
+    for name, value in fields.items():
+        if name not in schema:
+            coerced[name] = value
+            continue
+        try:
+            coerced[name] = _coerce(name, schema[name], value)
+        except ValueError:
+            pass
+    return coerced
+
+
+def validate(feature, obj):
+    """Coerce a decoded object to the feature's schema; raises DecodeError if it doesn't fit"""
+    if not isinstance(obj, dict):
+        raise DecodeError(f"Expected a JSON object, got {type(obj).__name__}")
+    schema = SCHEMAS.get(feature, {})
+    result = dict(obj)
+    for name, spec in schema.items():
+        value = obj.get(name)
+        if value is None or value == '':
+            if spec.get('required'):
+                raise DecodeError(f"Reply is missing {name}")
+            if 'default' in spec:
+                result[name] = spec['default']
+            else:
+                result.pop(name, None)
+            continue
+        try:
+            result[name] = _coerce(name, spec, value)
+        except ValueError as e:
+            if spec.get('required'):
+                raise DecodeError(str(e))
+            if 'default' in spec:
+                result[name] = spec['default']
+            else:
+                result.pop(name, None)
+
+    # Keep the range ordered and around the estimate
+    if feature == 'market':
+        estimate = result['estimated_price']
+        low = result.setdefault('price_range_min', estimate)
+        high = result.setdefault('price_range_max', estimate)
+        result['price_range_min'], result['price_range_max'] = min(low, high, estimate), max(low, high, estimate)
+    return result
+
+
+def _salvage_damage(content):
+    """Keyword guess for a damage reply written as prose"""
+    return {
+        "type": "scratch" if "scratch" in content.lower() else "dent",
+        "confidence": 0.7,
+        "description": content.strip()
+    }
+
+
+class DecoderStats:
+    """Decoded, repaired and failed replies per feature"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, feature, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(feature, {'decoded': 0, 'repaired': 0, 'failed': 0})
+            counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {feature: dict(counts) for feature, counts in self._counts.items()}
+        for counts in snapshot.values():
+            total = counts['decoded'] + counts['repaired'] + counts['failed']
+            counts['failure_rate'] = counts['failed'] / total if total else 0.0
+        return snapshot
+
+
+_stats = DecoderStats()
+
+
+def decode(feature, content):
+    """Parse and validate a model reply for a feature; raises DecodeError when it can't be used"""
+    text = extract_object(content or "")
+    try:
+        if text is None:
+            if feature == 'damage' and content and content.strip():
+                result = validate(feature, _salvage_damage(content))
+                _stats.record(feature, 'repaired')
+                return result
+            raise DecodeError("Reply contains no JSON object")
+
+        try:
+            obj = json.loads(text)
+            outcome = 'decoded'
+        except ValueError:
+            try:
+                obj = json.loads(repair(text))
+            except ValueError as e:
+                if feature != 'damage':
+                    raise DecodeError(f"Reply is not valid JSON: {e}")
+                obj = _salvage_damage(content)
+            outcome = 'repaired'
+
+        result = validate(feature, obj)
+    except DecodeError:
+        _stats.record(feature, 'failed')
+        raise
+    _stats.record(feature, outcome)
+    return result
+
+
+def get_decoder_stats():
+    """Decoded, repaired and failed counts and the failure rate per feature"""
+    return _stats.snapshot()
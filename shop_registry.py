@@ -0,0 +1,187 @@
+"""
+Process-wide repair shop registry
+
+One registry per process replaces the per-session copies of the shop list.
+Shops live in SQLite (shops.db in the data directory, seeded with the
+built-in Sri Lankan shops on first use) so a sign-up or price change made in
+one session is visible to every other session, the API server and later
+restarts. Reads are served from an immutable in-memory snapshot that is
+rebuilt after each write, or when another process has written (checked at
+most every AUTOXPERT_SHOP_REFRESH_SECONDS). Writes are single transactions;
+each shop carries a version number so a stale edit is refused instead of
+silently overwriting a newer one.
+"""
+
+import copy
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from config import get_data_dir, get_float_setting
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shops (
+    email TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    password_hash TEXT,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+PASSWORD_ITERATIONS = 200000
+
+# Fields a shop owner may change from the dashboard
+EDITABLE_FIELDS = ('name', 'phone', 'location', 'address', 'dent_price', 'scratch_price', 'services')
+
+
+class StaleShopVersion(Exception):
+    """Raised when a shop changed since the version the edit was based on"""
+
+
+def hash_password(password, salt=None):
+    """PBKDF2 hash of a shop password as 'salt$digest'"""
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), PASSWORD_ITERATIONS)
+    return f"{salt}${digest.hex()}"
+
+
+def check_password(password, password_hash):
+    if not password_hash or '$' not in password_hash:
+        return False
+    salt = password_hash.split('$', 1)[0]
+    return hmac.compare_digest(hash_password(password, salt), password_hash)
+
+
+class ShopRegistry:
+    """Repair shops in SQLite, read through an in-memory snapshot"""
+
+    def __init__(self, path, seed_shops=(), refresh_seconds=1.0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for shop in seed_shops:
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO shops (email, data, password_hash, version, updated_at) "
+                        "VALUES (?, ?, NULL, 1, ?)",
+                        (shop['email'], json.dumps(shop), time.time())
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            self._load()
+
+    def _load(self):
+        """Rebuild the snapshot from the database; called with the lock held"""
+        shops = {}
+        for email, data, version in self._db.execute("SELECT email, data, version FROM shops ORDER BY email"):
+            shop = json.loads(data)
+            shop['email'] = email
+            shop['version'] = version
+            shops[email] = shop
+        self._snapshot = shops
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self._checked_at = time.monotonic()
+
+    def _current(self):
+        """The snapshot, reloaded first if another process has written since it was built"""
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            with self._lock:
+                if self._db.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+                    self._load()
+                self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def shops(self):
+        """Every registered shop (copies, safe to modify)"""
+        return [copy.deepcopy(shop) for shop in self._current().values()]
+
+    def get(self, email):
+        """One shop by email, or None"""
+        shop = self._current().get(email)
+        return copy.deepcopy(shop) if shop is not None else None
+
+    def authenticate(self, email, password):
+        """The shop if the password matches, else None"""
+        with self._lock:
+            row = self._db.execute("SELECT password_hash FROM shops WHERE email = ?", (email,)).fetchone()
+        if row is None or not check_password(password, row[0]):
+            return None
+        return self.get(email)
+
+    def register(self, shop, password):
+        """Add a shop; returns False if the email is already registered"""
+        shop = {name: value for name, value in shop.items() if name not in ('version', 'password')}
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO shops (email, data, password_hash, version, updated_at) VALUES (?, ?, ?, 1, ?)",
+                    (shop['email'], json.dumps(shop), hash_password(password), time.time())
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._load()
+        return True
+
+    def update(self, email, changes, expected_version=None):
+        """Apply changes to a shop in one transaction and return the new version
+
+        With expected_version, the update is refused (StaleShopVersion) if the
+        shop was changed by someone else since that version was read.
+        """
+        unknown = set(changes) - set(EDITABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Fields cannot be edited: {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT data, version FROM shops WHERE email = ?", (email,)).fetchone()
+                if row is None:
+                    raise KeyError(email)
+                data, version = row
+                if expected_version is not None and version != expected_version:
+                    raise StaleShopVersion(f"Shop {email} is at version {version}, not {expected_version}")
+                shop = json.loads(data)
+                shop.update(changes)
+                self._db.execute(
+                    "UPDATE shops SET data = ?, version = ?, updated_at = ? WHERE email = ?",
+                    (json.dumps(shop), version + 1, time.time(), email)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._load()
+        return version + 1
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_shop_registry():
+    """Process-wide shop registry shared by every session and the API server"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from utils import get_sri_lankan_shops
+                _registry = ShopRegistry(
+                    os.path.join(get_data_dir(), 'shops.db'),
+                    seed_shops=get_sri_lankan_shops(),
+                    refresh_seconds=get_float_setting("AUTOXPERT_SHOP_REFRESH_SECONDS", 1.0)
+                )
+    return _registry
@@ -0,0 +1,92 @@
+"""
+Single-flight request coalescing
+
+When several sessions ask for the same analysis at the same moment (a shared
+link, staff uploading the same photo), only the first caller runs it; the
+others wait for that in-flight call and receive its result or its error. Calls
+are keyed on the analysis cache key, so once the leader finishes, later
+callers are served from the cache instead. Followers wait at most their own
+timeout, so a leader stuck on a slow upstream can't hold every caller hostage.
+"""
+
+import threading
+
+
+class FollowerTimeout(TimeoutError):
+    """Raised to a waiting caller when the shared call outlasts its timeout"""
+
+
+class _Call:
+    """One in-flight execution and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executions': 0, 'collapsed': 0, 'follower_timeouts': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() unless a call for key is already in flight, then share its outcome
+
+        A caller that joins an in-flight call waits at most timeout seconds for
+        it and then raises FollowerTimeout; the call itself carries on.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats['collapsed'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executions'] += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self._stats['follower_timeouts'] += 1
+                raise FollowerTimeout(f"Shared request still running after {timeout:.1f} s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide single-flight group shared by every session"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,49 @@
+"""
+Status captions shared by the analysis pages
+
+Small st.caption blocks that explain where a result came from and how the
+shared machinery behind it (cache, single-flight, upload compression, reply
+decoder, job queue) is doing. Kept here so every page shows the same figures
+worded the same way.
+"""
+
+import streamlit as st
+
+from analysis_cache import get_analysis_cache
+from image_processing import get_metrics as get_image_metrics
+from job_queue import get_job_queue
+from response_decoder import get_decoder_stats
+from single_flight import get_single_flight
+
+
+def show_result_status(feature, result):
+    """Cache, sharing and decoder figures, then where this result came from"""
+    cache_stats = get_analysis_cache().stats()
+    image_stats = get_image_metrics()
+    flight_stats = get_single_flight().stats()
+    decoder_stats = get_decoder_stats().get(feature, {'failure_rate': 0.0})
+    st.caption(
+        f"Analysis cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses · "
+        f"Shared in-flight requests: {flight_stats['collapsed']} · "
+        f"Upload bytes saved: {image_stats['bytes_saved'] / 1024 / 1024:.1f} MB · "
+        f"Unreadable AI replies: {decoder_stats['failure_rate'] * 100:.1f}%"
+    )
+    if result.get("source") == "local":
+        st.caption("Answered instantly by the on-device analyzer")
+    elif result.get("source") == "streaming":
+        st.caption("Showing the AI answer as it streams in")
+    elif result.get("source") == "fallback":
+        st.caption("AI service unavailable; showing the on-device estimate")
+    if "match_distance" in result:
+        st.caption(f"Reused the analysis of a near-identical photo (hash distance {result['match_distance']}/64)")
+
+
+def show_job_queue_stats():
+    """Caption with the current job queue load"""
+    stats = get_job_queue().stats()
+    caption = f"Job queue: {stats['queue_depth']} waiting, {stats['running']}/{stats['workers']} workers busy"
+    if stats['wait_p50_ms'] is not None:
+        caption += f" · typical wait {stats['wait_p50_ms'] / 1000:.1f} s"
+    if stats['run_p50_ms'] is not None:
+        caption += f" · typical run {stats['run_p50_ms'] / 1000:.1f} s"
+    st.caption(caption)
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# The app runs from the repository root and imports its modules top-level
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep caches and databases written during tests out of the working tree
+os.environ.setdefault("AUTOXPERT_DATA_DIR", tempfile.mkdtemp(prefix="autoxpert-tests-"))
+
+import pytest
+
+from stub_server import StubServer
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
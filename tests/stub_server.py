@@ -0,0 +1,110 @@
+"""
+Local stand-in for the OpenRouter chat completions endpoint
+
+Tests queue the replies the server should give, in order; once the queue is
+empty every request gets the default reply. Replies can carry any status and
+headers (429 with Retry-After, 503, ...) and a delay before answering, so the
+same server doubles as a fault injector for the resilience tests. A reply is either a plain JSON
+completion or a server-sent event stream written in the given raw chunks, so
+tests control exactly where the network reads split the events.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def completion(content):
+    """JSON body of a non-streamed chat completion"""
+    return json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+
+
+def delta_event(content):
+    """One SSE event carrying a content delta"""
+    return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n".encode()
+
+
+class Reply:
+    """What the stub sends for one request"""
+
+    def __init__(self, status=200, body=None, chunks=None, headers=None, delay=0.0, chunk_delay=0.0):
+        self.status = status
+        self.body = body if body is not None else completion("")
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        reply = self.server.stub._next(payload)
+        time.sleep(reply.delay)
+        try:
+            self._send(reply)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, as deadline tests expect it to
+            self.close_connection = True
+
+    def _send(self, reply):
+        self.send_response(reply.status)
+        for name, value in reply.headers.items():
+            self.send_header(name, value)
+        if reply.chunks is None:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(reply.body)))
+            self.end_headers()
+            self.wfile.write(reply.body)
+            return
+
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in reply.chunks + [b'']:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+            time.sleep(reply.chunk_delay)
+
+
+class StubServer:
+    """Threaded HTTP server on a free localhost port"""
+
+    def __init__(self, default=None):
+        self.default = default or Reply()
+        self.replies = deque()
+        self.requests = []
+        self.received_at = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.block_on_close = False
+        self._server.stub = self
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    def queue(self, *replies):
+        with self._lock:
+            self.replies.extend(replies)
+
+    def _next(self, payload):
+        with self._lock:
+            self.requests.append(payload)
+            self.received_at.append(time.monotonic())
+            return self.replies.popleft() if self.replies else self.default
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,190 @@
+import base64
+import json
+import os
+import threading
+import uuid
+import urllib.error
+import urllib.request
+
+import pytest
+
+import api_server
+from api_server import create_server, is_loopback
+
+
+@pytest.mark.parametrize('host,loopback', [
+    ("127.0.0.1", True), ("localhost", True), ("::1", True),
+    ("0.0.0.0", False), ("", False), ("192.168.1.20", False), ("example.com", False),
+])
+def test_is_loopback(host, loopback):
+    assert is_loopback(host) is loopback
+
+
+def test_refuses_public_bind_without_api_key(monkeypatch):
+    monkeypatch.delenv("AUTOXPERT_API_KEY", raising=False)
+    with pytest.raises(ValueError):
+        create_server("0.0.0.0", 0)
+
+
+def test_public_bind_requires_the_key(monkeypatch):
+    monkeypatch.setenv("AUTOXPERT_API_KEY", "secret")
+    server = create_server("0.0.0.0", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/health"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url, timeout=5)
+        assert error.value.code == 401
+        request = urllib.request.Request(url, headers={"X-API-Key": "secret"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert json.load(response)["status"] == "ok"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_loopback_default_needs_no_key(monkeypatch):
+    monkeypatch.delenv("AUTOXPERT_API_KEY", raising=False)
+    server = create_server(port=0)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.server_close()
+
+
+def test_embedded_server_refusal_leaves_app_running(monkeypatch):
+    monkeypatch.setenv("AUTOXPERT_API_EMBED", "1")
+    monkeypatch.setenv("AUTOXPERT_API_HOST", "0.0.0.0")
+    monkeypatch.delenv("AUTOXPERT_API_KEY", raising=False)
+    monkeypatch.setattr(api_server, "_embedded", None)
+    monkeypatch.setattr(api_server, "_embedded_error", None)
+    assert api_server.start_embedded_server() is None
+    assert "AUTOXPERT_API_KEY" in api_server._embedded_error
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def _photo(*parts):
+    with open(os.path.join(FIXTURES, *parts), 'rb') as f:
+        return f.read()
+
+
+def _serve(monkeypatch):
+    monkeypatch.delenv("AUTOXPERT_API_KEY", raising=False)
+    server = create_server("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    yield from _serve(monkeypatch)
+
+
+@pytest.fixture
+def small_api(monkeypatch):
+    monkeypatch.setenv("AUTOXPERT_API_MAX_BODY_BYTES", "1024")
+    yield from _serve(monkeypatch)
+
+
+def post(url, body, content_type="application/json"):
+    """(status, JSON reply) for a POST, error statuses included"""
+    if content_type == "application/json":
+        body = json.dumps(body).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_market_without_photo_uses_the_price_curves(api):
+    status, result = post(f"{api}/v1/market", {"brand": "Toyota", "model_year": 2020, "mileage": 0})
+    assert status == 200
+    assert result["source"] == "local"
+    assert "Mileage: 0 km" in result["factors"]
+
+
+def test_multipart_upload(api):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"vehicle_id\"\r\n\r\nVIN-1\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"dent.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + _photo('damage', 'dent', 'd11.jpg') + f"\r\n--{boundary}--\r\n".encode()
+
+    status, result = post(f"{api}/v1/damage", body, f"multipart/form-data; boundary={boundary}")
+
+    assert status == 200
+    assert result["type"] == "dent"
+
+
+def test_base64_body(api):
+    image = base64.b64encode(_photo('tire', 'good', sorted(os.listdir(os.path.join(FIXTURES, 'tire', 'good')))[0])).decode()
+
+    status, result = post(f"{api}/v1/tire", {"image_base64": f"data:image/jpeg;base64,{image}"})
+
+    assert status == 200
+    assert result["condition"] == "good"
+
+
+def test_batch_reports_each_item(api, monkeypatch):
+    def fail(image_bytes):
+        raise RuntimeError("connection to db-internal:5432 refused")
+
+    monkeypatch.setattr(api_server, "analyze_tire", fail)
+    image = base64.b64encode(_photo('damage', 'scratch', 's11.jpg')).decode()
+
+    status, result = post(f"{api}/v1/batch", {"items": [
+        {"feature": "damage", "image_base64": image},
+        {"feature": "damage", "image_base64": "not base64!"},
+        {"feature": "tire", "image_base64": image},
+    ]})
+
+    assert status == 200
+    ok, bad_input, failed = result["results"]
+    assert ok["status"] == "ok" and ok["result"]["type"] == "scratch"
+    assert bad_input == {"status": "error", "error": "image_base64 is not valid base64"}
+    # Unexpected failures are logged, not shown to the client
+    assert failed == {"status": "error", "error": api_server.INTERNAL_ERROR}
+
+
+def test_unexpected_error_is_not_shown_to_the_client(api, monkeypatch):
+    def fail(image_bytes):
+        raise RuntimeError("connection to db-internal:5432 refused")
+
+    monkeypatch.setattr(api_server, "analyze_damage", fail)
+    image = base64.b64encode(_photo('damage', 'dent', 'd11.jpg')).decode()
+
+    status, result = post(f"{api}/v1/damage", {"image_base64": image})
+
+    assert status == 500
+    assert result == {"error": api_server.INTERNAL_ERROR}
+
+
+def test_oversized_body_is_rejected(small_api):
+    status, result = post(f"{small_api}/v1/damage", {"image_base64": "A" * 4096})
+    assert status == 413
+
+
+@pytest.mark.parametrize('path,body', [
+    ("/v1/damage", {}),
+    ("/v1/damage", {"image_base64": base64.b64encode(b"not an image").decode()}),
+    ("/v1/market", {"model_year": 2020}),
+    ("/v1/market", {"brand": "Toyota", "mileage": "a lot"}),
+    ("/v1/shops", {"damage_type": "rust"}),
+    ("/v1/batch", {"items": []}),
+])
+def test_bad_input_is_rejected(api, path, body):
+    status, result = post(f"{api}{path}", body)
+    assert status == 400
+    assert result["error"]
+
+
+def test_invalid_json_is_rejected(api):
+    status, result = post(f"{api}/v1/damage", b"{not json", "application/json; charset=utf-8")
+    assert status == 400
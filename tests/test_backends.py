@@ -0,0 +1,52 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from analysis_cache import make_cache_key
+from backends import Backend, ChatBackend
+from openrouter_client import OpenRouterClient
+from rate_limiter import OutboundLimiter
+from stub_server import Reply, StubServer, completion
+
+
+def _photo():
+    image = np.random.default_rng(3).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def _backend(name, server):
+    client = OpenRouterClient("key", base_url=server.url, model="vision-1", limiter=OutboundLimiter(rate=1000, burst=1000))
+    return ChatBackend(name, client)
+
+
+def test_backend_requires_analyze():
+    with pytest.raises(TypeError):
+        Backend("incomplete")
+
+
+def test_cache_key_covers_backend_model_and_endpoint():
+    photo = _photo()
+    keys = {
+        make_cache_key(photo, "prompt", "vision-1", backend="openrouter", base_url="https://a"),
+        make_cache_key(photo, "prompt", "vision-2", backend="openrouter", base_url="https://a"),
+        make_cache_key(photo, "prompt", "vision-1", backend="onprem", base_url="https://a"),
+        make_cache_key(photo, "prompt", "vision-1", backend="openrouter", base_url="https://b"),
+    }
+    assert len(keys) == 4
+
+
+def test_switching_backend_does_not_serve_the_old_answer(stub):
+    other = StubServer(Reply(body=completion(json.dumps({"type": "scratch", "confidence": 0.9}))))
+    stub.default = Reply(body=completion(json.dumps({"type": "dent", "confidence": 0.9})))
+    photo = _photo()
+    try:
+        assert _backend("cloud", stub).analyze('damage', photo, "prompt")["type"] == "dent"
+        # Same model name, but a different endpoint now answers
+        assert _backend("onprem", other).analyze('damage', photo, "prompt")["type"] == "scratch"
+        # The original backend is still served from the cache
+        assert _backend("cloud", stub).analyze('damage', photo, "prompt")["type"] == "dent"
+        assert len(stub.requests) == 1 and len(other.requests) == 1
+    finally:
+        other.close()
@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from batch_cli import load_completed, main
+
+DAMAGE_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'damage')
+
+
+@pytest.fixture
+def photos(tmp_path):
+    source = tmp_path / 'photos'
+    source.mkdir()
+    for name in ('d1.jpg', 'd11.jpg'):
+        shutil.copy(os.path.join(DAMAGE_FIXTURES, 'dent', name), source / name)
+    for name in ('s1.jpg', 's11.jpg'):
+        shutil.copy(os.path.join(DAMAGE_FIXTURES, 'scratch', name), source / name)
+    return source
+
+
+def _run(source, output, *extra):
+    return main([str(source), '--output', str(output), '--local-only', '--processes', '1', *extra])
+
+
+def _records(output):
+    with open(output, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_directory_run_writes_one_line_per_photo(photos, tmp_path):
+    output = tmp_path / 'damage.jsonl'
+
+    assert _run(photos, output) == 0
+
+    records = _records(output)
+    assert sorted(r['id'] for r in records) == ['d1.jpg', 'd11.jpg', 's1.jpg', 's11.jpg']
+    assert all(r['status'] == 'ok' and r['feature'] == 'damage' for r in records)
+    assert {r['id'][0]: r['result']['type'] for r in records} == {'d': 'dent', 's': 'scratch'}
+
+
+def test_resume_skips_finished_photos_and_drops_a_cut_off_line(photos, tmp_path):
+    output = tmp_path / 'damage.jsonl'
+    assert _run(photos, output) == 0
+    finished = _records(output)[:2]
+
+    # Keep two results and half of a third, as a crash mid-write would leave it
+    with open(output, 'w', encoding='utf-8') as f:
+        for record in finished:
+            f.write(json.dumps(record) + "\n")
+        f.write('{"id": "cut')
+
+    assert _run(photos, output) == 0
+
+    # Each photo appears once: only the two unfinished ones were analysed again
+    records = _records(output)
+    assert records[:2] == finished
+    assert sorted(r['id'] for r in records) == ['d1.jpg', 'd11.jpg', 's1.jpg', 's11.jpg']
+
+
+def test_resume_reads_finished_ids_from_the_output(tmp_path):
+    output = tmp_path / 'damage.jsonl'
+    output.write_text(
+        json.dumps({'id': 'a.jpg', 'status': 'ok'}) + "\n"
+        + json.dumps({'id': 'b.jpg', 'status': 'error', 'error': 'ValueError: bad'}) + "\n"
+        + '{"id": "c.jpg", "sta'
+    )
+
+    assert load_completed(str(output)) == {'a.jpg', 'b.jpg'}
+    assert load_completed(str(output), retry_errors=True) == {'a.jpg'}
+    assert output.read_text().count("\n") == 2 and 'c.jpg' not in output.read_text()
+
+
+def test_unreadable_photo_is_reported_per_file(photos, tmp_path):
+    (photos / 'broken.jpg').write_bytes(b"not a photo")
+    output = tmp_path / 'damage.jsonl'
+
+    assert _run(photos, output) == 1
+
+    records = {r['id']: r for r in _records(output)}
+    assert len(records) == 5
+    assert records['broken.jpg']['status'] == 'error' and records['broken.jpg']['error']
+    assert all(r['status'] == 'ok' for name, r in records.items() if name != 'broken.jpg')
+
+    # A rerun leaves the failure alone unless asked to retry it
+    assert _run(photos, output) == 0
+    assert len(_records(output)) == 5
+    assert _run(photos, output, '--retry-errors') == 1
+    assert [r['id'] for r in _records(output)][5:] == ['broken.jpg']
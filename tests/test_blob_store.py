@@ -0,0 +1,88 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+from blob_store import BlobStore
+
+
+def _jpeg(seed, side=400):
+    image = Image.effect_noise((side, side), 40 + seed).convert('RGB')
+    buffered = io.BytesIO()
+    image.save(buffered, format='JPEG', quality=90)
+    return buffered.getvalue()
+
+
+def _age(store, digest, seconds):
+    past = time.time() - seconds
+    for name in [None] + list(store.rendition_sizes):
+        os.utime(store.path(digest, name), (past, past))
+
+
+def _stored(store, digest):
+    return [name for name in [None] + list(store.rendition_sizes) if os.path.exists(store.path(digest, name))]
+
+
+def test_read_returns_bytes_and_counts_misses(tmp_path):
+    store = BlobStore(str(tmp_path))
+    data = _jpeg(1)
+    digest = store.put(data)
+
+    original = store.read(digest)
+    assert isinstance(original, bytes) and original == data
+    assert Image.open(io.BytesIO(store.read(digest, 'thumb'))).size == (256, 256)
+    assert store.read('0' * 64, 'preview') is None
+    assert store.stats()['reads'] == 2 and store.stats()['misses'] == 1
+
+
+def test_evict_drops_expired_images_with_all_renditions(tmp_path):
+    store = BlobStore(str(tmp_path), ttl_seconds=3600)
+    old = store.put(_jpeg(1))
+    fresh = store.put(_jpeg(2))
+    _age(store, old, 7200)
+
+    store.evict_disk()
+
+    assert _stored(store, old) == []
+    assert len(_stored(store, fresh)) == 4
+    assert store.stats()['evicted'] == 1
+
+
+def test_evict_keeps_recently_read_images_under_size_cap(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digests = [store.put(_jpeg(seed)) for seed in range(3)]
+    for age, digest in zip((300, 200, 100), digests):
+        _age(store, digest, age)
+    # Reading the oldest image makes it the most recently used
+    store.read(digests[0], 'analysis')
+
+    one_image = sum(os.path.getsize(store.path(digests[1], name)) for name in [None] + list(store.rendition_sizes))
+    store.max_disk_bytes = int(one_image * 2.5)
+    store.evict_disk()
+
+    assert _stored(store, digests[1]) == []
+    assert len(_stored(store, digests[0])) == 4
+    assert len(_stored(store, digests[2])) == 4
+
+
+def test_put_stores_again_after_eviction(tmp_path):
+    store = BlobStore(str(tmp_path), ttl_seconds=3600)
+    data = _jpeg(1)
+    digest = store.put(data)
+    _age(store, digest, 7200)
+    store.evict_disk()
+
+    assert store.put(data) == digest
+    assert store.read(digest) == data
+    assert store.stats()['ingested'] == 2 and store.stats()['deduplicated'] == 0
+
+
+def test_put_async_stores_off_the_calling_thread(tmp_path):
+    store = BlobStore(str(tmp_path))
+    data = _jpeg(1)
+
+    digest = store.put_async(data).result(timeout=10)
+
+    assert store.read(digest) == data
+    assert store.read(digest, 'preview') is not None
@@ -0,0 +1,47 @@
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import inspection
+from job_queue import DONE, JobQueue
+from local_analyzers import classify_damage
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'damage')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def render_report(report, root):
+    import sys
+    sys.path.insert(0, root)
+    from pages.damage_detection import show_damage_set_result
+    show_damage_set_result(report)
+
+
+def test_damage_set_report_survives_job_queue_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(inspection, 'analyze_damage', classify_damage)
+    dent = read_fixture(os.path.join('dent', 'd0.jpg'))
+    photos = [dent, read_fixture(os.path.join('scratch', 's0.jpg')), dent, b'not an image']
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), workers=1)
+    job_id = queue.submit('session', 'damage_multi', 'key', lambda: inspection.analyze_damage_set(photos))
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job['status'] == DONE:
+            break
+        time.sleep(0.05)
+    report = job['result']
+
+    assert job['status'] == DONE
+    assert [index for index, _ in report['photos']] == [0, 1]
+    assert report['duplicates'] == [[2, 0]]
+    assert [index for index, _ in report['errors']] == [3]
+
+    app = AppTest.from_function(render_report, args=(report, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    app.run()
+    assert not app.exception
+    assert any("Photo 4 could not be analysed" in warning.value for warning in app.warning)
@@ -0,0 +1,30 @@
+import time
+
+from history_store import HistoryStore
+
+
+def make_store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history.db'))
+
+
+def test_find_latest_matches_backend_and_model(tmp_path):
+    store = make_store(tmp_path)
+    store.record('damage', 'abc', None, {'type': 'dent'}, 'remote', 'openrouter', 900, model='old-model')
+    store.record('damage', 'abc', None, {'type': 'scratch'}, 'remote', 'onprem', 300, model='llava')
+
+    assert store.find_latest('damage', 'abc', kind='remote', backends=[('openrouter', 'new-model')]) is None
+    found = store.find_latest('damage', 'abc', kind='remote', backends=[('openrouter', 'old-model'), ('x', None)])
+    assert found['result'] == {'type': 'dent'} and found['model'] == 'old-model'
+    assert store.find_latest('damage', 'abc', kind='remote', backends=[]) is None
+
+
+def test_find_latest_honours_max_age(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    stored_at = time.time()
+    monkeypatch.setattr(time, 'time', lambda: stored_at)
+    store.record('tire', 'abc', None, {'condition': 'good'}, 'remote', 'openrouter', model='m')
+
+    monkeypatch.setattr(time, 'time', lambda: stored_at + 3600)
+    assert store.find_latest('tire', 'abc', kind='remote', max_age=7200) is not None
+    assert store.find_latest('tire', 'abc', kind='remote', max_age=1800) is None
+
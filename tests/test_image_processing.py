@@ -0,0 +1,45 @@
+import base64
+import io
+
+from PIL import Image
+
+import image_processing
+from image_processing import prepare_image
+
+
+def _encode(side, image_format='JPEG'):
+    image = Image.effect_noise((side, side), 40).convert('RGB')
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format)
+    return buffered.getvalue()
+
+
+def _saved(prepare):
+    before = image_processing.get_metrics()['bytes_saved']
+    prepared = prepare()
+    return prepared, image_processing.get_metrics()['bytes_saved'] - before
+
+
+def test_compact_upload_is_sent_as_is_even_with_a_rendition():
+    upload = _encode(800)
+    prepared = prepare_image(upload, max_side=1280, rendition=_encode(400))
+    assert base64.b64decode(prepared.base64) == upload
+    assert prepared.width == 800
+
+
+def test_large_upload_is_sent_as_its_rendition():
+    upload = _encode(2000)
+    rendition = _encode(1280)
+
+    prepared, saved = _saved(lambda: prepare_image(upload, max_side=1280, rendition=rendition))
+
+    assert base64.b64decode(prepared.base64) == rendition
+    # Savings are counted against the upload, not the rendition
+    assert saved == len(upload) - len(rendition)
+
+
+def test_png_upload_without_rendition_is_re_encoded():
+    upload = _encode(600, 'PNG')
+    prepared = prepare_image(upload, max_side=1280)
+    assert prepared.mime_type == 'image/jpeg'
+    assert prepared.size < len(upload)
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import inspection
+from inspection import UNSPECIFIED_PANEL, analyze_damage_set, merge_damage_results, run_inspection
+from local_analyzers import classify_damage
+from utils import format_shop_for_display
+
+
+def test_same_panel_combines_by_noisy_or():
+    damages = merge_damage_results([
+        (0, {"type": "dent", "confidence": 0.6, "panel": "Front Door"}),
+        (1, {"type": "dent", "confidence": 0.5, "panel": "front door "}),
+    ])
+    assert damages == [{
+        "panel": "front door", "type": "dent", "photos": [0, 1], "descriptions": [], "confidence": 0.8
+    }]
+
+
+def test_results_without_panel_merge_per_type_without_noisy_or():
+    damages = merge_damage_results(
+        [(index, {"type": "dent", "confidence": 0.87, "source": "local"}) for index in range(8)]
+        + [(8, {"type": "scratch", "confidence": 0.9, "source": "remote"})]
+    )
+    assert [(damage["panel"], damage["type"]) for damage in damages] == [
+        (UNSPECIFIED_PANEL, "scratch"), (UNSPECIFIED_PANEL, "dent")
+    ]
+    assert damages[1]["confidence"] == 0.87
+    assert damages[1]["photos"] == list(range(8))
+
+
+def test_unsure_and_no_evidence_results_are_not_damage():
+    damages = merge_damage_results([
+        (0, {"type": "dent", "confidence": 0.5, "source": "fallback"}),
+        (1, {"type": "scratch", "confidence": 0.6, "source": "local"}),
+        (2, {"type": "dent", "confidence": 0.9, "source": "local", "damage_found": False}),
+        (3, {"type": "dent", "confidence": 0.7, "source": "remote", "panel": "hood"}),
+    ], threshold=0.85)
+    assert [(damage["panel"], damage["photos"]) for damage in damages] == [("hood", [3])]
+
+
+def _quote(damages):
+    shop = {"name": "Shop", "dent_price": 5000, "scratch_price": 3000}
+    return format_shop_for_display(shop, [damage["type"] for damage in damages])["price"]
+
+
+def test_photos_of_one_dent_are_quoted_once():
+    dent = open(os.path.join(os.path.dirname(__file__), 'fixtures', 'damage', 'dent', 'd11.jpg'), 'rb').read()
+    result = dict(classify_damage(dent), source="local")
+    damages = merge_damage_results([(index, result) for index in range(5)])
+    assert len(damages) == 1 and damages[0]["photos"] == list(range(5))
+    assert _quote(damages) == 5000
+
+
+def test_photos_without_damage_are_not_quoted():
+    blank = cv2.imencode('.jpg', np.full((600, 800, 3), 128, np.uint8))[1].tobytes()
+    gradient = cv2.imencode('.jpg', np.tile(np.linspace(60, 200, 800), (600, 1)).astype(np.uint8))[1].tobytes()
+    results = [(index, dict(classify_damage(image), source="fallback")) for index, image in enumerate([blank, gradient] * 3)]
+    assert merge_damage_results(results) == []
+    assert _quote([]) == 0
+
+
+def _slow(result, delay=0.3):
+    def analyze(*args):
+        time.sleep(delay)
+        return dict(result)
+    return analyze
+
+
+def test_inspection_runs_features_concurrently(monkeypatch):
+    monkeypatch.setattr(inspection, 'analyze_damage', _slow({"type": "dent", "confidence": 0.9}))
+    monkeypatch.setattr(inspection, 'analyze_tire', _slow({"condition": "good", "confidence": 0.9}))
+    monkeypatch.setattr(inspection, 'predict_price', _slow({"estimated_price": 10000, "confidence": 0.9}))
+
+    report = run_inspection({'damage': b'd', 'tire': b't', 'vehicle': b'v'}, 'Toyota', 2020, 50000)
+
+    assert report['damage']['type'] == "dent" and report['tire']['condition'] == "good"
+    assert report['market']['estimated_price'] == 10000
+    assert report['errors'] == {}
+    # Three 0.3 s analyses in well under the 0.9 s they would take one after another
+    assert report['wall_ms'] < 600
+
+
+def test_inspection_survives_one_failed_feature(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("tire model unavailable")
+
+    monkeypatch.setattr(inspection, 'analyze_damage', _slow({"type": "dent", "confidence": 0.9}, 0.0))
+    monkeypatch.setattr(inspection, 'analyze_tire', broken)
+    monkeypatch.setattr(inspection, 'predict_price', _slow({"estimated_price": 10000, "confidence": 0.9}, 0.0))
+
+    report = run_inspection({'damage': b'd', 'tire': b't'}, 'Toyota')
+
+    assert report['tire'] is None
+    assert report['errors'] == {'tire': "tire model unavailable"}
+    assert report['damage']['type'] == "dent" and report['market']['estimated_price'] == 10000
+
+
+def test_damage_set_runs_photos_concurrently_and_reports_failures(monkeypatch):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def analyze(image_bytes):
+        with lock:
+            running.append(image_bytes)
+            peak.append(len(running))
+        time.sleep(0.2)
+        with lock:
+            running.remove(image_bytes)
+        if image_bytes == b'photo-2':
+            raise RuntimeError("unreadable photo")
+        return {"type": "dent", "confidence": 0.9, "panel": "bonnet"}
+
+    monkeypatch.setattr(inspection, 'analyze_damage', analyze)
+    # Distinct bytes that aren't images, so none are dropped as near-duplicates
+    monkeypatch.setattr(inspection, 'group_near_duplicates', lambda images: {i: i for i in range(len(images))})
+
+    report = analyze_damage_set([f'photo-{i}'.encode() for i in range(4)], max_concurrency=4)
+
+    assert max(peak) > 1
+    assert report['wall_ms'] < 600
+    assert report['errors'] == [[2, "unreadable photo"]]
+    assert [index for index, _ in report['photos']] == [0, 1, 3]
+    assert report['damages'][0]['photos'] == [0, 1, 3]
@@ -0,0 +1,75 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import analysis_state
+from analysis_state import content_key, run_background_analysis, uploads_key, DONE
+from job_queue import JobQueue
+
+
+class Upload:
+    """Stands in for a Streamlit UploadedFile, which gets a new file_id per upload"""
+
+    def __init__(self, file_id, data):
+        self.file_id = file_id
+        self.name = "photo.jpg"
+        self.data = data
+
+    def getvalue(self):
+        return self.data
+
+
+def _wait(queue, job_id):
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)['status'] not in ('done', 'failed'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(analysis_state, 'st', SimpleNamespace(session_state={}))
+    monkeypatch.setattr(analysis_state, 'get_job_queue', lambda: queue)
+    return queue
+
+
+def test_reupload_picks_up_the_finished_job(session):
+    calls = []
+
+    def analyze():
+        calls.append(1)
+        return {"type": "dent"}
+
+    first = [Upload("upload-1", b"same photo")]
+    state = run_background_analysis('damage_multi', uploads_key(first), analyze, job_key=content_key(first))
+    _wait(session, state.job_id)
+
+    # The browser uploads the same photo again and Streamlit gives it a new file_id
+    again = [Upload("upload-2", b"same photo")]
+    assert uploads_key(again) != uploads_key(first)
+    state = run_background_analysis('damage_multi', uploads_key(again), analyze, job_key=content_key(again))
+
+    assert state.status == DONE and state.result == {"type": "dent"}
+    assert len(calls) == 1
+    assert session.stats()['reused'] == 1
+
+
+def test_jobs_are_not_shared_between_sessions(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    first = queue.submit("session-a", 'damage_multi', "key", lambda: {"owner": "a"})
+    _wait(queue, first)
+
+    second = queue.submit("session-b", 'damage_multi', "key", lambda: {"owner": "b"})
+
+    assert second != first
+    assert _wait(queue, second)['result'] == {"owner": "b"}
+    assert queue.find("session-a", 'damage_multi', "key")['result'] == {"owner": "a"}
+
+
+def test_different_inputs_run_a_new_job(session):
+    upload = [Upload("upload-1", b"same photo")]
+    assert content_key(upload, {"brand": "Toyota"}) != content_key(upload, {"brand": "Honda"})
+    assert content_key(upload) != content_key([Upload("upload-2", b"other photo")])
@@ -0,0 +1,88 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from inference_router import DEFAULT_THRESHOLDS
+from local_analyzers import classify_damage, estimate_tire, evaluate, iter_labelled_fixtures
+
+DAMAGE_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'damage')
+TIRE_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'tire')
+
+
+def encode(image):
+    return cv2.imencode('.jpg', image.astype(np.uint8))[1].tobytes()
+
+
+def test_damage_fixtures_accuracy_and_latency():
+    report = evaluate(classify_damage, iter_labelled_fixtures(DAMAGE_FIXTURES))
+    assert report['samples'] == 24
+    assert report['accuracy'] >= 0.9
+    assert report['latency_p95_ms'] < 100
+
+
+def test_confident_on_fixtures():
+    confident = [
+        classify_damage(open(path, 'rb').read())['confidence'] >= DEFAULT_THRESHOLDS['damage']
+        for _, path in iter_labelled_fixtures(DAMAGE_FIXTURES)
+    ]
+    assert sum(confident) >= len(confident) // 2
+
+
+def _blank():
+    return np.full((1200, 1600, 3), 128)
+
+
+def _single_line():
+    image = np.full((1200, 1600, 3), 128, np.uint8)
+    cv2.line(image, (100, 100), (1400, 900), (230, 230, 230), 3)
+    return image
+
+
+def _noise():
+    return np.random.default_rng(0).random((1200, 1600, 3)) * 255
+
+
+def _small_noise():
+    return np.random.default_rng(1).random((300, 400, 3)) * 255
+
+
+def _gradient():
+    ramp = np.tile(np.linspace(60, 200, 1600), (1200, 1))
+    return np.stack([ramp] * 3, axis=-1)
+
+
+@pytest.mark.parametrize('make_image', [_blank, _single_line, _noise, _small_noise, _gradient])
+def test_no_clear_evidence_escalates(make_image):
+    result = classify_damage(encode(make_image()))
+    assert result['type'] in ('dent', 'scratch')
+    assert result['confidence'] < DEFAULT_THRESHOLDS['damage']
+
+
+def test_tire_fixtures_accuracy_and_latency():
+    report = evaluate(estimate_tire, iter_labelled_fixtures(TIRE_FIXTURES), label_key="condition")
+    assert report['samples'] == 24
+    assert report['accuracy'] >= 0.9
+    assert report['latency_p95_ms'] < 100
+
+
+def test_tire_confident_on_fixtures():
+    confident = [
+        estimate_tire(open(path, 'rb').read())['confidence'] >= DEFAULT_THRESHOLDS['tire']
+        for _, path in iter_labelled_fixtures(TIRE_FIXTURES)
+    ]
+    assert sum(confident) >= len(confident) // 2
+
+
+@pytest.mark.parametrize('make_image', [_blank, _single_line, _noise, _small_noise, _gradient])
+def test_no_tread_escalates(make_image):
+    result = estimate_tire(encode(make_image()))
+    assert result['confidence'] < DEFAULT_THRESHOLDS['tire']
+    assert not result['change_recommended']
+    assert result['description'].startswith("No tire tread found")
+
+
+def test_damage_photos_are_not_read_as_tires():
+    for _, path in iter_labelled_fixtures(DAMAGE_FIXTURES):
+        assert estimate_tire(open(path, 'rb').read())['confidence'] < DEFAULT_THRESHOLDS['tire']
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from analyzers import _price_context, price_plan
+from inference_router import DEFAULT_THRESHOLDS, route
+from pricing import get_pricing_model
+
+
+@pytest.mark.parametrize('brand,year,mileage,local', [
+    ('Toyota', 2020, 50000, True),
+    ('Suzuki', 2015, 120000, True),
+    ('Toyota', 2020, None, False),
+    ('Toyota', None, None, False),
+    ('Lada', 2020, 50000, False),
+    ('Toyota', 2024, 400000, False),
+])
+def test_market_escalation(brand, year, mileage, local):
+    result = get_pricing_model().predict(brand, year, mileage, reference_year=2026)
+    assert (result['confidence'] >= DEFAULT_THRESHOLDS['market']) is local
+
+
+def test_known_vehicle_served_locally():
+    def remote():
+        raise AssertionError("remote model called for a known vehicle")
+
+    result = route(
+        'market',
+        lambda: get_pricing_model().predict('Mitsubishi', 2019, 80000, reference_year=2026),
+        remote,
+        threshold=DEFAULT_THRESHOLDS['market']
+    )
+    assert result['source'] == 'local'
+
+
+def test_zero_mileage_is_known():
+    result = get_pricing_model().predict('Toyota', 2026, 0, reference_year=2026)
+    assert "Mileage: 0 km" in result['factors']
+    assert result['confidence'] == get_pricing_model().predict('Toyota', 2026, 10, reference_year=2026)['confidence']
+    assert _price_context('Toyota', 2026, 0) == "Brand: Toyota, Model Year: 2026, Mileage: 0 km"
+    assert _price_context('Toyota') == "Brand: Toyota"
+
+
+def test_photo_escalates_and_no_photo_is_final():
+    photo = open(os.path.join(os.path.dirname(__file__), 'fixtures', 'damage', 'dent', 'd0.jpg'), 'rb').read()
+
+    local, remote, _ = price_plan(photo, 'Toyota', 2020, 50000)
+    assert remote is not None
+    assert local()['confidence'] < DEFAULT_THRESHOLDS['market']
+
+    local, remote, agree = price_plan(None, 'Toyota', 2024, 400000)
+    assert remote is None
+    result = route('market', local, remote, agree)
+    assert result['source'] == 'local'
+    assert result['confidence'] < DEFAULT_THRESHOLDS['market']
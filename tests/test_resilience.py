@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from openrouter_client import OpenRouterClient, OpenRouterError
+from rate_limiter import OutboundLimiter
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, DeadlineExceeded, Resilience
+from stub_server import Reply, completion, delta_event
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def client(stub):
+    return OpenRouterClient("test-key", base_url=stub.url, timeout=5, limiter=OutboundLimiter(rate=1000, burst=1000))
+
+
+def make_resilience(retries=2, failure_threshold=5, reset_timeout=30.0, **options):
+    return Resilience(
+        CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+        retries=retries, base_delay=0.01, max_delay=0.05, **options
+    )
+
+
+def attempt(client):
+    return lambda timeout: client.chat(MESSAGES, timeout=timeout)
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retries_retryable_status(stub, client, status):
+    failure = Reply(status=status, headers={'Retry-After': '0'})
+    stub.queue(failure, failure, Reply(body=completion("ok")))
+    resilience = make_resilience(retries=2)
+    assert resilience.call('damage', attempt(client)) == "ok"
+    assert len(stub.requests) == 3
+    assert resilience.stats()['retries'] == 2
+
+
+def test_does_not_retry_client_errors(stub, client):
+    stub.queue(Reply(status=400))
+    resilience = make_resilience(retries=2)
+    with pytest.raises(OpenRouterError):
+        resilience.call('damage', attempt(client))
+    assert len(stub.requests) == 1
+    # A bad request says nothing about the upstream's health
+    assert resilience.breaker.failures == 0
+
+
+def test_retry_waits_for_retry_after(stub, client):
+    stub.queue(Reply(status=429, headers={'Retry-After': '0.5'}), Reply(body=completion("ok")))
+    assert make_resilience(retries=1).call('damage', attempt(client)) == "ok"
+    assert stub.received_at[1] - stub.received_at[0] >= 0.45
+
+
+def test_breaker_opens_probes_and_closes(stub, client):
+    resilience = make_resilience(retries=0, failure_threshold=2, reset_timeout=0.3)
+    breaker = resilience.breaker
+    stub.default = Reply(status=503)
+
+    for _ in range(2):
+        with pytest.raises(OpenRouterError):
+            resilience.call('damage', attempt(client))
+    assert breaker.state == OPEN
+
+    # While open, calls fail fast without reaching the upstream
+    with pytest.raises(CircuitOpen):
+        resilience.call('damage', attempt(client))
+    assert len(stub.requests) == 2
+
+    # After the cool-down one probe goes out; a failed probe reopens at once
+    time.sleep(0.35)
+    with pytest.raises(OpenRouterError):
+        resilience.call('damage', attempt(client))
+    assert breaker.state == OPEN and len(stub.requests) == 3
+
+    # A slow successful probe: half-open while it runs, other calls still short-circuit
+    time.sleep(0.35)
+    stub.default = Reply(body=completion("ok"), delay=0.3)
+    probe = threading.Thread(target=resilience.call, args=('damage', attempt(client)))
+    probe.start()
+    time.sleep(0.1)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        resilience.call('damage', attempt(client))
+    probe.join()
+    assert breaker.state == CLOSED
+    assert resilience.call('damage', attempt(client)) == "ok"
+
+
+def test_deadline_bounds_slow_upstream(stub, client, monkeypatch):
+    monkeypatch.setenv("AUTOXPERT_DAMAGE_DEADLINE_SECONDS", "0.5")
+    stub.default = Reply(body=completion("late"), delay=2.0)
+    start = time.monotonic()
+    resilience = make_resilience(retries=3)
+    with pytest.raises((DeadlineExceeded, requests.Timeout)):
+        resilience.call('damage', attempt(client))
+    assert time.monotonic() - start < 1.0
+    assert resilience.breaker.failures == 1
+
+
+def test_hedged_request_wins_over_slow_first(stub, client):
+    resilience = make_resilience(retries=0, hedge=True, hedge_min_delay=0.05)
+    for _ in range(20):
+        resilience._record_latency('damage', 0.01)
+
+    stub.queue(Reply(body=completion("slow"), delay=1.0), Reply(body=completion("fast")))
+    start = time.monotonic()
+    assert resilience.call('damage', attempt(client)) == "fast"
+    assert time.monotonic() - start < 0.5
+    assert resilience.stats()['hedges'] == 1
+    assert resilience.stats()['hedge_wins'] == 1
+
+
+def test_no_hedge_when_first_answers_in_time(stub, client):
+    resilience = make_resilience(retries=0, hedge=True, hedge_min_delay=0.5)
+    for _ in range(20):
+        resilience._record_latency('damage', 0.01)
+    assert resilience.call('damage', attempt(client)) == ""
+    assert resilience.stats()['hedges'] == 0
+    assert len(stub.requests) == 1
+
+
+def test_deadline_holds_for_a_slow_stream(stub, client, monkeypatch):
+    monkeypatch.setenv("AUTOXPERT_DAMAGE_DEADLINE_SECONDS", "1.0")
+    # Each event arrives well within the read timeout, but the whole reply takes 3 s
+    stub.default = Reply(chunks=[delta_event("x") for _ in range(10)] + [b"data: [DONE]\n\n"], chunk_delay=0.3)
+    start = time.monotonic()
+    with pytest.raises((DeadlineExceeded, requests.Timeout)):
+        make_resilience(retries=2).call('damage', lambda timeout: "".join(client.chat_stream(MESSAGES, timeout=timeout)))
+    assert time.monotonic() - start < 1.5
+
+
+def test_time_queued_for_a_slot_counts_against_the_timeout(stub):
+    limiter = OutboundLimiter(rate=1000, burst=1000, initial_limit=1, min_limit=1, max_limit=1)
+    client = OpenRouterClient("test-key", base_url=stub.url, limiter=limiter)
+    stub.default = Reply(body=completion("ok"), delay=0.6)
+    holder = threading.Thread(target=client.chat, args=(MESSAGES,), kwargs={'timeout': 5})
+    holder.start()
+    while not stub.requests:
+        time.sleep(0.01)
+
+    # Queued ~0.6 s behind the first request, this one has ~0.4 s left: not enough for a 0.6 s reply
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        client.chat(MESSAGES, timeout=1.0)
+    assert time.monotonic() - start < 1.2
+    holder.join(5)
@@ -0,0 +1,35 @@
+import pytest
+
+from response_decoder import DecodeError, decode, validate
+
+
+@pytest.mark.parametrize('text,expected', [
+    ("$12,500", 12500),
+    ("10k", 10000),
+    ("$12.5K", 12500),
+    ("1.2 million", 1200000),
+    ("LKR 3.5m", 3500000),
+    ("Rs. 45 lakh", 4500000),
+    ("50,000 km", 50000),
+])
+def test_price_strings_keep_their_scale(text, expected):
+    assert validate('market', {"estimated_price": text})["estimated_price"] == expected
+
+
+def test_unit_strings_are_not_scaled():
+    result = validate('tire', {"condition": "fair", "tread_depth_mm": "3.5mm", "remaining_life_percent": "40 %"})
+    assert result["tread_depth_mm"] == 3.5
+    assert result["remaining_life_percent"] == 40
+
+
+def test_range_in_thousands_matches_estimate():
+    result = decode('market', '{"estimated_price": "12,500", "price_range_min": "10k", "price_range_max": "15k"}')
+    assert (result["price_range_min"], result["estimated_price"], result["price_range_max"]) == (10000, 12500, 15000)
+
+
+def test_unknown_unit_is_rejected():
+    with pytest.raises(DecodeError):
+        validate('market', {"estimated_price": "12 grand"})
+    # An optional field with an unknown unit is dropped rather than mis-scaled
+    result = validate('market', {"estimated_price": 12500, "price_range_min": "10 lac"})
+    assert result["price_range_min"] == 12500
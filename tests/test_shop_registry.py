@@ -0,0 +1,71 @@
+import pytest
+
+import shop_registry
+from shop_registry import ShopRegistry, StaleShopVersion, check_password, hash_password
+from utils import login_repair_shop, register_repair_shop, update_shop_prices
+
+SEED = {'name': "Seeded Motors", 'email': "seed@example.com", 'dent_price': 5000.0, 'scratch_price': 3000.0}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = ShopRegistry(str(tmp_path / 'shops.db'), seed_shops=[SEED], refresh_seconds=0)
+    monkeypatch.setattr(shop_registry, '_registry', registry)
+    return registry
+
+
+def test_password_hash_is_salted_pbkdf2():
+    first, second = hash_password("hunter2"), hash_password("hunter2")
+    assert first != second
+    assert check_password("hunter2", first) and check_password("hunter2", second)
+    assert not check_password("hunter3", first)
+    assert not check_password("hunter2", None) and not check_password("hunter2", "no-salt")
+
+
+def test_login_accepts_the_password_and_rejects_others(registry):
+    assert register_repair_shop("Lanka Dent", "owner@example.com", "011", "Colombo", 4500, 2500, "s3cret")[0]
+
+    shop = login_repair_shop("owner@example.com", "s3cret")
+    assert shop['name'] == "Lanka Dent" and shop['version'] == 1
+    assert 'password' not in shop and 'password_hash' not in shop
+    assert login_repair_shop("owner@example.com", "S3cret") is None
+    assert login_repair_shop("nobody@example.com", "s3cret") is None
+    # Seeded shops have no password, so nothing logs in as them
+    assert login_repair_shop("seed@example.com", "") is None
+
+
+def test_duplicate_email_is_rejected(registry):
+    assert register_repair_shop("Lanka Dent", "owner@example.com", "011", "Colombo", 4500, 2500, "s3cret")[0]
+
+    assert register_repair_shop("Copycat", "owner@example.com", "012", "Kandy", 1, 1, "other") == (
+        False, "Email already registered"
+    )
+    assert register_repair_shop("Copycat", "seed@example.com", "012", "Kandy", 1, 1, "other")[0] is False
+    assert registry.get("owner@example.com")['name'] == "Lanka Dent"
+    assert login_repair_shop("owner@example.com", "other") is None
+
+
+def test_stale_price_update_is_refused(registry):
+    # Two dashboards load the shop at the same version
+    version = registry.get("seed@example.com")['version']
+
+    assert update_shop_prices("seed@example.com", 5500, 3200, expected_version=version)[0]
+    success, message = update_shop_prices("seed@example.com", 4000, 2000, expected_version=version)
+
+    assert not success and "changed elsewhere" in message
+    shop = registry.get("seed@example.com")
+    assert (shop['dent_price'], shop['scratch_price'], shop['version']) == (5500.0, 3200.0, version + 1)
+    with pytest.raises(StaleShopVersion):
+        registry.update("seed@example.com", {'dent_price': 1.0}, expected_version=version)
+
+
+def test_update_rejects_unknown_shops_and_fields(registry):
+    assert update_shop_prices("nobody@example.com", 1, 1) == (False, "Shop not found")
+    with pytest.raises(ValueError):
+        registry.update("seed@example.com", {'rating': 5.0})
+
+
+def test_writes_are_seen_by_another_registry_on_the_same_database(registry, tmp_path):
+    other = ShopRegistry(str(tmp_path / 'shops.db'), refresh_seconds=0)
+    other.update("seed@example.com", {'dent_price': 6000.0})
+    assert registry.get("seed@example.com")['dent_price'] == 6000.0
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import FollowerTimeout, SingleFlight
+
+
+def _run_together(count, target):
+    """Start count threads on target(index) at once and wait for them"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            outcomes[index] = ('ok', target(index))
+        except Exception as e:
+            outcomes[index] = ('error', e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return outcomes
+
+
+def test_concurrent_identical_calls_run_once():
+    group = SingleFlight()
+    upstream_calls = []
+
+    def fetch():
+        upstream_calls.append(1)
+        time.sleep(0.3)
+        return {"type": "dent"}
+
+    outcomes = _run_together(8, lambda index: group.do("photo", fetch))
+
+    assert len(upstream_calls) == 1
+    assert outcomes == [('ok', {"type": "dent"})] * 8
+    assert group.stats()['executions'] == 1 and group.stats()['collapsed'] == 7
+    assert group.stats()['in_flight'] == 0
+
+
+def test_error_reaches_every_waiter():
+    group = SingleFlight()
+    upstream_calls = []
+
+    def fetch():
+        upstream_calls.append(1)
+        time.sleep(0.3)
+        raise RuntimeError("upstream 503")
+
+    outcomes = _run_together(5, lambda index: group.do("photo", fetch))
+
+    assert len(upstream_calls) == 1
+    assert all(status == 'error' and str(error) == "upstream 503" for status, error in outcomes)
+
+
+def test_follower_gives_up_after_its_timeout():
+    group = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=group.do, args=("photo", lambda: release.wait(10)))
+    leader.start()
+    while group.stats()['in_flight'] == 0:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    with pytest.raises(FollowerTimeout):
+        group.do("photo", lambda: "not called", timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert group.stats()['follower_timeouts'] == 1
+
+    release.set()
+    leader.join(5)
+    # Once the leader is done the key is free again
+    assert group.do("photo", lambda: "fresh") == "fresh"
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from json_stream import JSONFieldExtractor
+from openrouter_client import OpenRouterClient, OpenRouterError, iter_sse_data
+from rate_limiter import OutboundLimiter
+from stub_server import Reply, delta_event
+
+
+def make_client(stub):
+    return OpenRouterClient("test-key", base_url=stub.url, timeout=5, limiter=OutboundLimiter(rate=1000, burst=1000))
+
+
+def stream(stub, *chunks):
+    stub.queue(Reply(chunks=list(chunks)))
+    return "".join(make_client(stub).chat_stream([{"role": "user", "content": "hi"}]))
+
+
+def test_iter_sse_data_joins_multi_line_events_and_skips_comments():
+    lines = [b": keep-alive", b"data: first", b"data:second", b"", b"", b"data: last\r"]
+    assert list(iter_sse_data(lines)) == ["first\nsecond", "last"]
+
+
+def test_stream_deltas_in_order(stub):
+    assert stream(stub, delta_event('{"type": '), delta_event('"dent"}'), b"data: [DONE]\n\n") == '{"type": "dent"}'
+    assert stub.requests[0]["stream"] is True
+
+
+def test_events_split_across_network_reads(stub):
+    body = delta_event("Hello, ") + delta_event("world") + b"data: [DONE]\n\n"
+    # One byte per chunk splits every line and event boundary
+    assert stream(stub, *[body[i:i + 1] for i in range(len(body))]) == "Hello, world"
+
+
+def test_multi_line_data_event(stub):
+    event = json.dumps({"choices": [{"delta": {"content": "joined"}}]}, indent=1)
+    lines = "".join(f"data: {line}\n" for line in event.splitlines())
+    assert len(event.splitlines()) > 1
+    assert stream(stub, lines.encode() + b"\n", b"data: [DONE]\n\n") == "joined"
+
+
+def test_comment_keep_alives_are_ignored(stub):
+    assert stream(
+        stub,
+        b": OPENROUTER PROCESSING\n\n",
+        delta_event("a"),
+        b": OPENROUTER PROCESSING\n\n",
+        delta_event("b"),
+        b"data: [DONE]\n\n",
+    ) == "ab"
+
+
+def test_done_ends_the_reply(stub):
+    # Events after [DONE] are read off the connection but never surface
+    assert stream(stub, delta_event("a"), b"data: [DONE]\n\n", b": trailing\n\n") == "a"
+
+
+def test_mid_stream_error_event(stub):
+    stub.queue(Reply(chunks=[
+        delta_event('{"type": "dent"'),
+        b'data: {"error": {"code": 502, "message": "upstream went away"}}\n\n',
+    ]))
+    received = []
+    with pytest.raises(OpenRouterError) as error:
+        for delta in make_client(stub).chat_stream([{"role": "user", "content": "hi"}]):
+            received.append(delta)
+    assert received == ['{"type": "dent"']
+    assert error.value.status_code == 502
+
+
+def test_error_status_before_streaming(stub):
+    stub.queue(Reply(status=500, chunks=[b"data: {}\n\n"]))
+    with pytest.raises(OpenRouterError) as error:
+        list(make_client(stub).chat_stream([{"role": "user", "content": "hi"}]))
+    assert error.value.status_code == 500
+
+
+REPLY = (
+    'Sure, here it is:\n```json\n'
+    '{"type": "scratch", "confidence": 0.92, '
+    '"details": {"panel": "door {front}", "sizes": [1, [2, 3]]}, '
+    '"description": "A \\"long\\" scratch \\\\ along the \\u00e9dge, {not json}"}\n```'
+)
+
+
+def test_extractor_matches_json_at_every_split_point():
+    expected = json.loads(REPLY[REPLY.index('{'):REPLY.rindex('}') + 1])
+    for split in range(len(REPLY) + 1):
+        extractor = JSONFieldExtractor()
+        extractor.feed(REPLY[:split])
+        extractor.feed(REPLY[split:])
+        assert extractor.fields == expected, split
+        assert extractor.complete
+
+
+def test_extractor_reports_fields_as_soon_as_they_complete():
+    extractor = JSONFieldExtractor()
+    seen = []
+    for char in REPLY:
+        for key in extractor.feed(char):
+            seen.append((key, extractor.buffer.count('"description"')))
+    assert [key for key, _ in seen] == ["type", "confidence", "details", "description"]
+    # The headline fields arrive before the description has even started
+    assert seen[0][1] == 0 and seen[1][1] == 0
+
+
+def test_extractor_does_not_split_inside_strings_or_escapes():
+    extractor = JSONFieldExtractor()
+    chunks = ['{"description": "a, b: \\', '"c\\', '\\"', ', "x": {"y": "}"', '}}']
+    reported = {}
+    for chunk in chunks:
+        reported.update(extractor.feed(chunk))
+    assert reported == {"description": 'a, b: "c\\', "x": {"y": "}"}}
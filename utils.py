@@ -83,40 +83,28 @@ def get_sri_lankan_shops():
     ]
 
 def get_recommended_shops(damage_type):
-    """Get recommended repair shops based on damage type and ratings"""
-    import streamlit as st
+    """Get recommended repair shops based on damage type (or a list of them) and ratings"""
+    from shop_registry import get_shop_registry
     
-    # Initialize with Sri Lankan shops if not exists
-    if 'repair_shops' not in st.session_state:
-        st.session_state.repair_shops = get_sri_lankan_shops()
-    
-    # Also add user-registered shops
-    user_shops = st.session_state.get('user_repair_shops', [])
-    all_shops = st.session_state.repair_shops + user_shops
-    
-    # Filter shops that offer this damage type service
+    # One registry per process, so shops that signed up in any session are included
+    return rank_shops(get_shop_registry().shops(), damage_type)
+
+def rank_shops(shops, damage_type, limit=5):
+    """Best rated shops offering every damage type service needed"""
+    damage_types = set([damage_type] if isinstance(damage_type, str) else damage_type)
     available_shops = [
-        shop for shop in all_shops 
-        if damage_type in shop.get('services', [])
+        shop for shop in shops 
+        if damage_types.issubset(shop.get('services', []))
     ]
     
     # Sort by rating (highest first)
     available_shops.sort(key=lambda x: x.get('rating', 0), reverse=True)
     
-    # Return top 5 shops
-    return available_shops[:5]
+    return available_shops[:limit]
 
 def register_repair_shop(name, email, phone, location, dent_price, scratch_price, password):
     """Register a new repair shop"""
-    import streamlit as st
-    
-    if 'user_repair_shops' not in st.session_state:
-        st.session_state.user_repair_shops = []
-    
-    # Check if email already exists
-    all_shops = st.session_state.get('repair_shops', []) + st.session_state.user_repair_shops
-    if any(shop['email'] == email for shop in all_shops):
-        return False, "Email already registered"
+    from shop_registry import get_shop_registry
     
     new_shop = {
         'name': name,
@@ -125,7 +113,6 @@ def register_repair_shop(name, email, phone, location, dent_price, scratch_price
         'location': location,
         'dent_price': float(dent_price),
         'scratch_price': float(scratch_price),
-        'password': password,  # In production, hash this
         'rating': 4.5,  # Default rating
         'services': ['dent', 'scratch'],
         'reviews': [],
@@ -135,36 +122,45 @@ def register_repair_shop(name, email, phone, location, dent_price, scratch_price
         'address': location
     }
     
-    st.session_state.user_repair_shops.append(new_shop)
+    if not get_shop_registry().register(new_shop, password):
+        return False, "Email already registered"
     return True, "Account created successfully!"
 
 def login_repair_shop(email, password):
     """Login repair shop owner"""
-    import streamlit as st
-    
-    all_shops = st.session_state.get('repair_shops', []) + st.session_state.get('user_repair_shops', [])
-    
-    for shop in all_shops:
-        if shop.get('email') == email and shop.get('password') == password:
-            return shop
+    from shop_registry import get_shop_registry
     
-    return None
+    return get_shop_registry().authenticate(email, password)
 
 def get_shop_by_email(email):
     """Get shop details by email"""
-    import streamlit as st
+    from shop_registry import get_shop_registry
     
-    all_shops = st.session_state.get('repair_shops', []) + st.session_state.get('user_repair_shops', [])
-    
-    for shop in all_shops:
-        if shop.get('email') == email:
-            return shop
-    
-    return None
+    return get_shop_registry().get(email)
+
+def update_shop_prices(email, dent_price, scratch_price, expected_version=None):
+    """Save a shop's new prices for every customer; returns (success, message)"""
+    from shop_registry import get_shop_registry, StaleShopVersion
+    
+    try:
+        get_shop_registry().update(
+            email,
+            {'dent_price': float(dent_price), 'scratch_price': float(scratch_price)},
+            expected_version=expected_version
+        )
+    except StaleShopVersion:
+        return False, "Prices were changed elsewhere; reload the dashboard and try again"
+    except KeyError:
+        return False, "Shop not found"
+    return True, "Prices updated successfully!"
 
 def format_shop_for_display(shop, damage_type):
-    """Format shop data for display in recommendations"""
-    price = shop.get('dent_price') if damage_type == 'dent' else shop.get('scratch_price')
+    """Format shop data for display in recommendations; a list of damages sums the repair prices"""
+    damage_types = [damage_type] if isinstance(damage_type, str) else damage_type
+    price = sum(
+        shop.get('dent_price') if item == 'dent' else shop.get('scratch_price')
+        for item in damage_types
+    )
     
     return {
         'name': shop['name'],
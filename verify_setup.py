@@ -14,7 +14,8 @@ def check_imports():
         'streamlit': 'Streamlit',
         'PIL': 'Pillow',
         'requests': 'Requests',
-        'numpy': 'NumPy'
+        'numpy': 'NumPy',
+        'cv2': 'OpenCV'
     }
     
     missing = []